@@ -1,7 +1,8 @@
 
 import json
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
+from http_cache import cached_get
 import re
 import os
 
@@ -177,7 +178,7 @@ def guess_type(url):
     return 'ojs'
 
 def extract_from_html(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content)
     links = []
     for a in soup.find_all('a', href=True):
         href = a['href']
@@ -204,12 +205,12 @@ def fetch_scielo_journals():
     # SciELO Alphabetic List
     url = "https://www.scielo.br/p/journals/list/alpha"
     try:
-        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response = cached_get(requests, url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
         if response.status_code != 200:
             print(f"Failed to fetch SciELO list: {response.status_code}")
             return []
             
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = make_soup(response.content)
         
         scielo_links = []
         # In the new SciELO interface, journals are often in a table or list
@@ -1,6 +1,7 @@
 from database import get_session, Article, Journal
 import requests
-from bs4 import BeautifulSoup
+from http_cache import ARTICLE_MAX_AGE, cached_get
+from html_parsing import make_soup
 import pdfplumber
 import os
 import random
@@ -28,8 +29,8 @@ def audit_deep():
             
             # 1. Check HTML
             try:
-                r = requests.get(art.url, timeout=5)
-                soup = BeautifulSoup(r.content, 'html.parser')
+                r = cached_get(requests, art.url, max_age=ARTICLE_MAX_AGE, timeout=5)
+                soup = make_soup(r.content)
                 emails = []
                 for meta in soup.find_all('meta'):
                     if 'email' in meta.get('name', '').lower() or 'email' in meta.get('property', '').lower():
@@ -1,7 +1,8 @@
 from database import get_session, Article
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 from collections import Counter
+from http_cache import ARTICLE_MAX_AGE, cached_get
 
 def check_html_emails(limit=10):
     session = get_session()
@@ -24,13 +25,13 @@ def check_html_emails(limit=10):
         print(f"\nChecking: {url}")
         
         try:
-            r = requests.get(url, timeout=10)
+            r = cached_get(requests, url, max_age=ARTICLE_MAX_AGE, timeout=10)
             if r.status_code != 200:
                 print(f"  Failed to fetch: {r.status_code}")
                 stats['failed_fetch'] += 1
                 continue
                 
-            soup = BeautifulSoup(r.content, 'html.parser')
+            soup = make_soup(r.content)
             
             # Check meta tags
             emails = []
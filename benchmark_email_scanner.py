@@ -0,0 +1,116 @@
+"""
+benchmark_email_scanner.py - Correctness and throughput of the email scanner.
+
+Runs the built-in corpus of PDF-extracted snippets (line-broken addresses,
+obfuscations, unicode lookalikes, merged words, false-positive traps) through
+the old Processor.extract_emails regex and through email_scanner, printing
+every case either of them gets wrong, then times both in MB/s over article
+text: text extracted from --pdfs, otherwise the corpus padded with filler.
+
+    python3 benchmark_email_scanner.py [--pdfs pdf_store --limit 50] [--repeat 5]
+"""
+
+import argparse
+import re
+import time
+
+from email_scanner import EmailScanner, find_emails
+
+# (text, expected addresses)
+CORPUS = [
+    ("Contact: ana.silva@example.org.", {"ana.silva@example.org"}),
+    ("*Corresponding author: p.souza@acad.ufsm.edu.br; Tel. +55 55 3220", {"p.souza@acad.ufsm.edu.br"}),
+    ("E-mail: JOAO.LIMA@UFRGS.BR", {"joao.lima@ufrgs.br"}),
+    ("ana.silva @ ufsm.br", {"ana.silva@ufsm.br"}),
+    ("maria.costa@ufsm.\nbr\nRecebido em 2020", {"maria.costa@ufsm.br"}),
+    ("maria.costa@\nufsm.br", {"maria.costa@ufsm.br"}),
+    ("maria.costa\n@ufsm.br", {"maria.costa@ufsm.br"}),
+    ("contato@ufsm.\nedu.br", {"contato@ufsm.edu.br"}),
+    ("lab@escola-\npolitecnica.usp.br", {"lab@escola-politecnica.usp.br"}),
+    ("ana [at] ufsm [dot] br", {"ana@ufsm.br"}),
+    ("joao(at)unb.br", {"joao@unb.br"}),
+    ("carla {at} ufba (dot) br", {"carla@ufba.br"}),
+    ("pedro [arroba] ufpe [ponto] br", {"pedro@ufpe.br"}),
+    ("ana＠ufsm．br", {"ana@ufsm.br"}),
+    ("oﬃce@uni.org", {"office@uni.org"}),
+    ("ana­.silva@ufsm.br", {"ana.silva@ufsm.br"}),
+    ("x@ufsm.brJoão Silva", {"x@ufsm.br"}),
+    ("Ana Silva1 ana@usp.brMaria Costa2", {"ana@usp.br"}),
+    ("see x@ufsm.br. the results", {"x@ufsm.br"}),
+    ("written by x@ufsm.br.\nthe results", {"x@ufsm.br"}),
+    ("We met at home at noon.", set()),
+    ("The data at the site at Porto Alegre.", set()),
+    ("Figure logo@2x.png", set()),
+    ("a@b.c", set()),
+    ("Authors: ana@usp.br, joao@usp.br and maria@unicamp.br", {"ana@usp.br", "joao@usp.br", "maria@unicamp.br"}),
+]
+
+FILLER = ("Os resultados indicam que a adubação nitrogenada aumentou a produtividade em 12% "
+          "(p < 0.05), conforme observado por Silva et al. (2019) e Costa & Lima (2020).\n") * 40
+
+def legacy_extract_emails(text):
+    """
+    Processor.extract_emails before email_scanner, kept for comparison.
+    """
+    text_norm = text.replace(' [at] ', '@').replace(' (at) ', '@').replace(' at ', '@')
+    email_pattern = r'([a-zA-Z0-9._%+-]+)\s*@\s*([a-zA-Z0-9.-]+)\s*\.\s*([a-z]{2,}|[A-Z]{2,})\b'
+    emails = [f"{m[0]}@{m[1]}.{m[2]}" for m in re.findall(email_pattern, text_norm)]
+    flat_text = text_norm.replace('\n', '')
+    emails += [f"{m[0]}@{m[1]}.{m[2]}" for m in re.findall(email_pattern, flat_text)]
+    return list(set(emails))
+
+def scan_pages(pages):
+    scanner = EmailScanner()
+    for page in pages:
+        scanner.feed(page)
+    return scanner.emails
+
+def check_corpus():
+    score = {'legacy': [0, 0, 0], 'scanner': [0, 0, 0]}  # true positives, false positives, missed
+    for text, expected in CORPUS:
+        results = {
+            'legacy': {email.lower() for email in legacy_extract_emails(text)},
+            'scanner': set(find_emails(text)),
+        }
+        for name, found in results.items():
+            score[name][0] += len(found & expected)
+            score[name][1] += len(found - expected)
+            score[name][2] += len(expected - found)
+            if found != expected:
+                print(f"  {name:<8} {text!r:<60} -> {sorted(found)}")
+    print()
+    for name, (tp, fp, missed) in score.items():
+        print(f"{name:<8} found {tp}, false positives {fp}, missed {missed}")
+
+def pdf_pages(paths, limit):
+    from benchmark_extraction_cascade import find_pdfs
+    from processor import Processor
+    processor = Processor()
+    documents = []
+    for pdf_path in find_pdfs(paths, limit):
+        documents.append([text for _, text in processor.iter_pages('pypdf', pdf_path)])
+    return documents
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email scanner")
+    parser.add_argument('--pdfs', nargs='+', help="PDF files or directories to take the text from")
+    parser.add_argument('--limit', type=int, default=50, help="PDFs sampled from --pdfs")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print("Corpus mismatches:")
+    check_corpus()
+
+    documents = pdf_pages(args.pdfs, args.limit) if args.pdfs else [[FILLER, text, FILLER] for text, _ in CORPUS] * 20
+    size_mb = sum(len(page.encode()) for pages in documents for page in pages) / (1024 * 1024)
+    print(f"\nThroughput over {len(documents)} documents, {size_mb:.1f} MB:")
+    for name, func in (('legacy', lambda pages: legacy_extract_emails("\n".join(pages))), ('scanner', scan_pages)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for pages in documents:
+                func(pages)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"  {name:<8} {size_mb / elapsed:>8.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
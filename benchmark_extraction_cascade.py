@@ -0,0 +1,86 @@
+"""
+benchmark_extraction_cascade.py - Extraction cascade vs. running every extractor.
+
+For each PDF of a corpus, extracts text the old way (pypdf + pdfplumber on the
+whole document), with the cascade over whole documents (pypdf first,
+pdfplumber only when the text is empty, garbled or has no emails) and with the
+cascade reading the page window first (CRAWLER_PAGE_WINDOW), then reports
+files per second and email recall of both cascades relative to the full run.
+
+    python3 benchmark_extraction_cascade.py [--pdfs pdf_store downloads_ojs] [--limit 200]
+"""
+
+import argparse
+import collections
+import os
+import random
+import time
+
+from processor import Processor
+
+def find_pdfs(paths, limit):
+    pdfs = []
+    for path in paths:
+        if os.path.isfile(path):
+            pdfs.append(path)
+        elif os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                pdfs.extend(os.path.join(root, name) for name in names if name.lower().endswith('.pdf'))
+    random.seed(42)
+    random.shuffle(pdfs)
+    return pdfs[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF extraction cascade")
+    parser.add_argument('--pdfs', nargs='+', default=['pdf_store', 'downloads_ojs', 'downloads_scielo'], help="PDF files or directories")
+    parser.add_argument('--limit', type=int, default=200, help="Sample size")
+    args = parser.parse_args()
+
+    pdfs = find_pdfs(args.pdfs, args.limit)
+    if not pdfs:
+        print("No PDFs found.")
+        return
+
+    full_processor = Processor()
+    variants = [('cascade', Processor(window=(0, 0))), ('windowed', Processor())]
+    full_time = 0.0
+    full_emails = files_with_emails_full = 0
+    times = collections.Counter()
+    recalled = collections.Counter()
+    files_recalled = collections.Counter()
+    paths = collections.Counter()
+
+    for i, pdf_path in enumerate(pdfs, 1):
+        start = time.perf_counter()
+        full = set(full_processor.extract_emails(full_processor.extract_text_from_pdf(pdf_path, Processor.AVAILABLE_METHODS)))
+        full_time += time.perf_counter() - start
+        full_emails += len(full)
+        files_with_emails_full += bool(full)
+
+        for name, processor in variants:
+            start = time.perf_counter()
+            text, steps = processor.extract_with_cascade(pdf_path)
+            found = set(processor.extract_emails(text))
+            times[name] += time.perf_counter() - start
+            recalled[name] += len(full & found)
+            files_recalled[name] += bool(full and found)
+            if name == 'windowed':
+                paths[" > ".join(f"{method}:{verdict}" for method, verdict in steps)] += 1
+        print(f"\r{i}/{len(pdfs)}", end="", flush=True)
+
+    n = len(pdfs)
+    print(f"\n\n{'':<10} {'files/s':>8} {'total s':>8}")
+    print(f"{'full':<10} {n / full_time:>8.2f} {full_time:>8.1f}")
+    for name, _ in variants:
+        print(f"{name:<10} {n / times[name]:>8.2f} {times[name]:>8.1f}   ({full_time / times[name]:.1f}x)")
+    if full_emails:
+        print()
+        for name, _ in variants:
+            print(f"{name}: email recall {recalled[name]}/{full_emails} = {recalled[name] / full_emails:.1%}, "
+                  f"files with emails {files_recalled[name]}/{files_with_emails_full}")
+    print("\nWindowed cascade paths:")
+    for path, count in paths.most_common():
+        print(f"  {count:>5}  {path}")
+
+if __name__ == "__main__":
+    main()
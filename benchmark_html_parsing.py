@@ -0,0 +1,169 @@
+"""
+benchmark_html_parsing.py - Parse cost of crawler pages per parser backend.
+
+Times what the crawlers actually do with a page:
+  - listing pages (OJS archive/issue, SciELO grid/issue): collect every <a href>
+  - article landing pages: read the citation_* <meta> tags
+for the old full 'html.parser' tree against the lxml backend, the targeted
+SoupStrainer parses and selectolax, and checks they all extract the same data.
+
+Pages come from --pages (saved .html files or directories), otherwise from the
+HTTP cache (crawl_state/http_cache), otherwise a built-in synthetic OJS/SciELO set.
+
+    python3 benchmark_html_parsing.py [--pages saved_pages/] [--repeat 20]
+"""
+
+import argparse
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+import html_parsing
+from html_parsing import ARTICLE_META, LINKS, extract_links, make_soup
+
+def synthetic_pages():
+    nav = "".join(f'<li><a href="/index.php/rev/about/{i}">Menu {i}</a></li>' for i in range(30))
+    script = "<script>" + "var x = 1;" * 500 + "</script>"
+    paragraph = "<p>" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20 + "</p>"
+
+    ojs_issue = f"""<html><head><title>Issue</title>{script}</head><body><nav><ul>{nav}</ul></nav>
+        <div class="sections">""" + "".join(
+        f"""<div class="obj_article_summary"><h3 class="title"><a href="https://rev.org/index.php/rev/article/view/{i}">
+        Article {i}</a></h3><div class="meta"><div class="authors">Author A, Author B</div></div>
+        <ul class="galleys_links"><li><a class="obj_galley_link pdf" href="https://rev.org/index.php/rev/article/view/{i}/{i + 1000}">PDF</a></li></ul></div>"""
+        for i in range(80)) + "</div></body></html>"
+
+    ojs_article = f"""<html><head><title>Article</title>
+        <meta name="citation_title" content="Synthetic article">
+        {''.join(f'<meta name="citation_author" content="Author {i}">' for i in range(6))}
+        <meta name="citation_pdf_url" content="https://rev.org/index.php/rev/article/download/1/1001">{script}</head>
+        <body><nav><ul>{nav}</ul></nav><h1 class="page_title">Synthetic article</h1>
+        <section class="item abstract">{paragraph * 3}</section>
+        <section class="item references"><div class="value">{''.join(f'<p>Reference {i}. {paragraph}</p>' for i in range(60))}</div></section>
+        </body></html>"""
+
+    scielo_grid = f"""<html><head>{script}</head><body><nav><ul>{nav}</ul></nav><table>""" + "".join(
+        f'<tr><td>{year}</td>' + "".join(f'<td><a href="/j/rev/i/{year}.v{year - 1950}n{n}/">{n}</a></td>' for n in range(1, 7)) + '</tr>'
+        for year in range(1960, 2025)) + "</table></body></html>"
+
+    scielo_article = f"""<html><head>
+        <meta name="citation_title" content="Synthetic SciELO article">
+        {''.join(f'<meta name="citation_author" content="Author {i}">' for i in range(8))}
+        <meta name="citation_pdf_url" content="https://www.scielo.br/j/rev/a/abc/?format=pdf&lang=pt">{script}</head>
+        <body><nav><ul>{nav}</ul></nav><article>{paragraph * 150}</article>
+        <div class="ref-list">{''.join(f'<li>Reference {i}. {paragraph}</li>' for i in range(80))}</div></body></html>"""
+
+    return [
+        ('ojs issue (synthetic)', ojs_issue.encode()),
+        ('ojs article (synthetic)', ojs_article.encode()),
+        ('scielo grid (synthetic)', scielo_grid.encode()),
+        ('scielo article (synthetic)', scielo_article.encode()),
+    ]
+
+def saved_pages(paths):
+    pages = []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else [
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        ]
+        for file_path in sorted(files):
+            with open(file_path, 'rb') as f:
+                pages.append((os.path.basename(file_path), f.read()))
+    return pages
+
+def cached_pages(limit):
+    from http_cache import CACHE_DIR, HTTPCache
+    if not os.path.exists(os.path.join(CACHE_DIR, "index.db")):
+        return []
+    cache = HTTPCache()
+    rows = cache.conn.execute(
+        "SELECT url FROM entries WHERE content_type LIKE '%html%' ORDER BY accessed_at DESC LIMIT ?", (limit,)
+    ).fetchall()
+    pages = []
+    for url, in rows:
+        entry = cache.lookup(url)
+        body = cache.load_body(entry) if entry else None
+        if body:
+            pages.append((url, body))
+    cache.close()
+    return pages
+
+def is_article(content):
+    return b'citation_title' in content
+
+def links_full(content, parser):
+    soup = BeautifulSoup(content, parser)
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+def links_strained(content, parser):
+    soup = make_soup(content, LINKS, parser=parser)
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+def links_selectolax(content):
+    return [link.href for link in extract_links(content)]
+
+def meta_full(content, parser):
+    soup = BeautifulSoup(content, parser)
+    return [(m.get('name'), m.get('content')) for m in soup.find_all('meta', attrs={'name': True})]
+
+def meta_strained(content, parser):
+    soup = make_soup(content, ARTICLE_META, parser=parser)
+    return [(m.get('name'), m.get('content')) for m in soup.find_all('meta', attrs={'name': True})]
+
+def variants(article):
+    parsers = ['html.parser'] + (['lxml'] if html_parsing.DEFAULT_PARSER == 'lxml' else [])
+    found = []
+    if article:
+        for parser in parsers:
+            found.append((f"{parser} full", lambda c, p=parser: meta_full(c, p)))
+            found.append((f"{parser} meta-only", lambda c, p=parser: meta_strained(c, p)))
+    else:
+        for parser in parsers:
+            found.append((f"{parser} full", lambda c, p=parser: links_full(c, p)))
+            found.append((f"{parser} links-only", lambda c, p=parser: links_strained(c, p)))
+        if html_parsing.LexborHTMLParser is not None:
+            found.append(("selectolax links", links_selectolax))
+    return found
+
+def time_call(func, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(content)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML parser backends on crawler pages")
+    parser.add_argument('--pages', nargs='+', help="Saved HTML files or directories")
+    parser.add_argument('--limit', type=int, default=20, help="Pages taken from the HTTP cache")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = saved_pages(args.pages) if args.pages else (cached_pages(args.limit) or synthetic_pages())
+    print(f"Backends: default={html_parsing.PARSER} selectolax={'yes' if html_parsing.LexborHTMLParser else 'no'}")
+
+    totals = {}
+    for name, content in pages:
+        article = is_article(content)
+        print(f"\n{name[:70]} ({len(content) / 1024:.0f} KB, {'article' if article else 'listing'})")
+        baseline_ms = baseline = None
+        for label, func in variants(article):
+            ms, result = time_call(func, content, args.repeat)
+            if baseline is None:
+                baseline_ms, baseline = ms, result
+            same = "same" if result == baseline else "DIFFERENT"
+            print(f"  {label:<22} {ms:>8.2f} ms  {baseline_ms / ms:>6.1f}x  {same}")
+            key = ('article' if article else 'listing', label)
+            totals[key] = totals.get(key, 0) + ms
+
+    print("\nTotal per page kind:")
+    for kind in ('listing', 'article'):
+        rows = [(label, ms) for (k, label), ms in totals.items() if k == kind]
+        if not rows:
+            continue
+        base = rows[0][1]
+        for label, ms in rows:
+            print(f"  {kind:<8} {label:<22} {ms:>9.2f} ms  {base / ms:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+benchmark_queue_indexes.py - Queue poll latency vs. table size, with and without
+the indexes added by migrate_db_v3.py.
+
+Builds throwaway SQLite databases (never touches crawler.db), fills them with
+synthetic rows where only a small share is still pending (the typical state
+late in a crawl), and times the same lookups DBManager issues.
+
+Usage:
+    python3 benchmark_queue_indexes.py [--sizes 10000 100000 300000] [--repeat 50]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from database import Base
+from migrate_db_v3 import create_indexes, drop_indexes
+
+# Share of rows still waiting in each queue
+PENDING_RATIO = 0.01
+
+# name -> (sql, params factory)
+POLL_QUERIES = {
+    'claim discover': (
+        "SELECT id FROM editions WHERE status = 'found' AND worker_id IS NULL "
+        "AND journal_id IN (SELECT id FROM journals WHERE active = 1) ORDER BY id LIMIT 10",
+        lambda n: ()
+    ),
+    'claim crawl': (
+        "SELECT id FROM articles WHERE status = 'found' AND worker_id IS NULL ORDER BY id LIMIT 10",
+        lambda n: ()
+    ),
+    'claim process': (
+        "SELECT id FROM articles WHERE status = 'downloaded' AND worker_id IS NULL ORDER BY id LIMIT 10",
+        lambda n: ()
+    ),
+    'claim verify': (
+        "SELECT id FROM captured_emails WHERE verification_status = 'PENDING' AND worker_id IS NULL ORDER BY id LIMIT 10",
+        lambda n: ()
+    ),
+    'article by url': (
+        "SELECT id FROM articles WHERE url = ? LIMIT 1",
+        lambda n: (f"https://example.org/article/view/{random.randrange(n)}",)
+    ),
+    'file by path': (
+        "SELECT id FROM files WHERE local_path = ? LIMIT 1",
+        lambda n: (f"downloads_ojs/{random.randrange(n)}.pdf",)
+    ),
+}
+
+def pick_status(pending, done):
+    return pending if random.random() < PENDING_RATIO else done
+
+def build_db(path, size):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    drop_indexes(cur)
+
+    cur.execute("INSERT INTO journals (id, name, url, source_type, active, status) VALUES (1, 'Bench', 'https://example.org', 'ojs', 1, 'active')")
+
+    num_editions = max(size // 20, 1)
+    cur.executemany(
+        "INSERT INTO editions (id, journal_id, url, status) VALUES (?, 1, ?, ?)",
+        ((i, f"https://example.org/issue/view/{i}", pick_status('found', 'completed')) for i in range(1, num_editions + 1))
+    )
+    cur.executemany(
+        "INSERT INTO articles (id, edition_id, title, url, status) VALUES (?, ?, 'Bench', ?, ?)",
+        ((i, (i % num_editions) + 1, f"https://example.org/article/view/{i}",
+          random.choice([pick_status('found', 'completed'), pick_status('downloaded', 'completed')]))
+         for i in range(1, size + 1))
+    )
+    cur.executemany(
+        "INSERT INTO files (article_id, file_type, local_path) VALUES (?, 'pdf', ?)",
+        ((i, f"downloads_ojs/{i}.pdf") for i in range(1, size + 1))
+    )
+    cur.executemany(
+        "INSERT INTO captured_emails (email, article_id, verification_status) VALUES (?, ?, ?)",
+        ((f"author{i}@example.org", i, pick_status('PENDING', 'VALID')) for i in range(1, size + 1))
+    )
+    conn.commit()
+    return conn
+
+def time_queries(conn, size, repeat):
+    cur = conn.cursor()
+    results = {}
+    for name, (sql, params) in POLL_QUERIES.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            cur.execute(sql, params(size)).fetchall()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark queue poll latency with and without indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000], help="Rows in articles/files/captured_emails")
+    parser.add_argument('--repeat', type=int, default=50, help="Executions per query")
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"{'rows':>8}  {'query':<16} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            conn = build_db(path, size)
+
+            before = time_queries(conn, size, args.repeat)
+
+            create_indexes(conn.cursor(), verbose=False)
+            conn.execute("ANALYZE")
+            conn.commit()
+            after = time_queries(conn, size, args.repeat)
+            conn.close()
+
+        for name in POLL_QUERIES:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f"{size:>8}  {name:<16} {before[name]:>12.3f} {after[name]:>11.3f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
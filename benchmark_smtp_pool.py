@@ -0,0 +1,108 @@
+"""
+benchmark_smtp_pool.py - RCPT probes: one connection per address vs. pooled sessions.
+
+Starts a local SMTP stand-in (aiosmtpd, pip install aiosmtpd) that accepts
+mailboxes starting with "ok" and answers 550 for the rest, with an artificial
+greeting delay like a tarpitting MX. Then probes the same addresses the old
+way (connect, HELO, MAIL, RCPT, QUIT per address) and through smtp_pool.SMTPPool,
+and reports probes per second, connections opened and whether the verdicts agree.
+
+    python3 benchmark_smtp_pool.py [--emails 200] [--handshake-ms 100]
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import socket
+import tempfile
+import time
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+from host_scheduler import HostScheduler
+from smtp_pool import SMTPPool
+
+class StandIn:
+    """
+    aiosmtpd handler: mailbox exists if it starts with 'ok'.
+    """
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+
+    async def handle_HELO(self, server, session, envelope, hostname):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return '250 stand-in'
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if not address.startswith('ok'):
+            return '550 5.1.1 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+def legacy_probe(email, host, port):
+    server = smtplib.SMTP(timeout=5)
+    server.connect(host, port)
+    server.helo(socket.gethostname())
+    server.mail('test@example.com')
+    code, _ = server.rcpt(email)
+    server.quit()
+    return code
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled SMTP probing")
+    parser.add_argument('--emails', type=int, default=200)
+    parser.add_argument('--handshake-ms', type=int, default=100, help="Greeting delay of the stand-in MX")
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    if Controller is None:
+        print("aiosmtpd is not installed (pip install aiosmtpd).")
+        return
+
+    handler = StandIn(args.handshake_ms / 1000)
+    controller = Controller(handler, hostname='127.0.0.1', port=args.port)
+    controller.start()
+    emails = [f"{'ok' if i % 3 else 'no'}{i}@example.org" for i in range(args.emails)]
+    try:
+        start = time.perf_counter()
+        legacy = {email: legacy_probe(email, '127.0.0.1', args.port) for email in emails}
+        legacy_time = time.perf_counter() - start
+        legacy_connections = handler.connections
+
+        handler.connections = 0
+        with tempfile.TemporaryDirectory() as tmp:
+            scheduler = HostScheduler(os.path.join(tmp, 'hosts.db'))
+            pool = SMTPPool(scheduler=scheduler, port=args.port)
+            start = time.perf_counter()
+            # Same batching as the worker: groups of 50 addresses
+            pooled = {}
+            for i in range(0, len(emails), 50):
+                pooled.update(pool.probe({'127.0.0.1': emails[i:i + 50]}))
+            pooled_time = time.perf_counter() - start
+            pool.close()
+            scheduler.close()
+    finally:
+        controller.stop()
+
+    agree = sum(legacy[email] == pooled[email].code for email in emails)
+    n = len(emails)
+    print(f"{'':<10} {'probes/s':>9} {'total s':>8} {'connections':>12}")
+    print(f"{'legacy':<10} {n / legacy_time:>9.1f} {legacy_time:>8.2f} {legacy_connections:>12}")
+    print(f"{'pooled':<10} {n / pooled_time:>9.1f} {pooled_time:>8.2f} {handler.connections:>12}   ({legacy_time / pooled_time:.1f}x)")
+    print(f"\nSame verdict for {agree}/{n} addresses")
+
+if __name__ == "__main__":
+    main()
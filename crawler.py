@@ -1,8 +1,9 @@
 import os
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 import time
 from urllib.parse import urljoin
+from http_cache import cached_get
 
 class Crawler:
     def __init__(self, base_url, download_dir='downloads'):
@@ -17,9 +18,9 @@ class Crawler:
 
     def get_soup(self, url):
         try:
-            response = self.session.get(url, timeout=10)
+            response = cached_get(self.session, url, timeout=10)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
+            return make_soup(response.content)
         except Exception as e:
             print(f"Error fetching {url}: {e}")
             return None
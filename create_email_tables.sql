@@ -4,7 +4,11 @@ CREATE TABLE IF NOT EXISTS email_domains (
     has_dns BOOLEAN,
     has_mx BOOLEAN,
     mx_records TEXT,
-    checked_at DATETIME
+    checked_at DATETIME,
+    dns_status VARCHAR(20),
+    expires_at DATETIME,
+    smtp_policy VARCHAR(20),
+    policy_expires_at DATETIME
 );
 
 CREATE TABLE IF NOT EXISTS email_verifications (
@@ -16,6 +20,12 @@ CREATE TABLE IF NOT EXISTS email_verifications (
     mx_valid BOOLEAN,
     smtp_valid BOOLEAN,
     final_status VARCHAR(50),
+    detail VARCHAR(50),
     checked_at DATETIME,
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at DATETIME,
+    worker_id VARCHAR(50),
+    lock_time DATETIME,
+    lease_expires_at DATETIME,
     FOREIGN KEY(domain_id) REFERENCES email_domains(id)
 );
@@ -1,9 +1,27 @@
+from sqlalchemy import select, update, func, or_, and_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from database import Journal, Edition, Article, Author, File, FileAnalysisLog, CapturedEmail, get_session, init_db
+from database import Journal, Edition, Article, Author, File, FileAnalysisLog, CapturedEmail, EmailVerification, get_session, init_db, upsert
+from pdf_extraction_pool import QUARANTINE_STATUSES
 import datetime
+import threading
+
+# How long a claim stays valid without a heartbeat. Workers renew their
+# leases every LEASE_SECONDS / 3 (see LeaseHeartbeat), so a lease only
+# expires when its worker died or hung.
+LEASE_SECONDS = 300
 
 class DBManager:
+    # Work queues that can be claimed in batches.
+    # phase -> (model, status column, pending status, claimed status)
+    QUEUE_PHASES = {
+        'discover': (Edition, 'status', 'found', 'processing'),
+        'crawl': (Article, 'status', 'found', 'processing_crawling'),
+        'process': (Article, 'status', 'downloaded', 'processing_extraction'),
+        # One row per distinct address; verdicts are copied to CapturedEmail
+        'verify': (EmailVerification, 'final_status', 'PENDING', 'PROCESSING'),
+    }
+
     def __init__(self, engine=None):
         if engine:
             self.session = get_session(engine)
@@ -15,6 +33,217 @@ class DBManager:
     def close(self):
         self.session.close()
 
+    def _save(self, commit):
+        # commit=False: the caller groups several writes in one transaction
+        if commit:
+            self.session.commit()
+        else:
+            self.session.flush()
+
+    # --- Work Queues ---
+    @staticmethod
+    def _lease_expired(table, now):
+        # Rows claimed before leases existed have no expiry; fall back to lock_time
+        legacy_limit = now - datetime.timedelta(seconds=LEASE_SECONDS)
+        return or_(
+            table.c.lease_expires_at < now,
+            and_(table.c.lease_expires_at == None, or_(table.c.lock_time == None, table.c.lock_time < legacy_limit))
+        )
+
+    def claim_batch(self, phase, worker_id, n=1, lease_seconds=LEASE_SECONDS):
+        """
+        Atomically lease up to n pending rows of a work queue for worker_id.
+        phase: one of QUEUE_PHASES ('discover', 'crawl', 'process', 'verify').
+        Returns the claimed objects (empty list if the queue is empty).
+        """
+        model, status_col, pending_status, claimed_status = self.QUEUE_PHASES[phase]
+        table = model.__table__
+
+        now = datetime.datetime.utcnow()
+
+        # Single UPDATE ... WHERE id IN (SELECT ... LIMIT n) RETURNING id,
+        # so the whole batch costs one write transaction instead of one per row.
+        # Rows whose lease expired in this same phase are reclaimed as well,
+        # which keeps them in the right phase without an operator reset.
+        pending = and_(table.c[status_col] == pending_status, table.c.worker_id == None)
+        if 'next_attempt_at' in table.c:
+            # Rows waiting for a retry are not due yet
+            pending = and_(pending, or_(table.c.next_attempt_at == None, table.c.next_attempt_at <= now))
+        claimable = or_(
+            pending,
+            and_(table.c[status_col] == claimed_status, self._lease_expired(table, now))
+        )
+        candidates = select(table.c.id).where(claimable)
+        if model is Edition:
+            active_journals = select(Journal.__table__.c.id).where(Journal.__table__.c.active == True)
+            candidates = candidates.where(table.c.journal_id.in_(active_journals))
+        candidates = candidates.order_by(table.c.id).limit(n)
+        if self.session.get_bind().dialect.name == 'postgresql':
+            # Concurrent claimers skip rows another transaction is locking
+            # instead of queueing behind it (SELECT ... FOR UPDATE SKIP LOCKED).
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        stmt = update(table).where(
+            table.c.id.in_(candidates),
+            claimable # Re-verify status and lock
+        ).values({
+            status_col: claimed_status,
+            'worker_id': worker_id,
+            'lock_time': now,
+            'lease_expires_at': now + datetime.timedelta(seconds=lease_seconds)
+        }).returning(table.c.id)
+
+        try:
+            ids = [row[0] for row in self.session.execute(stmt)]
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error claiming {phase} batch: {e}")
+            return []
+
+        if not ids:
+            return []
+        return self.session.query(model).filter(model.id.in_(ids)).order_by(model.id).all()
+
+    def release_claims(self, phase, worker_id, ids):
+        """
+        Give back claimed rows that were not processed (e.g. on shutdown),
+        so other workers can pick them up.
+        """
+        if not ids:
+            return 0
+        model, status_col, pending_status, claimed_status = self.QUEUE_PHASES[phase]
+        table = model.__table__
+        try:
+            result = self.session.execute(update(table).where(
+                table.c.id.in_(list(ids)),
+                table.c[status_col] == claimed_status,
+                table.c.worker_id == worker_id
+            ).values({
+                status_col: pending_status,
+                'worker_id': None,
+                'lock_time': None,
+                'lease_expires_at': None
+            }))
+            self.session.commit()
+            return result.rowcount
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error releasing {phase} claims: {e}")
+            return 0
+
+    def _queue_count(self, phase, condition):
+        model, status_col, pending_status, claimed_status = self.QUEUE_PHASES[phase]
+        table = model.__table__
+        query = select(func.count()).select_from(table).where(condition(table, status_col, pending_status, claimed_status))
+        if model is Edition:
+            active_journals = select(Journal.__table__.c.id).where(Journal.__table__.c.active == True)
+            query = query.where(table.c.journal_id.in_(active_journals))
+        try:
+            count = self.session.execute(query).scalar()
+            self.session.commit()
+            return count
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error counting {phase} queue: {e}")
+            # Unknown: assume there is work left rather than quit early
+            return 1
+
+    def queue_remaining(self, phase, ignore_worker=None):
+        """
+        Rows of a work queue not done yet: pending (due or waiting for a
+        retry) or claimed. ignore_worker: an idle worker asking about others;
+        whatever it still has claimed was abandoned and doesn't count.
+        """
+        def remaining(table, status_col, pending_status, claimed_status):
+            claimed = table.c[status_col] == claimed_status
+            if ignore_worker:
+                claimed = and_(claimed, or_(table.c.worker_id == None, table.c.worker_id != ignore_worker))
+            return or_(and_(table.c[status_col] == pending_status, table.c.worker_id == None), claimed)
+        return self._queue_count(phase, remaining)
+
+    def live_claims(self, phase):
+        """
+        Rows of a work queue claimed under an unexpired lease (some worker is on them).
+        """
+        now = datetime.datetime.utcnow()
+        legacy_limit = now - datetime.timedelta(seconds=LEASE_SECONDS)
+        return self._queue_count(phase, lambda table, status_col, pending_status, claimed_status: and_(
+            table.c[status_col] == claimed_status,
+            or_(
+                table.c.lease_expires_at >= now,
+                and_(table.c.lease_expires_at == None, table.c.lock_time >= legacy_limit)
+            )
+        ))
+
+    def next_attempt_due(self, phase):
+        """
+        Earliest next_attempt_at of the rows waiting for a retry, or None.
+        """
+        model, status_col, pending_status, claimed_status = self.QUEUE_PHASES[phase]
+        table = model.__table__
+        if 'next_attempt_at' not in table.c:
+            return None
+        try:
+            due = self.session.execute(select(func.min(table.c.next_attempt_at)).where(
+                table.c[status_col] == pending_status,
+                table.c.next_attempt_at > datetime.datetime.utcnow()
+            )).scalar()
+            self.session.commit()
+            return due
+        except Exception:
+            self.session.rollback()
+            return None
+
+    def release_worker(self, worker_id):
+        """
+        Give back every row worker_id still has claimed, in any phase
+        (clean shutdown: no need to wait for the leases to run out).
+        """
+        released = 0
+        try:
+            for model, status_col, pending_status, claimed_status in self.QUEUE_PHASES.values():
+                table = model.__table__
+                result = self.session.execute(update(table).where(
+                    table.c[status_col] == claimed_status,
+                    table.c.worker_id == worker_id
+                ).values({
+                    status_col: pending_status,
+                    'worker_id': None,
+                    'lock_time': None,
+                    'lease_expires_at': None
+                }))
+                released += result.rowcount
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error releasing claims of {worker_id}: {e}")
+        return released
+
+    def renew_leases(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """
+        Heartbeat: extend every lease currently held by worker_id. Expired
+        leases are not revived: they belong to a dead run that used the same
+        id (or were abandoned), and are up for reclaiming.
+        """
+        now = datetime.datetime.utcnow()
+        expires = now + datetime.timedelta(seconds=lease_seconds)
+        renewed = 0
+        try:
+            for model, status_col, pending_status, claimed_status in self.QUEUE_PHASES.values():
+                table = model.__table__
+                result = self.session.execute(update(table).where(
+                    table.c[status_col] == claimed_status,
+                    table.c.worker_id == worker_id,
+                    table.c.lease_expires_at >= now
+                ).values(lease_expires_at=expires))
+                renewed += result.rowcount
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            print(f"Error renewing leases for {worker_id}: {e}")
+        return renewed
+
     # --- Journals ---
     def get_or_create_journal(self, name, url, source_type='ojs', acronym=None, issn=None):
         """
@@ -90,22 +319,29 @@ class DBManager:
             # Reset last_crawled_at and status so discovery will treat it as new
             self.session.query(Journal).filter_by(id=journal_id).update({
                 "last_crawled_at": None,
-                "status": "pending"
+                "status": "pending",
+                "discovery_watermark": None,
+                "discovered_at": None
             })
             
-            # Reset editions
-            self.session.query(Edition).filter_by(journal_id=journal_id).update({
-                "status": "found",
-                "worker_id": None,
-                "lock_time": None
-            })
+            # Reset editions. OAI editions have no issue page to scrape
+            # (synthetic ?issue= URLs): discovery harvests them again instead.
+            journal = self.session.query(Journal).get(journal_id)
+            if journal.source_type != 'ojs_oai':
+                self.session.query(Edition).filter_by(journal_id=journal_id).update({
+                    "status": "found",
+                    "worker_id": None,
+                    "lock_time": None,
+                    "lease_expires_at": None
+                })
             
             # Reset articles
             subq = self.session.query(Edition.id).filter_by(journal_id=journal_id)
             self.session.query(Article).filter(Article.edition_id.in_(subq)).update({
                 "status": "found",
                 "worker_id": None,
-                "lock_time": None
+                "lock_time": None,
+                "lease_expires_at": None
             }, synchronize_session=False)
             
             self.session.commit()
@@ -122,7 +358,7 @@ class DBManager:
             self.session.commit()
 
     # --- Editions ---
-    def get_or_create_edition(self, journal_id, url, title=None, volume=None, number=None, year=None):
+    def get_or_create_edition(self, journal_id, url, title=None, volume=None, number=None, year=None, status='found'):
         edition = self.session.query(Edition).filter_by(url=url).first()
         if not edition:
             edition = Edition(
@@ -131,7 +367,8 @@ class DBManager:
                 title=title,
                 volume=volume,
                 number=number,
-                year=year
+                year=year,
+                status=status
             )
             self.session.add(edition)
             try:
@@ -149,6 +386,41 @@ class DBManager:
             edition.lock_time = None
             self.session.commit()
     
+    def get_known_edition_urls(self, journal_id):
+        """
+        All edition URLs already stored for a journal, in one query.
+        """
+        rows = self.session.query(Edition.url).filter(Edition.journal_id == journal_id).all()
+        return {url for url, in rows}
+
+    def add_editions(self, journal_id, urls, known_urls=None):
+        """
+        Bulk-insert editions for URLs not stored yet. Returns how many were added.
+        """
+        known = known_urls if known_urls is not None else self.get_known_edition_urls(journal_id)
+        new_urls = list(dict.fromkeys(url for url in urls if url not in known))
+        if not new_urls:
+            return 0
+        try:
+            self.session.bulk_insert_mappings(Edition, [
+                {'journal_id': journal_id, 'url': url, 'status': 'found'} for url in new_urls
+            ])
+            self.session.commit()
+        except IntegrityError:
+            # Some URL is stored under another journal; fall back to one by one
+            self.session.rollback()
+            for url in new_urls:
+                self.get_or_create_edition(journal_id, url)
+        return len(new_urls)
+
+    def update_discovery_watermark(self, journal_id, newest_issue_url):
+        journal = self.session.query(Journal).get(journal_id)
+        if journal:
+            if newest_issue_url:
+                journal.discovery_watermark = newest_issue_url
+            journal.discovered_at = datetime.datetime.utcnow()
+            self.session.commit()
+
     def is_edition_completed(self, url):
         edition = self.session.query(Edition).filter_by(url=url).first()
         return edition and edition.status == 'completed'
@@ -157,88 +429,39 @@ class DBManager:
         """
         Atomically find and lock an edition for processing.
         """
-        # Find one that is pending or found, and NOT locked
-        # SQLite doesn't support SELECT ... FOR UPDATE, so we do best effort with check-then-set
-        # causing potential race conditions but acceptable for this scale if we handle it.
-        # Better: Update status where status='found' LIMIT 1
-        
-        # We need to find one.
-        # Filtering by status='found' (assuming initial state)
-        
+        claimed = self.claim_batch('discover', worker_id, 1)
+        return claimed[0] if claimed else None
+
+    def reset_stuck_tasks(self):
+        """
+        Put every row whose lease expired back to the status it had before
+        it was claimed (phase-aware). claim_batch already reclaims expired
+        leases on its own; this is for emptying the queues by hand.
+        """
+        now = datetime.datetime.utcnow()
+        counts = {}
         try:
-            # First, try to find a candidate
-            # We filter by journal.active=True as well
-            candidate = self.session.query(Edition).join(Journal).filter(
-                Journal.active == True,
-                Edition.status == 'found', # or 'pending'
-                Edition.worker_id == None
-            ).first()
-            
-            if candidate:
-                candidate.status = 'processing'
-                candidate.worker_id = worker_id
-                candidate.lock_time = datetime.datetime.utcnow()
-                self.session.commit()
-                return candidate
-            else:
-                return None
+            for phase, (model, status_col, pending_status, claimed_status) in self.QUEUE_PHASES.items():
+                table = model.__table__
+                result = self.session.execute(update(table).where(
+                    table.c[status_col] == claimed_status,
+                    self._lease_expired(table, now)
+                ).values({
+                    status_col: pending_status,
+                    'worker_id': None,
+                    'lock_time': None,
+                    'lease_expires_at': None
+                }))
+                counts[phase] = result.rowcount
+            self.session.commit()
         except Exception as e:
             self.session.rollback()
-            print(f"Error locking edition: {e}")
-            return None
+            print(f"Error resetting stuck tasks: {e}")
+            return {}
 
-    def reset_stuck_tasks(self, timeout_minutes=30):
-        """
-        Reset tasks that have been locked for too long.
-        """
-        limit = datetime.datetime.utcnow() - datetime.timedelta(minutes=timeout_minutes)
-        
-        # Reset Editions
-        num_editions = self.session.query(Edition).filter(
-            Edition.status == 'processing',
-            Edition.lock_time < limit
-        ).update({
-            'status': 'found', 
-            'worker_id': None, 
-            'lock_time': None
-        })
-        
-        # Reset Articles
-        num_articles = self.session.query(Article).filter(
-            Article.status == 'processing',
-            Article.lock_time < limit
-        ).update({
-            'status': 'downloaded', # Reset to downloaded so it can be picked up by processor? 
-                                    # Wait, processor picks up 'downloaded'? 
-                                    # If it was processing extraction, it should go back to 'downloaded' or 'found'?
-                                    # If it was 'found' and being downloaded, it should go back to 'found'.
-                                    # We need to distinguish phases.
-                                    # Orchestrator (Crawling) locks Article to download PDF? 
-                                    # Actually Orchestrator processes Issue to find Articles.
-                                    # Then it downloads PDFs.
-                                    # So Orchestrator might lock Article to download it.
-                                    # Let's say: 
-                                    # Phase 1: Discovery -> Adds Articles with status='found'
-                                    # Phase 2: Crawling -> Picks 'found' Article -> 'downloading' -> 'downloaded'
-                                    # Phase 3: Processing -> Picks 'downloaded' Article -> 'extracting' -> 'completed'
-           'worker_id': None,
-           'lock_time': None
-        })
-        
-        # Use simpler logic for now: Just reset 'processing' ones.
-        # But we need to know previous state. 
-        # For Edition: found -> processing -> completed. Reset to found.
-        # For Article (Crawling): found -> processing -> downloaded. Reset to found.
-        # For Article (Extraction): downloaded -> processing_extraction -> completed. Reset to downloaded.
-        
-        # Current DB schema only has 'status'.
-        # Let's assume 'processing' tasks go back to 'found' for now, 
-        # implying we might re-download. 
-        # But wait, we want to separate Crawling (PDF download) and Processing (Text extraction).
-        
-        self.session.commit()
-        if num_editions > 0 or num_articles > 0:
-            print(f"Reset {num_editions} stuck editions and {num_articles} stuck articles.")
+        if any(counts.values()):
+            print("Reset expired leases: " + ", ".join(f"{phase}={num}" for phase, num in counts.items()))
+        return counts
 
 
     # --- Articles ---
@@ -321,13 +544,28 @@ class DBManager:
         if article.status == 'completed':
             return True
             
-        # Also check if we actually have files for it
+        # Also check if we actually have downloaded files for it
         # If we have files, we can consider it effectively downloaded/complete
-        if article.files:
+        # (pending OAI galleys have no local_path yet)
+        if any(f.local_path for f in article.files):
             return True
             
         return False
 
+    def move_article(self, article_id, status, claimed_by=None, lease_seconds=LEASE_SECONDS, commit=True):
+        """
+        Set an article's status; claimed_by keeps it leased to that worker
+        (e.g. downloaded and handed straight to the same worker's extraction).
+        """
+        now = datetime.datetime.utcnow()
+        self.session.execute(update(Article.__table__).where(Article.__table__.c.id == article_id).values(
+            status=status,
+            worker_id=claimed_by,
+            lock_time=now if claimed_by else None,
+            lease_expires_at=now + datetime.timedelta(seconds=lease_seconds) if claimed_by else None
+        ))
+        self._save(commit)
+
     def mark_article_completed(self, article_id):
         article = self.session.query(Article).get(article_id)
         if article:
@@ -397,89 +635,45 @@ class DBManager:
         Get next article that needs PDF download. 
         Status: 'found' -> 'processing_crawling'
         """
-        try:
-            # Optimistic locking loop
-            for _ in range(3): # 3 attempts
-                # 1. Select candidate
-                candidate = self.session.query(Article).filter(
-                    Article.status == 'found',
-                    Article.worker_id == None
-                ).first()
-                
-                if not candidate:
-                    return None
-                
-                # 2. Attempt to lock
-                # Use query().update() directly to ensure atomicity at DB level
-                count = self.session.query(Article).filter(
-                    Article.id == candidate.id,
-                    Article.status == 'found', # Re-verify status
-                    Article.worker_id == None  # Re-verify lock
-                ).update({
-                    'status': 'processing_crawling',
-                    'worker_id': worker_id,
-                    'lock_time': datetime.datetime.utcnow()
-                })
-                
-                if count == 1:
-                    self.session.commit()
-                    # Return the object (refresh to get updated state if needed, though we have ID)
-                    return candidate
-                else:
-                    self.session.rollback()
-                    # Retry
-                    continue
-            
-            return None
-        except Exception as e:
-            self.session.rollback()
-            print(f"Error locking article: {e}")
-            return None
+        claimed = self.claim_batch('crawl', worker_id, 1)
+        return claimed[0] if claimed else None
 
     def get_next_article_for_processing(self, worker_id):
         """
         Get next article that needs extraction. 
         Status: 'downloaded' -> 'processing_extraction'
         """
-        try:
-            for _ in range(3):
-                # 1. Select candidate
-                candidate = self.session.query(Article).filter(
-                    Article.status == 'downloaded',
-                    Article.worker_id == None
-                ).first()
-                
-                if not candidate:
-                    return None
-                
-                # 2. Lock
-                count = self.session.query(Article).filter(
-                    Article.id == candidate.id,
-                    Article.status == 'downloaded',
-                    Article.worker_id == None
-                ).update({
-                    'status': 'processing_extraction',
-                    'worker_id': worker_id,
-                    'lock_time': datetime.datetime.utcnow()
-                })
-                
-                if count == 1:
-                    self.session.commit()
-                    return candidate
-                else:
-                    self.session.rollback()
-                    continue
-            
-            return None
-        except Exception as e:
-            self.session.rollback()
-            print(f"Error locking article for processing: {e}")
-            return None
+        claimed = self.claim_batch('process', worker_id, 1)
+        return claimed[0] if claimed else None
 
     # --- Captured Emails ---
+    def get_or_create_address(self, email):
+        """
+        The address row of email (the unit the verifier works on); a new
+        address enters the 'verify' queue.
+        """
+        address = self.session.query(EmailVerification).filter_by(email=email).first()
+        if not address:
+            address = EmailVerification(email=email, final_status='PENDING')
+            self.session.add(address)
+            try:
+                self.session.commit()
+            except IntegrityError:
+                self.session.rollback()
+                # Another processor added it first
+                address = self.session.query(EmailVerification).filter_by(email=email).first()
+        elif address.final_status == 'UNKNOWN':
+            # Seen again: give it another try, with a fresh retry budget
+            address.final_status = 'PENDING'
+            address.attempts = 0
+            address.next_attempt_at = None
+            self.session.commit()
+        return address
+
     def add_captured_email(self, article_id, email):
         """
-        Add a captured email to the global list for verification.
+        Link an email to an article. Verification happens once per address;
+        a link to an already verified address gets its verdict right away.
         """
         # Lowercase for consistency
         email_normalized = email.strip().lower()
@@ -491,109 +685,171 @@ class DBManager:
         ).first()
         
         if not existing:
-            # Check if this email was already verified in ANOTHER article to avoid re-testing
-            already_tested = self.session.query(CapturedEmail).filter(
-                CapturedEmail.email == email_normalized,
-                CapturedEmail.verification_status.in_(['VALID', 'INVALID'])
-            ).first()
-            
-            initial_status = 'PENDING'
-            if already_tested:
-                initial_status = already_tested.verification_status
-                
+            address = self.get_or_create_address(email_normalized)
             captured = CapturedEmail(
                 article_id=article_id,
                 email=email_normalized,
-                verification_status=initial_status
+                address_id=address.id,
+                verification_status='PENDING'
             )
-            # If we copy from a previously tested email, we can also copy its details
-            if already_tested:
-                captured.valid_syntax = already_tested.valid_syntax
-                captured.valid_domain = already_tested.valid_domain
-                captured.valid_mx = already_tested.valid_mx
-                captured.valid_smtp = already_tested.valid_smtp
+            if address.final_status in ('VALID', 'INVALID'):
+                captured.verification_status = address.final_status
+                captured.valid_syntax = address.format_valid
+                captured.valid_domain = address.domain_valid
+                captured.valid_mx = address.mx_valid
+                captured.valid_smtp = address.smtp_valid
                 
             self.session.add(captured)
             self.session.commit()
             return captured
         return existing
 
-    def get_next_email_for_verification(self, worker_id):
+    def add_captured_emails(self, article_id, emails, commit=True):
         """
-        Get next PENDING email for verification. 
+        add_captured_email for many emails of an article, in a few statements
+        (addresses are inserted with ON CONFLICT DO NOTHING, so concurrent
+        processors don't collide).
         """
-        try:
-            for _ in range(3):
-                candidate = self.session.query(CapturedEmail).filter(
-                    CapturedEmail.verification_status == 'PENDING',
-                    CapturedEmail.worker_id == None
-                ).first()
-                
-                if not candidate:
-                    return None
-                
-                count = self.session.query(CapturedEmail).filter(
-                    CapturedEmail.id == candidate.id,
-                    CapturedEmail.verification_status == 'PENDING',
-                    CapturedEmail.worker_id == None
-                ).update({
-                    'verification_status': 'PROCESSING',
-                    'worker_id': worker_id,
-                    'lock_time': datetime.datetime.utcnow()
-                })
-                
-                if count == 1:
-                    self.session.commit()
-                    return candidate
-                else:
-                    self.session.rollback()
-                    continue
-            return None
+        emails = sorted({email.strip().lower() for email in emails})
+        if not emails:
+            return
+        addresses = EmailVerification.__table__
+        upsert(self.session, addresses, [{'email': email, 'final_status': 'PENDING'} for email in emails], 'email', update=False)
+        # Seen again: give UNKNOWN addresses another try, with a fresh retry budget
+        self.session.execute(update(addresses).where(
+            addresses.c.email.in_(emails), addresses.c.final_status == 'UNKNOWN'
+        ).values(final_status='PENDING', attempts=0, next_attempt_at=None))
+        rows = {row.email: row for row in self.session.execute(select(addresses).where(addresses.c.email.in_(emails)))}
+        linked = {email for (email,) in self.session.execute(select(CapturedEmail.__table__.c.email).where(
+            CapturedEmail.__table__.c.article_id == article_id, CapturedEmail.__table__.c.email.in_(emails)
+        ))}
+        for email in emails:
+            if email in linked:
+                continue
+            address = rows[email]
+            captured = CapturedEmail(article_id=article_id, email=email, address_id=address.id, verification_status='PENDING')
+            if address.final_status in ('VALID', 'INVALID'):
+                captured.verification_status = address.final_status
+                captured.valid_syntax = address.format_valid
+                captured.valid_domain = address.domain_valid
+                captured.valid_mx = address.mx_valid
+                captured.valid_smtp = address.smtp_valid
+            self.session.add(captured)
+        self._save(commit)
 
-        except Exception as e:
-            self.session.rollback()
-            print(f"Error locking email for verification: {e}")
-            return None
+    def get_next_email_for_verification(self, worker_id):
+        """
+        Get next PENDING address for verification.
+        """
+        claimed = self.claim_batch('verify', worker_id, 1)
+        return claimed[0] if claimed else None
 
+    # --- Files ---
+    def add_pending_file(self, article_id, url, file_type='pdf'):
+        """
+        Remote file known before download (e.g. an OAI galley link); add_file
+        fills in its local_path once downloaded.
+        """
+        existing = self.session.query(File).filter_by(article_id=article_id, url=url).first()
+        if not existing:
+            existing = File(article_id=article_id, file_type=file_type, url=url)
+            self.session.add(existing)
+            self.session.commit()
+        return existing
 
+    def get_pending_file(self, article):
+        for f in article.files:
+            if f.file_type == 'pdf' and f.url and not f.local_path:
+                return f
+        return None
 
-    # --- Files ---
-    def add_file(self, article_id, local_path, file_type='pdf', url=None):
+    def add_file(self, article_id, local_path, file_type='pdf', url=None, checksum=None, size=None, commit=True):
         existing = self.session.query(File).filter_by(article_id=article_id, local_path=local_path).first()
+        if not existing and url:
+            existing = self.session.query(File).filter_by(article_id=article_id, url=url, local_path=None).first()
+            if existing:
+                existing.local_path = local_path
+                self._save(commit)
         if not existing:
             new_file = File(
                 article_id=article_id,
                 local_path=local_path,
                 file_type=file_type,
-                url=url
+                url=url,
+                checksum=checksum,
+                size=size
             )
             self.session.add(new_file)
-            self.session.commit()
+            self._save(commit)
             return new_file
+        if checksum and (existing.checksum != checksum or existing.size != size):
+            existing.checksum = checksum
+            existing.size = size
+            self._save(commit)
         return existing
 
     def get_file_by_path(self, local_path):
         return self.session.query(File).filter_by(local_path=local_path).first()
 
-    def record_analysis_log(self, file_id, method, status='completed'):
+    def get_article_file(self, article_id, local_path):
+        return self.session.query(File).filter_by(article_id=article_id, local_path=local_path).first()
+
+    def record_analysis_log(self, file_id, method, status='completed', detail=None, commit=True):
         """
         Record that a specific analysis method was run on a file.
         """
         log = FileAnalysisLog(
             file_id=file_id,
             method_name=method,
-            status=status
+            status=status,
+            detail=detail
         )
         self.session.add(log)
-        self.session.commit()
+        self._save(commit)
     
     def is_method_already_run(self, file_id, method):
         """
-        Check if a method has already been run successfully on a file.
+        Check if a method has already been run successfully on a file, or
+        was skipped by the extraction cascade (an earlier method found emails).
         """
-        log = self.session.query(FileAnalysisLog).filter_by(
-            file_id=file_id, 
-            method_name=method,
-            status='completed'
+        log = self.session.query(FileAnalysisLog).filter(
+            FileAnalysisLog.file_id == file_id,
+            FileAnalysisLog.method_name == method,
+            FileAnalysisLog.status.in_(('completed', 'skipped'))
+        ).first()
+        return log is not None
+
+    def is_file_quarantined(self, file_id):
+        """
+        True if extracting this file ever timed out, ran out of memory, crashed or raised.
+        """
+        log = self.session.query(FileAnalysisLog).filter(
+            FileAnalysisLog.file_id == file_id,
+            FileAnalysisLog.method_name == 'extraction',
+            FileAnalysisLog.status.in_(QUARANTINE_STATUSES)
         ).first()
         return log is not None
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Background thread renewing the leases held by a worker while it is alive.
+    Uses its own DBManager, since sessions must not be shared across threads.
+    """
+    def __init__(self, worker_id, interval=LEASE_SECONDS / 3):
+        super().__init__(daemon=True)
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        db_manager = DBManager()
+        try:
+            while not self.stopped.wait(self.interval):
+                db_manager.renew_leases(self.worker_id)
+        finally:
+            db_manager.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,276 @@
+"""
+domain_cache.py - MX lookups for the verifiers, cached per domain.
+
+Domains are resolved with dnspython's async resolver, a whole batch at once,
+and the verdict is kept in the email_domains table until its TTL runs out, so
+thousands of addresses at usp.br or gmail.com cost one MX lookup for every
+verifier process instead of one per address:
+  - positive answers live for the record TTL, clamped to [MIN_TTL, MAX_TTL]
+  - NXDOMAIN (and domains with no MX nor address records) are cached too,
+    for NEGATIVE_TTL
+  - timeouts and SERVFAIL are kept only ERROR_TTL, so a flaky name server is
+    retried soon but not once per address
+
+The same rows keep the domain's SMTP policy, learned by probing one random
+mailbox that can't exist (random_mailbox): a server that accepts it accepts
+anything (ACCEPT_ALL, catch-all), one that refuses us by policy (MAIL FROM
+rejected, 5.7.x) refuses everything (REJECT_ALL). Either way probing the
+domain's real addresses tells nothing, so the verifier skips them until the
+verdict expires.
+
+    cache = DomainCache(db_manager.session)
+    info = cache.lookup({'usp.br', 'gmail.com'})['usp.br']
+    info.mx_hosts  # ['mx1.usp.br', ...], best preference first
+
+    cache.get_policies({'usp.br'})  # {'usp.br': 'NORMAL'} once probed
+
+    python3 domain_cache.py usp.br gmail.com   # resolve and print
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import re
+import sys
+import uuid
+from collections import namedtuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.name
+import dns.resolver
+from sqlalchemy import select
+
+from database import EmailDomain, upsert
+
+DNS_TIMEOUT = 5
+DNS_CONCURRENCY = int(os.environ.get('CRAWLER_DNS_CONCURRENCY', 50))
+MIN_TTL = 300
+MAX_TTL = 86400
+NEGATIVE_TTL = int(os.environ.get('CRAWLER_DNS_NEGATIVE_TTL', 3600))
+ERROR_TTL = 60
+
+# dns_status values
+MX = 'MX'
+NO_MX = 'NO_MX'          # no MX, but address records (implicit MX)
+NO_MAIL = 'NO_MAIL'      # null MX (RFC 7505), or neither MX nor address records
+NXDOMAIN = 'NXDOMAIN'
+ERROR = 'ERROR'          # timeout / SERVFAIL, not a verdict on the domain
+
+# smtp_policy values
+ACCEPT_ALL = 'ACCEPT_ALL'
+REJECT_ALL = 'REJECT_ALL'
+NORMAL = 'NORMAL'
+POLICY_TTL = {
+    ACCEPT_ALL: int(os.environ.get('CRAWLER_CATCH_ALL_TTL', 7 * 86400)),
+    REJECT_ALL: 86400, # blocks get lifted; look again sooner
+    NORMAL: 7 * 86400,
+}
+# Enhanced status 5.7.x: refused for who we are, not for the mailbox
+POLICY_REJECTION = re.compile(r'\b5\.7\.\d{1,3}\b')
+
+class DomainInfo(namedtuple('DomainInfo', 'domain status mx_hosts expires_at')):
+    @property
+    def has_dns(self):
+        return self.status in (MX, NO_MX)
+
+    @property
+    def has_mx(self):
+        return self.status == MX
+
+    @property
+    def mx(self):
+        return self.mx_hosts[0] if self.mx_hosts else None
+
+def random_mailbox(domain):
+    return f"nx{uuid.uuid4().hex[:16]}@{domain}"
+
+def policy_from_probe(result):
+    """
+    Domain policy from the answer to random_mailbox (a smtp_pool.ProbeResult),
+    or None when the answer says nothing (4xx, no answer).
+    """
+    if result is None or result.code is None:
+        return None
+    if result.code in (250, 251):
+        return ACCEPT_ALL
+    if 500 <= result.code < 600:
+        if result.stage == 'MAIL' or POLICY_REJECTION.search(result.message or ''):
+            return REJECT_ALL
+        return NORMAL
+    return None
+
+def _row_to_info(row):
+    return DomainInfo(row.domain, row.dns_status, json.loads(row.mx_records) if row.mx_records else [], row.expires_at)
+
+class DomainCache:
+    def __init__(self, session, resolver=None):
+        self.session = session
+        if resolver is None:
+            resolver = dns.asyncresolver.Resolver()
+            resolver.timeout = DNS_TIMEOUT
+            resolver.lifetime = DNS_TIMEOUT
+        self.resolver = resolver
+        self.memory = {}
+        self.policies = {}
+        self.hits = self.shared_hits = self.lookups = 0
+
+    def lookup(self, domains):
+        """
+        {domain: DomainInfo} for every domain; unexpired entries (this process
+        first, then the shared table) are used as they are, the rest are
+        resolved concurrently and stored.
+        """
+        now = datetime.datetime.utcnow()
+        domains = {d.lower() for d in domains}
+        found = {}
+        for domain in domains:
+            info = self.memory.get(domain)
+            if info and info.expires_at > now:
+                found[domain] = info
+        self.hits += len(found)
+
+        missing = domains - found.keys()
+        if missing:
+            shared = self._load(missing, now)
+            self.shared_hits += len(shared)
+            found.update(shared)
+            self.memory.update(shared)
+            missing -= shared.keys()
+
+        if missing:
+            resolved = asyncio.run(self.resolve(missing))
+            self.lookups += len(resolved)
+            self._store(resolved.values())
+            found.update(resolved)
+            self.memory.update(resolved)
+        return found
+
+    async def resolve(self, domains):
+        """
+        Resolve domains concurrently (no cache): {domain: DomainInfo}.
+        """
+        semaphore = asyncio.Semaphore(DNS_CONCURRENCY)
+
+        async def one(domain):
+            async with semaphore:
+                return await self.resolve_domain(domain)
+
+        infos = await asyncio.gather(*(one(d) for d in domains))
+        return {info.domain: info for info in infos}
+
+    async def resolve_domain(self, domain):
+        status, hosts, ttl = await self._query(domain)
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+        return DomainInfo(domain, status, hosts, expires_at)
+
+    async def _query(self, domain):
+        """
+        (status, mx hosts, seconds to keep the answer)
+        """
+        try:
+            answer = await self.resolver.resolve(domain, 'MX')
+            records = sorted(answer, key=lambda r: r.preference)
+            hosts = [str(r.exchange).rstrip('.') for r in records]
+            hosts = [h for h in hosts if h]
+            if not hosts:
+                return NO_MAIL, [], NEGATIVE_TTL
+            return MX, hosts, self._clamp(answer.rrset.ttl)
+        except (dns.resolver.NXDOMAIN, dns.name.EmptyLabel, dns.name.LabelTooLong, dns.name.NameTooLong):
+            return NXDOMAIN, [], NEGATIVE_TTL
+        except dns.resolver.NoAnswer:
+            pass
+        except dns.exception.DNSException:
+            return ERROR, [], ERROR_TTL
+
+        try:
+            answer = await self.resolver.resolve(domain, 'A')
+            return NO_MX, [], self._clamp(answer.rrset.ttl)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return NO_MAIL, [], NEGATIVE_TTL
+        except dns.exception.DNSException:
+            return ERROR, [], ERROR_TTL
+
+    @staticmethod
+    def _clamp(ttl):
+        return min(max(ttl, MIN_TTL), MAX_TTL)
+
+    def get_policies(self, domains):
+        """
+        {domain: smtp policy} for the domains with an unexpired verdict.
+        """
+        now = datetime.datetime.utcnow()
+        found = {}
+        for domain in domains:
+            entry = self.policies.get(domain)
+            if entry and entry[1] > now:
+                found[domain] = entry[0]
+        missing = set(domains) - found.keys()
+        if missing:
+            table = EmailDomain.__table__
+            rows = self.session.execute(
+                select(table.c.domain, table.c.smtp_policy, table.c.policy_expires_at).where(
+                    table.c.domain.in_(missing),
+                    table.c.smtp_policy != None,
+                    table.c.policy_expires_at > now
+                )
+            ).fetchall()
+            for row in rows:
+                self.policies[row.domain] = (row.smtp_policy, row.policy_expires_at)
+                found[row.domain] = row.smtp_policy
+        return found
+
+    def set_policies(self, policies):
+        """
+        Store {domain: smtp policy}, each for its POLICY_TTL.
+        """
+        now = datetime.datetime.utcnow()
+        rows = []
+        for domain, policy in policies.items():
+            expires_at = now + datetime.timedelta(seconds=POLICY_TTL[policy])
+            self.policies[domain] = (policy, expires_at)
+            rows.append({'domain': domain, 'smtp_policy': policy, 'policy_expires_at': expires_at})
+        self._upsert(rows)
+
+    # --- Shared table ---
+    def _load(self, domains, now):
+        table = EmailDomain.__table__
+        rows = self.session.execute(
+            select(table.c.domain, table.c.dns_status, table.c.mx_records, table.c.expires_at).where(
+                table.c.domain.in_(domains),
+                table.c.dns_status != None,
+                table.c.expires_at > now
+            )
+        ).fetchall()
+        return {row.domain: _row_to_info(row) for row in rows}
+
+    def _store(self, infos):
+        rows = [{
+            'domain': info.domain,
+            'has_dns': info.has_dns,
+            'has_mx': info.has_mx,
+            'mx_records': json.dumps(info.mx_hosts),
+            'checked_at': datetime.datetime.utcnow(),
+            'dns_status': info.status,
+            'expires_at': info.expires_at,
+        } for info in infos]
+        self._upsert(rows)
+
+    def _upsert(self, rows):
+        if not rows:
+            return
+        try:
+            upsert(self.session, EmailDomain.__table__, rows, 'domain')
+            self.session.commit()
+        except Exception:
+            # Losing a cache write only costs a lookup later
+            self.session.rollback()
+
+if __name__ == "__main__":
+    from database import init_db, get_session
+    session = get_session(init_db())
+    cache = DomainCache(session)
+    for domain, info in sorted(cache.lookup(sys.argv[1:]).items()):
+        print(f"{domain}: {info.status} {', '.join(info.mx_hosts)} (until {info.expires_at:%Y-%m-%d %H:%M} UTC)")
+    session.close()
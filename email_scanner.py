@@ -0,0 +1,140 @@
+"""
+email_scanner.py - Email addresses in text extracted from PDFs.
+
+One compiled pattern, one pass per page:
+  - the pattern only runs in small spans around each '@' / [at], found
+    with a cheap scan, instead of being tried at every position of the page
+  - unicode lookalikes (fullwidth @ and dots, ligatures, soft hyphens,
+    zero-width and non-breaking spaces) are folded first, when present
+  - obfuscated separators are part of the pattern: [at] (at) {at} [arroba],
+    [dot] (dot) [ponto]; the bare word ' at ' is not (too many false positives)
+  - addresses broken by the PDF line wrapping are joined, but only where the
+    break sits next to '@', next to a domain dot or after a domain hyphen;
+    a word break inside the local part can't be told from two separate words
+
+A domain label that follows a dot with whitespace around it ("x.org. the")
+only counts when it looks like a TLD, and the TLD is cut at a case change
+("ufsm.brName" -> "ufsm.br"), so merged words don't leak into the address.
+
+    scanner = EmailScanner()
+    for page in pages:
+        scanner.feed(page)
+    scanner.emails
+"""
+
+import re
+
+_LOOKALIKES = {
+    '\uff20': '@', '\ufe6b': '@',                    # fullwidth / small commercial at
+    '\uff0e': '.', '\ufe52': '.', '\u2024': '.',     # fullwidth / small full stop, one dot leader
+    '\u2010': '-', '\u2011': '-', '\u2212': '-', '\uff0d': '-',  # hyphens, minus
+    '\uff3f': '_',
+    '\ufb00': 'ff', '\ufb01': 'fi', '\ufb02': 'fl', '\ufb03': 'ffi', '\ufb04': 'ffl',  # ligatures
+    '\u00a0': ' ', '\u2009': ' ', '\u202f': ' ',     # non-breaking / thin spaces
+    '\u00ad': None, '\u200b': None, '\u200c': None, '\u200d': None, '\ufeff': None,  # soft hyphen, zero-width
+}
+LOOKALIKE_CHARS = re.compile('[' + ''.join(_LOOKALIKES) + ']')
+
+# File names that look like addresses (logo@2x.png)
+NOT_TLDS = {'png', 'jpg', 'jpeg', 'gif', 'svg', 'pdf', 'tif', 'tiff', 'bmp', 'webp', 'js', 'css', 'html', 'htm', 'php'}
+# TLDs accepted after a dot with whitespace around it (besides any 2-letter country code)
+COMMON_TLDS = {'com', 'org', 'net', 'edu', 'gov', 'mil', 'int', 'info', 'biz'}
+
+_BREAK = r'[ \t]*(?:\r?\n[ \t]*)?'
+_AT = rf'{_BREAK}(?:@|[\[({{<][ \t]*(?i:at|arroba)[ \t]*[\])}}>]){_BREAK}'
+_DOT = rf'{_BREAK}(?:\.|[ \t]*[\[({{<][ \t]*(?i:dot|ponto)[ \t]*[\])}}>][ \t]*){_BREAK}'
+_LABEL = r'[A-Za-z0-9-]+(?:(?<=-)[ \t]*\r?\n[ \t]*[A-Za-z0-9-]+)*'
+
+EMAIL_PATTERN = re.compile(
+    rf'(?<![\w.%+-])([A-Za-z0-9._%+-]+){_AT}({_LABEL}(?:{_DOT}{_LABEL})+)'
+)
+# Where an address can be: the pattern only runs around these
+AT_ANCHOR = re.compile(r'@|[\[({<][ \t]*(?i:at|arroba)[ \t]*[\])}>]')
+LOCAL_REACH = 100   # chars before the anchor: local part (<= 64) plus a line break
+DOMAIN_REACH = 300  # chars after it: domain (<= 255) plus breaks and obfuscated dots
+DOT_SEPARATOR = re.compile(f'({_DOT})')
+TLD_PATTERN = re.compile(r'[a-z]{2,}|[A-Z]{2,}')
+WHITESPACE = re.compile(r'\s+')
+
+def normalize(text):
+    if LOOKALIKE_CHARS.search(text) is None:
+        return text
+    return LOOKALIKE_CHARS.sub(lambda m: _LOOKALIKES[m.group()] or '', text)
+
+def _regions(text):
+    """
+    (start, end) spans around every '@' / [at], merged where they overlap.
+    Scanning for the anchor is far cheaper than trying the pattern everywhere.
+    """
+    start = end = None
+    for anchor in AT_ANCHOR.finditer(text):
+        if end is not None and anchor.start() - LOCAL_REACH <= end:
+            end = anchor.end() + DOMAIN_REACH
+            continue
+        if end is not None:
+            yield start, end
+        start, end = max(anchor.start() - LOCAL_REACH, 0), anchor.end() + DOMAIN_REACH
+    if end is not None:
+        yield start, end
+
+def _clean_domain(raw):
+    parts = DOT_SEPARATOR.split(raw)
+    labels = [WHITESPACE.sub('', label) for label in parts[0::2]]
+    separators = parts[1::2]
+
+    domain = [labels[0]]
+    for i, separator in enumerate(separators, 1):
+        label = labels[i]
+        loose = separator.strip(' \t\r\n') == '.' and separator != '.'
+        if loose and i == len(labels) - 1 and not (len(label) == 2 or label.lower() in COMMON_TLDS):
+            break
+        domain.append(label)
+
+    while len(domain) > 1:
+        tld = TLD_PATTERN.match(domain[-1])
+        if tld and tld.group().lower() not in NOT_TLDS:
+            domain[-1] = tld.group()
+            return ".".join(domain)
+        domain.pop()
+    return None
+
+def iter_emails(text):
+    """
+    Yield every address in text (normalized, lowercase, duplicates included).
+    """
+    text = normalize(text)
+    for start, end in _regions(text):
+        # pos/endpos don't slice: the lookbehind still sees the text before `start`
+        for match in EMAIL_PATTERN.finditer(text, start, end):
+            local = WHITESPACE.sub('', match.group(1)).strip('.')
+            domain = _clean_domain(match.group(2))
+            if local and domain and '..' not in local:
+                yield f"{local}@{domain}".lower()
+
+def find_emails(text):
+    """
+    Unique addresses of text, in order of appearance.
+    """
+    return list(dict.fromkeys(iter_emails(text)))
+
+class EmailScanner:
+    """
+    Accumulates the unique addresses of a document fed page by page.
+    """
+    def __init__(self):
+        self._emails = {}
+
+    def feed(self, text):
+        """
+        Scan one page; returns the addresses not seen on earlier pages.
+        """
+        new = []
+        for email in iter_emails(text):
+            if email not in self._emails:
+                self._emails[email] = None
+                new.append(email)
+        return new
+
+    @property
+    def emails(self):
+        return list(self._emails)
@@ -1,7 +1,8 @@
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 from database import get_session, Article, Author, Keyword, Reference, ArticleAuthor, ArticleKeyword, ArticleReference, Journal
 from sqlalchemy.exc import IntegrityError
+from http_cache import ARTICLE_MAX_AGE, cached_get
 import datetime
 import re
 import sys
@@ -138,12 +139,12 @@ def enrich_article(session, article):
 
     try:
         headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(article.url, headers=headers, timeout=15)
+        response = cached_get(requests, article.url, max_age=ARTICLE_MAX_AGE, headers=headers, timeout=15)
         if response.status_code != 200:
             print(f"  Failed to fetch {article.url} (Status {response.status_code})")
             return
             
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.content)
         
         # --- 1. Basic Metadata from Metatags ---
         meta_doi = soup.find('meta', attrs={'name': 'citation_doi'})
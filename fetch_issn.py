@@ -14,10 +14,10 @@ Strategies (in order):
 """
 
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 from database import get_session, Journal
+from http_cache import cached_get
 import re
-import time
 import sys
 
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
@@ -154,9 +154,9 @@ def extract_issn_from_soup(soup):
 def fetch_page(url):
     """Fetch a URL and return BeautifulSoup, or None on error."""
     try:
-        r = requests.get(url, headers=HEADERS, timeout=TIMEOUT, allow_redirects=True)
+        r = cached_get(requests, url, headers=HEADERS, timeout=TIMEOUT, allow_redirects=True)
         if r.status_code == 200:
-            return BeautifulSoup(r.text, 'html.parser')
+            return make_soup(r.content)
     except Exception as e:
         pass
     return None
@@ -256,9 +256,6 @@ def main():
             error_count += 1
             print(f"        ❌ Error: {e}")
             session.rollback()
-        
-        # Be polite to servers
-        time.sleep(0.5)
     
     print(f"\n{'='*60}")
     print(f"RESULTS:")
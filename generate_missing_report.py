@@ -2,6 +2,7 @@ import os
 import pandas as pd
 from tqdm import tqdm
 from db_manager import DBManager
+from pdf_storage import LEGACY_DIRS, STORE_DIR
 
 def generate_missing_report(emails_csv='emails.csv', output_report='no_emails_report.csv'):
     # 1. Load successful extractions
@@ -16,7 +17,7 @@ def generate_missing_report(emails_csv='emails.csv', output_report='no_emails_re
         return
 
     # 2. Scan directories for all PDFs
-    scan_dirs = ['downloads', 'downloads_ojs', 'downloads_scielo']
+    scan_dirs = [STORE_DIR] + LEGACY_DIRS
     all_pdfs = []
     
     print("Scanning directories for PDFs...")
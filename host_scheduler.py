@@ -0,0 +1,339 @@
+"""
+host_scheduler.py - Per-host politeness scheduler shared by all worker processes.
+
+Every request to a host first takes a token from that host's bucket. Buckets
+live in a small SQLite file (crawl_state/hosts.db) so parallel workers hitting
+the same host share one budget instead of each sleeping on its own.
+
+Rates adapt per host, AIMD style:
+  - success: rate grows by a fixed step, concurrency by ~1 per window
+  - 429/503 or timeout: rate and concurrency are halved, and Retry-After
+    (seconds or HTTP date) blocks the host until it passes
+
+Hosts that only give temporary failures (a greylisting MX, see
+verification_engine.py) can be deferred as a whole, with exponential backoff
+kept in the same file.
+
+Hosts without a policy start fast, so many small OJS sites run in parallel at
+full speed, while scielo.br is kept on a short leash.
+
+    python3 host_scheduler.py        # per-host throughput stats
+"""
+
+import asyncio
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+STATE_DIR = "crawl_state"
+STATE_DB = os.path.join(STATE_DIR, "hosts.db")
+
+# Requests/second and parallel connections per host
+DEFAULT_POLICY = {
+    'rate': 2.0,          # initial
+    'min_rate': 0.1,
+    'max_rate': 10.0,
+    'burst': 5.0,
+    'concurrency': 4.0,   # initial
+    'max_concurrency': 8,
+}
+
+# Matched by host suffix
+HOST_POLICIES = {
+    'scielo.br': {'rate': 0.5, 'max_rate': 1.0, 'burst': 1.0, 'concurrency': 1.0, 'max_concurrency': 2},
+}
+
+RATE_STEP = 0.1        # additive increase per successful response
+DECREASE_FACTOR = 0.5  # multiplicative decrease on throttling
+DEFAULT_BACKOFF = 30   # seconds to block a host that throttled us without Retry-After
+MAX_BACKOFF = 600
+
+THROTTLE_STATUSES = (429, 503)
+
+# Deferrals (defer / deferred_until): a host that only gives temporary
+# failures (e.g. a greylisting MX) is left alone for RETRY_BASE, doubling
+# on every deferral in a row, up to RETRY_MAX
+RETRY_BASE = int(os.environ.get('CRAWLER_RETRY_BASE', 300))
+RETRY_MAX = 6 * 3600
+
+def host_of(url):
+    return (urlparse(url).hostname or '').lower()
+
+def policy_for(host):
+    policy = dict(DEFAULT_POLICY)
+    for suffix, overrides in HOST_POLICIES.items():
+        if host == suffix or host.endswith('.' + suffix):
+            policy.update(overrides)
+            break
+    return policy
+
+def get_header(headers, name):
+    # Header dicts may have lost their case-insensitivity on the way here
+    for key, value in (headers or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def parse_retry_after(value):
+    """
+    Retry-After is either delta-seconds or an HTTP date. Returns seconds or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(int(value), MAX_BACKOFF)
+    try:
+        when = parsedate_to_datetime(value)
+        delta = (when - datetime.datetime.now(when.tzinfo)).total_seconds()
+        return min(max(delta, 0), MAX_BACKOFF)
+    except Exception:
+        return None
+
+class HostScheduler:
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS host_limits (
+                host VARCHAR(255) PRIMARY KEY,
+                rate REAL NOT NULL,
+                tokens REAL NOT NULL,
+                concurrency REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL DEFAULT 0,
+                requests INTEGER DEFAULT 0,
+                throttled INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                bytes INTEGER DEFAULT 0,
+                first_seen REAL,
+                last_seen REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS host_deferrals (
+                host VARCHAR(255) PRIMARY KEY,
+                failures INTEGER NOT NULL,
+                retry_at REAL NOT NULL
+            )
+        """)
+
+    def _load(self, host, now):
+        row = self.conn.execute(
+            "SELECT rate, tokens, concurrency, updated_at, blocked_until FROM host_limits WHERE host = ?", (host,)
+        ).fetchone()
+        if row:
+            return row
+        policy = policy_for(host)
+        self.conn.execute(
+            "INSERT INTO host_limits (host, rate, tokens, concurrency, updated_at, first_seen) VALUES (?, ?, ?, ?, ?, ?)",
+            (host, policy['rate'], policy['burst'], policy['concurrency'], now, now)
+        )
+        return policy['rate'], policy['burst'], policy['concurrency'], now, 0
+
+    def reserve(self, url):
+        """
+        Take one token for the url's host. Returns how long the caller must
+        wait before sending the request (0 if it may go now).
+        """
+        host = host_of(url)
+        if not host:
+            return 0
+        policy = policy_for(host)
+        with self.lock:
+            return self._reserve(host, policy)
+
+    def _reserve(self, host, policy):
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rate, tokens, concurrency, updated_at, blocked_until = self._load(host, now)
+            tokens = min(policy['burst'], tokens + (now - updated_at) * rate)
+            # Tokens may go negative: each caller reserves its own future slot
+            tokens -= 1
+            wait = max(0.0, -tokens / rate, (blocked_until or 0) - now)
+            self.conn.execute(
+                "UPDATE host_limits SET tokens = ?, updated_at = ? WHERE host = ?",
+                (tokens, now, host)
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, url, status=None, headers=None, nbytes=0):
+        """
+        Feed a response back (status None = connection error or timeout).
+        """
+        host = host_of(url)
+        if not host:
+            return
+        policy = policy_for(host)
+        with self.lock:
+            self._record(host, policy, status, headers, nbytes)
+
+    def _record(self, host, policy, status, headers, nbytes):
+        now = time.time()
+        throttled = status in THROTTLE_STATUSES or status is None
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rate, tokens, concurrency, updated_at, blocked_until = self._load(host, now)
+            if throttled:
+                rate = max(policy['min_rate'], rate * DECREASE_FACTOR)
+                concurrency = max(1.0, concurrency * DECREASE_FACTOR)
+                if status is not None:
+                    retry_after = parse_retry_after(get_header(headers, 'Retry-After'))
+                    blocked_until = max(blocked_until or 0, now + (retry_after if retry_after is not None else DEFAULT_BACKOFF))
+            else:
+                rate = min(policy['max_rate'], rate + RATE_STEP)
+                concurrency = min(policy['max_concurrency'], concurrency + 1.0 / concurrency)
+            self.conn.execute("""
+                UPDATE host_limits SET rate = ?, concurrency = ?, blocked_until = ?,
+                    requests = requests + 1,
+                    throttled = throttled + ?,
+                    errors = errors + ?,
+                    bytes = bytes + ?,
+                    last_seen = ?
+                WHERE host = ?
+            """, (rate, concurrency, blocked_until, int(status in THROTTLE_STATUSES),
+                  int(status is None or status >= 500), nbytes or 0, now, host))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def concurrency(self, url):
+        """
+        Current number of parallel requests allowed to the url's host.
+        """
+        host = host_of(url)
+        with self.lock:
+            row = self.conn.execute("SELECT concurrency FROM host_limits WHERE host = ?", (host,)).fetchone()
+        if row:
+            return max(1, int(row[0]))
+        return max(1, int(policy_for(host)['concurrency']))
+
+    def defer(self, url, restart=False):
+        """
+        Back off from the url's host after a temporary failure: the wait
+        doubles with every deferral in a row (restart: back to RETRY_BASE,
+        when the host also gave real answers). Returns the unix time to retry at.
+        """
+        host = host_of(url)
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT failures FROM host_deferrals WHERE host = ?", (host,)).fetchone()
+                failures = 1 if restart or not row else row[0] + 1
+                retry_at = now + min(RETRY_MAX, RETRY_BASE * 2 ** (failures - 1))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO host_deferrals (host, failures, retry_at) VALUES (?, ?, ?)",
+                    (host, failures, retry_at)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return retry_at
+
+    def deferred_until(self, url):
+        """
+        Unix time the url's host is deferred until, or 0.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT retry_at FROM host_deferrals WHERE host = ?", (host_of(url),)).fetchone()
+        return row[0] if row and row[0] > time.time() else 0
+
+    def clear_deferral(self, url):
+        with self.lock:
+            self.conn.execute("DELETE FROM host_deferrals WHERE host = ?", (host_of(url),))
+
+    def stats(self):
+        """
+        Per-host counters and throughput, busiest hosts first.
+        """
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT host, rate, concurrency, requests, throttled, errors, bytes, first_seen, last_seen, blocked_until
+                FROM host_limits ORDER BY requests DESC
+            """).fetchall()
+        now = time.time()
+        stats = []
+        for host, rate, concurrency, requests, throttled, errors, nbytes, first_seen, last_seen, blocked_until in rows:
+            elapsed = max((last_seen or now) - (first_seen or now), 1.0)
+            stats.append({
+                'host': host,
+                'rate': rate,
+                'concurrency': int(concurrency),
+                'requests': requests,
+                'throttled': throttled,
+                'errors': errors,
+                'bytes': nbytes,
+                'req_per_s': requests / elapsed,
+                'kb_per_s': nbytes / 1024 / elapsed,
+                'blocked_for': max(0, (blocked_until or 0) - now),
+            })
+        return stats
+
+    def close(self):
+        self.conn.close()
+
+_scheduler = None
+
+def polite_get(session, url, scheduler=None, **kwargs):
+    """
+    session.get() behind the host scheduler: waits for the host's token and
+    reports the outcome back. Raises like requests does.
+    """
+    scheduler = scheduler or get_scheduler()
+    scheduler.acquire(url)
+    try:
+        response = session.get(url, **kwargs)
+    except Exception:
+        scheduler.record(url, None)
+        raise
+    if kwargs.get('stream'):
+        nbytes = int(get_header(response.headers, 'Content-Length') or 0)
+    else:
+        nbytes = len(response.content)
+    scheduler.record(url, response.status_code, response.headers, nbytes)
+    return response
+
+def get_scheduler():
+    """
+    Process-wide scheduler (one SQLite connection per process).
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = HostScheduler()
+    return _scheduler
+
+if __name__ == "__main__":
+    scheduler = HostScheduler(sys.argv[1] if len(sys.argv) > 1 else STATE_DB)
+    print(f"{'host':<40} {'req':>7} {'req/s':>7} {'KB/s':>8} {'rate':>6} {'conc':>5} {'429/503':>8} {'errors':>7} {'blocked':>8}")
+    for s in scheduler.stats():
+        print(f"{s['host'][:40]:<40} {s['requests']:>7} {s['req_per_s']:>7.2f} {s['kb_per_s']:>8.1f} "
+              f"{s['rate']:>6.2f} {s['concurrency']:>5} {s['throttled']:>8} {s['errors']:>7} {s['blocked_for']:>7.0f}s")
+    scheduler.close()
@@ -0,0 +1,55 @@
+"""
+html_parsing.py - HTML parser backend shared by the crawlers.
+
+BeautifulSoup trees are built with lxml when it is installed (several times
+faster than the pure-Python 'html.parser'); CRAWLER_HTML_PARSER overrides it.
+
+Most pages are only read for a handful of tags, so callers can parse just
+what they need:
+  - extract_links(): every <a href> of an issue/archive page, through
+    selectolax (lexbor) when available, otherwise a links-only soup
+  - make_soup(content, ARTICLE_META): only <meta>/<h1>/<a>, enough for the
+    article landing page metadata
+"""
+
+import os
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+PARSER = os.environ.get('CRAWLER_HTML_PARSER', DEFAULT_PARSER)
+
+LINKS = SoupStrainer('a', href=True)
+ARTICLE_META = SoupStrainer(['meta', 'h1', 'a'])
+META_ONLY = SoupStrainer('meta')
+
+Link = namedtuple('Link', ['href', 'classes'])
+
+def make_soup(content, parse_only=None, parser=None):
+    return BeautifulSoup(content, parser or PARSER, parse_only=parse_only)
+
+def extract_links(content, use_selectolax=True):
+    """
+    [Link(href, classes)] for every <a href> in document order.
+    """
+    if use_selectolax and LexborHTMLParser is not None:
+        tree = LexborHTMLParser(content)
+        links = []
+        for node in tree.css('a[href]'):
+            attributes = node.attributes
+            links.append(Link(attributes.get('href') or '', (attributes.get('class') or '').split()))
+        return links
+
+    soup = make_soup(content, LINKS)
+    return [Link(a['href'], a.get('class') or []) for a in soup.find_all('a', href=True)]
@@ -0,0 +1,303 @@
+"""
+http_cache.py - On-disk HTTP response cache shared by every HTML fetch path.
+
+Bodies are stored once per content hash, zlib-compressed, under
+crawl_state/http_cache/<ab>/<sha256>.z; a SQLite index maps each URL to its
+body plus the validators (ETag, Last-Modified) the server sent. Cached URLs
+are revalidated with a conditional GET, so an unchanged page costs a 304
+instead of the full body. Entries younger than max_age are served without any
+request at all (article landing pages practically never change).
+
+The cache is capped at CRAWLER_HTTP_CACHE_MB (default 2048); least recently
+used entries are evicted first.
+
+    python3 http_cache.py            # cache stats
+    python3 http_cache.py --clear    # drop everything
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from host_scheduler import STATE_DIR, get_header, polite_get
+
+CACHE_DIR = os.path.join(STATE_DIR, "http_cache")
+MAX_BYTES = int(os.environ.get('CRAWLER_HTTP_CACHE_MB', 2048)) * 1024 * 1024
+EVICT_TO = 0.9               # evict down to 90% of the cap
+COMPRESS_LEVEL = 6
+
+ARTICLE_MAX_AGE = 30 * 86400  # article landing pages: serve from cache for 30 days
+
+class CacheEntry:
+    def __init__(self, url, body_hash, status, headers, fetched_at):
+        self.url = url
+        self.body_hash = body_hash
+        self.status = status
+        self.headers = headers
+        self.fetched_at = fetched_at
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    @property
+    def last_modified(self):
+        return self.headers.get('Last-Modified')
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class HTTPCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), timeout=30,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                body_hash CHAR(64) NOT NULL,
+                status INTEGER NOT NULL,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                body_hash CHAR(64) PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_entries_body_hash ON entries (body_hash);
+            CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at);
+        """)
+
+    def _blob_path(self, body_hash):
+        return os.path.join(self.directory, body_hash[:2], body_hash + ".z")
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body_hash, status, content_type, etag, last_modified, fetched_at FROM entries WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if not row:
+            return None
+        body_hash, status, content_type, etag, last_modified, fetched_at = row
+        headers = CaseInsensitiveDict()
+        for name, value in (('Content-Type', content_type), ('ETag', etag), ('Last-Modified', last_modified)):
+            if value:
+                headers[name] = value
+        return CacheEntry(url, body_hash, status, headers, fetched_at)
+
+    def load_body(self, entry):
+        """
+        Body of a cached entry, or None if its blob went missing.
+        """
+        try:
+            with open(self._blob_path(entry.body_hash), 'rb') as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self.delete(entry.url)
+            return None
+
+    def touch(self, url, revalidated=False):
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.conn.execute("UPDATE entries SET accessed_at = ?, fetched_at = ?, hits = hits + 1 WHERE url = ?", (now, now, url))
+            else:
+                self.conn.execute("UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE url = ?", (now, url))
+
+    def store(self, url, status, headers, body):
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(body, COMPRESS_LEVEL))
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self.conn.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+                self.conn.execute("INSERT OR IGNORE INTO blobs (body_hash, size) VALUES (?, ?)", (body_hash, size))
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO entries (url, body_hash, status, content_type, etag, last_modified, fetched_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (url, body_hash, status, get_header(headers, 'Content-Type'), get_header(headers, 'ETag'),
+                      get_header(headers, 'Last-Modified'), now, now))
+                orphans = self._drop_orphans([old[0]]) if old and old[0] != body_hash else []
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self._remove_blobs(orphans)
+        self.evict()
+
+    def delete(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            if not row:
+                return
+            self.conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+            orphans = self._drop_orphans([row[0]])
+        self._remove_blobs(orphans)
+
+    def _drop_orphans(self, hashes):
+        # Blobs no longer referenced by any URL (caller holds the lock)
+        orphans = []
+        for body_hash in set(hashes):
+            if not self.conn.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+                self.conn.execute("DELETE FROM blobs WHERE body_hash = ?", (body_hash,))
+                orphans.append(body_hash)
+        return orphans
+
+    def _remove_blobs(self, hashes):
+        for body_hash in hashes:
+            try:
+                os.remove(self._blob_path(body_hash))
+            except OSError:
+                pass
+
+    def total_bytes(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        """
+        Drop least recently used entries until the cache is under EVICT_TO of the cap.
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * EVICT_TO
+        evicted = 0
+        while total > target:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT url, body_hash FROM entries ORDER BY accessed_at LIMIT 200"
+                ).fetchall()
+                if not rows:
+                    break
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.executemany("DELETE FROM entries WHERE url = ?", [(url,) for url, _ in rows])
+                    orphans = self._drop_orphans([body_hash for _, body_hash in rows])
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+            self._remove_blobs(orphans)
+            evicted += len(rows)
+            total = self.total_bytes()
+        return evicted
+
+    def stats(self):
+        with self.lock:
+            entries, hits = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM entries").fetchone()
+            blobs, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {'entries': entries, 'blobs': blobs, 'bytes': size, 'hits': hits, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM blobs")
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self):
+        self.conn.close()
+
+def is_fresh(entry, max_age):
+    return bool(max_age) and time.time() - entry.fetched_at < max_age
+
+def is_cacheable(status, headers):
+    """
+    Whether a response goes into the cache; one rule for every fetch path.
+    """
+    return status == 200 and 'no-store' not in (get_header(headers, 'Cache-Control') or '')
+
+def cached_response(entry, body):
+    """
+    requests.Response rebuilt from a cache entry, so callers can't tell the difference.
+    """
+    response = requests.Response()
+    response.url = entry.url
+    response.status_code = entry.status
+    response.headers = CaseInsensitiveDict(entry.headers)
+    response._content = body
+    response.from_cache = True
+    return response
+
+def cached_get(session, url, cache=None, scheduler=None, max_age=None, **kwargs):
+    """
+    GET through the cache: served straight from disk while younger than
+    max_age, otherwise revalidated with If-None-Match / If-Modified-Since
+    via host_scheduler.polite_get. Only 200 responses are stored.
+    `session` may be a requests.Session or the requests module.
+    """
+    cache = cache or get_cache()
+    entry = cache.lookup(url)
+    body = cache.load_body(entry) if entry else None
+
+    if body is not None and is_fresh(entry, max_age):
+        cache.touch(url)
+        return cached_response(entry, body)
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if body is not None:
+        headers.update(entry.conditional_headers())
+    response = polite_get(session, url, scheduler, headers=headers, **kwargs)
+
+    if response.status_code == 304 and body is not None:
+        cache.touch(url, revalidated=True)
+        return cached_response(entry, body)
+    if is_cacheable(response.status_code, response.headers):
+        cache.store(url, response.status_code, response.headers, response.content)
+    response.from_cache = False
+    return response
+
+_cache = None
+
+def get_cache():
+    """
+    Process-wide cache (one SQLite connection per process).
+    """
+    global _cache
+    if _cache is None:
+        _cache = HTTPCache()
+    return _cache
+
+if __name__ == "__main__":
+    cache = HTTPCache()
+    if '--clear' in sys.argv:
+        cache.clear()
+        print("Cache cleared.")
+    stats = cache.stats()
+    print(f"Entries: {stats['entries']} | Bodies: {stats['blobs']} | "
+          f"Size: {stats['bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB | Hits: {stats['hits']}")
+    cache.close()
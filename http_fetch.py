@@ -0,0 +1,137 @@
+"""
+http_fetch.py - Shared asyncio HTTP fetch layer for the crawlers.
+
+One AsyncFetcher per process keeps a single aiohttp connection pool with a
+global cap on in-flight requests and a separate cap per host, so a worker can
+have hundreds of requests outstanding across many OJS hosts while any single
+host only sees a handful of connections.
+
+Politeness comes from host_scheduler: each request waits for its host's
+token, and the number of parallel requests per host follows the scheduler's
+adaptive concurrency for that host. Responses go through the shared
+http_cache, so pages already on disk are revalidated with a conditional GET.
+
+The crawler classes keep their blocking methods (requests.Session) and gain
+*_async variants that take an AsyncFetcher.
+"""
+
+import asyncio
+from collections import defaultdict
+
+from host_scheduler import get_scheduler, host_of
+from http_cache import get_cache, is_cacheable, is_fresh
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
+
+MAX_IN_FLIGHT = 200   # Requests in flight per process
+MAX_PER_HOST = 8      # Hard cap on connections per host (scheduler usually allows fewer)
+TIMEOUT = 10          # Seconds, same as the blocking get_soup
+
+class FetchResult:
+    def __init__(self, url, status=None, content=None, headers=None, error=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and 200 <= self.status < 300
+
+    def __repr__(self):
+        return f"<FetchResult(url={self.url}, status={self.status}, error={self.error})>"
+
+def is_available():
+    return aiohttp is not None
+
+class AsyncFetcher:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_per_host=MAX_PER_HOST, timeout=TIMEOUT, headers=None, scheduler=None, cache=None):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed (pip install aiohttp)")
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.headers = {'User-Agent': USER_AGENT}
+        if headers:
+            self.headers.update(headers)
+        self.scheduler = scheduler or get_scheduler()
+        self.cache = cache or get_cache()
+        self._session = None
+        self._in_flight = defaultdict(int)
+        self._host_conditions = {}
+
+    async def _get_session(self):
+        # Created lazily so it is bound to the loop that actually runs it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_in_flight,
+                limit_per_host=self.max_per_host,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def fetch(self, url, max_age=None):
+        """
+        GET url and return a FetchResult. Never raises for network errors.
+        Cached pages younger than max_age are returned without a request.
+        """
+        entry = self.cache.lookup(url)
+        body = self.cache.load_body(entry) if entry else None
+        if body is not None and is_fresh(entry, max_age):
+            self.cache.touch(url)
+            return FetchResult(url, entry.status, body, dict(entry.headers))
+
+        session = await self._get_session()
+        host = host_of(url)
+        condition = self._host_conditions.setdefault(host, asyncio.Condition())
+
+        # Wait for a free slot under the host's adaptive concurrency limit
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight[host] < self.scheduler.concurrency(url))
+            self._in_flight[host] += 1
+        try:
+            await self.scheduler.acquire_async(url)
+            try:
+                request_headers = entry.conditional_headers() if body is not None else None
+                async with session.get(url, headers=request_headers) as response:
+                    content = await response.read()
+                    result = FetchResult(str(response.url), response.status, content, dict(response.headers))
+            except Exception as e:
+                result = FetchResult(url, error=e)
+            self.scheduler.record(url, result.status, result.headers, len(result.content or b''))
+            if result.status == 304 and body is not None:
+                self.cache.touch(url, revalidated=True)
+                return FetchResult(url, entry.status, body, dict(entry.headers))
+            if is_cacheable(result.status, result.headers):
+                self.cache.store(url, result.status, result.headers, result.content)
+            return result
+        finally:
+            async with condition:
+                self._in_flight[host] -= 1
+                condition.notify_all()
+
+    async def fetch_many(self, urls):
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
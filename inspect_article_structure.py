@@ -1,6 +1,7 @@
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup
 from database import get_session, Article, Journal, Edition
+from http_cache import ARTICLE_MAX_AGE, cached_get
 import random
 
 def inspect_articles(num_articles=3):
@@ -24,9 +25,9 @@ def inspect_articles(num_articles=3):
         
         try:
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            response = requests.get(article.url, headers=headers, timeout=10)
+            response = cached_get(requests, article.url, max_age=ARTICLE_MAX_AGE, headers=headers, timeout=10)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = make_soup(response.content)
                 
                 # Check for OJS common meta tags
                 print("\n[Meta Tags - Common OJS/Scholar]")
@@ -65,8 +65,8 @@ class MetadataManager:
         edition = self.db_manager.get_or_create_edition(journal.id, issue_url)
         
         # Prepare authors
-        authors_list = []
-        if authors_str and authors_str != "Unknown Authors":
+        authors_list = meta.get('authors_list') or []
+        if not authors_list and authors_str and authors_str != "Unknown Authors":
             for name in authors_str.split(','):
                 authors_list.append({'name': name.strip()})
 
@@ -0,0 +1,52 @@
+import sqlite3
+import os
+
+DB_FILE = "crawler.db"
+
+def migrate():
+    if not os.path.exists(DB_FILE):
+        print("Database file not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    cursor = conn.cursor()
+
+    def col_exists(table, col):
+        cursor.execute(f"PRAGMA table_info({table})")
+        cols = [info[1] for info in cursor.fetchall()]
+        return col in cols
+
+    def add_col(table, col, type_def):
+        if not col_exists(table, col):
+            print(f"Adding {col} to {table}...")
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {type_def}")
+            except Exception as e:
+                print(f"Error adding {col}: {e}")
+        else:
+            print(f"Column {col} already exists in {table}.")
+
+    # One result per address for both verifiers (table from create_email_tables.sql)
+    print("Creating email_verifications...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_verifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            domain_id INTEGER,
+            format_valid BOOLEAN,
+            domain_valid BOOLEAN,
+            mx_valid BOOLEAN,
+            smtp_valid BOOLEAN,
+            final_status VARCHAR(50),
+            checked_at DATETIME,
+            FOREIGN KEY(domain_id) REFERENCES email_domains(id)
+        )
+    """)
+    add_col('email_verifications', 'detail', 'VARCHAR(50)')
+
+    conn.commit()
+    conn.close()
+    print("Migration v10 completed.")
+
+if __name__ == "__main__":
+    migrate()
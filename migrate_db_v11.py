@@ -0,0 +1,82 @@
+import sqlite3
+import os
+
+DB_FILE = "crawler.db"
+
+def migrate():
+    if not os.path.exists(DB_FILE):
+        print("Database file not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    cursor = conn.cursor()
+
+    def col_exists(table, col):
+        cursor.execute(f"PRAGMA table_info({table})")
+        cols = [info[1] for info in cursor.fetchall()]
+        return col in cols
+
+    def add_col(table, col, type_def):
+        if not col_exists(table, col):
+            print(f"Adding {col} to {table}...")
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {type_def}")
+            except Exception as e:
+                print(f"Error adding {col}: {e}")
+        else:
+            print(f"Column {col} already exists in {table}.")
+
+    # email_verifications becomes the table of distinct addresses and the 'verify' queue
+    add_col('email_verifications', 'worker_id', 'VARCHAR(50)')
+    add_col('email_verifications', 'lock_time', 'DATETIME')
+    add_col('email_verifications', 'lease_expires_at', 'DATETIME')
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_email_verifications_queue ON email_verifications (final_status, worker_id, id)")
+
+    add_col('captured_emails', 'address_id', 'INTEGER REFERENCES email_verifications(id)')
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_captured_emails_address ON captured_emails (address_id)")
+
+    print("Creating one address per captured email...")
+    # Best verdict first: INSERT OR IGNORE keeps the first row of each address
+    cursor.execute("""
+        INSERT OR IGNORE INTO email_verifications (email, format_valid, domain_valid, mx_valid, smtp_valid, final_status, checked_at)
+        SELECT email, valid_syntax, valid_domain, valid_mx, valid_smtp,
+               CASE WHEN verification_status IN ('VALID', 'INVALID') THEN verification_status ELSE 'PENDING' END,
+               updated_at
+        FROM captured_emails
+        ORDER BY CASE verification_status WHEN 'VALID' THEN 0 WHEN 'INVALID' THEN 1 ELSE 2 END
+    """)
+    print(f"  {cursor.rowcount} addresses added.")
+
+    # Addresses that are cited but have no usable result yet (older labels like
+    # 'risky', UNKNOWN, or a claim from the old queue) are queued again
+    cursor.execute("""
+        UPDATE email_verifications SET final_status = 'PENDING', worker_id = NULL, lock_time = NULL, lease_expires_at = NULL
+        WHERE (final_status IS NULL OR final_status NOT IN ('VALID', 'INVALID', 'PENDING'))
+          AND email IN (SELECT email FROM captured_emails)
+    """)
+    print(f"  {cursor.rowcount} addresses queued again.")
+
+    print("Linking captured emails to their addresses...")
+    cursor.execute("""
+        UPDATE captured_emails SET address_id = (SELECT id FROM email_verifications v WHERE v.email = captured_emails.email)
+        WHERE address_id IS NULL
+    """)
+    # Verdicts live on the address now: copy them, and drop the old per-row claims
+    cursor.execute("""
+        UPDATE captured_emails SET
+            verification_status = v.final_status, valid_syntax = v.format_valid, valid_domain = v.domain_valid,
+            valid_mx = v.mx_valid, valid_smtp = v.smtp_valid
+        FROM email_verifications v
+        WHERE captured_emails.address_id = v.id AND v.final_status IN ('VALID', 'INVALID')
+    """)
+    cursor.execute("""
+        UPDATE captured_emails SET verification_status = 'PENDING', worker_id = NULL, lock_time = NULL, lease_expires_at = NULL
+        WHERE verification_status NOT IN ('VALID', 'INVALID')
+    """)
+
+    conn.commit()
+    conn.close()
+    print("Migration v11 completed.")
+
+if __name__ == "__main__":
+    migrate()
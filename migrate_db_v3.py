@@ -0,0 +1,56 @@
+import sqlite3
+import os
+
+DB_FILE = "crawler.db"
+
+# (index name, table, columns)
+# Keep in sync with the Index() declarations in database.py.
+QUEUE_INDEXES = [
+    # Work queue polls: status + lock, ordered by id for claim_batch
+    ('ix_editions_queue', 'editions', 'status, worker_id, id'),
+    ('ix_articles_queue', 'articles', 'status, worker_id, id'),
+    ('ix_captured_emails_queue', 'captured_emails', 'verification_status, worker_id, id'),
+
+    # URL / path lookups (add_article, is_article_completed, get_file_by_path)
+    ('ix_articles_url', 'articles', 'url'),
+    ('ix_articles_edition_id', 'articles', 'edition_id'),
+    ('ix_files_local_path', 'files', 'local_path'),
+    ('ix_files_article_id', 'files', 'article_id'),
+
+    # add_captured_email looks for an earlier verdict on the same address
+    ('ix_captured_emails_email_status', 'captured_emails', 'email, verification_status'),
+]
+
+def create_indexes(cursor, indexes=QUEUE_INDEXES, verbose=True):
+    for name, table, columns in indexes:
+        if verbose:
+            print(f"Creating index {name} on {table}({columns})...")
+        try:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        except Exception as e:
+            print(f"Error creating {name}: {e}")
+
+def drop_indexes(cursor, indexes=QUEUE_INDEXES):
+    for name, table, columns in indexes:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+def migrate():
+    if not os.path.exists(DB_FILE):
+        print("Database file not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    cursor = conn.cursor()
+
+    create_indexes(cursor)
+
+    # Refresh planner statistics so the new indexes are actually picked
+    print("Analyzing tables...")
+    cursor.execute("ANALYZE")
+
+    conn.commit()
+    conn.close()
+    print("Migration v3 completed.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,39 @@
+import sqlite3
+import os
+
+DB_FILE = "crawler.db"
+
+def migrate():
+    if not os.path.exists(DB_FILE):
+        print("Database file not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    cursor = conn.cursor()
+
+    def col_exists(table, col):
+        cursor.execute(f"PRAGMA table_info({table})")
+        cols = [info[1] for info in cursor.fetchall()]
+        return col in cols
+
+    def add_col(table, col, type_def):
+        if not col_exists(table, col):
+            print(f"Adding {col} to {table}...")
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {type_def}")
+            except Exception as e:
+                print(f"Error adding {col}: {e}")
+        else:
+            print(f"Column {col} already exists in {table}.")
+
+    # Lease expiry for the work queues (renewed by worker heartbeats)
+    add_col('editions', 'lease_expires_at', 'DATETIME')
+    add_col('articles', 'lease_expires_at', 'DATETIME')
+    add_col('captured_emails', 'lease_expires_at', 'DATETIME')
+
+    conn.commit()
+    conn.close()
+    print("Migration v4 completed.")
+
+if __name__ == "__main__":
+    migrate()
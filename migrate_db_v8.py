@@ -0,0 +1,49 @@
+import sqlite3
+import os
+
+DB_FILE = "crawler.db"
+
+def migrate():
+    if not os.path.exists(DB_FILE):
+        print("Database file not found.")
+        return
+
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    cursor = conn.cursor()
+
+    def col_exists(table, col):
+        cursor.execute(f"PRAGMA table_info({table})")
+        cols = [info[1] for info in cursor.fetchall()]
+        return col in cols
+
+    def add_col(table, col, type_def):
+        if not col_exists(table, col):
+            print(f"Adding {col} to {table}...")
+            try:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {type_def}")
+            except Exception as e:
+                print(f"Error adding {col}: {e}")
+        else:
+            print(f"Column {col} already exists in {table}.")
+
+    # Shared DNS cache for the verifiers (table from create_email_tables.sql)
+    print("Creating email_domains...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_domains (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            domain VARCHAR(255) UNIQUE NOT NULL,
+            has_dns BOOLEAN,
+            has_mx BOOLEAN,
+            mx_records TEXT,
+            checked_at DATETIME
+        )
+    """)
+    add_col('email_domains', 'dns_status', 'VARCHAR(20)')
+    add_col('email_domains', 'expires_at', 'DATETIME')
+
+    conn.commit()
+    conn.close()
+    print("Migration v8 completed.")
+
+if __name__ == "__main__":
+    migrate()
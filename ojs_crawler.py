@@ -1,76 +1,106 @@
 import os
 import requests
-from bs4 import BeautifulSoup
 import time
 from urllib.parse import urljoin
 from metadata_manager import MetadataManager
+from host_scheduler import get_scheduler
+from http_cache import ARTICLE_MAX_AGE, cached_get
+from pdf_storage import download_pdf, get_storage
+from html_parsing import ARTICLE_META, extract_links, make_soup
 
 class OJSCrawler:
-    def __init__(self, base_url, journal_name, download_dir='downloads_ojs', metadata_manager=None, db_manager=None, force=False):
+    def __init__(self, base_url, journal_name, download_dir='downloads_ojs', metadata_manager=None, db_manager=None, force=False, scheduler=None, storage=None):
         self.base_url = base_url
         self.journal_name = journal_name
         self.download_dir = download_dir
         self.metadata_manager = metadata_manager
         self.db_manager = db_manager
         self.force = force
-        
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
+        # Per-host politeness shared with the other worker processes
+        self.scheduler = scheduler or get_scheduler()
+        # PDFs go to the content-addressed store; download_dir only holds files of older runs
+        self.storage = storage or get_storage()
             
         self.session = requests.Session()
         self.session.headers.update({
              'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
         })
 
-    def get_soup(self, url):
+    def get_html(self, url, max_age=None):
         try:
-            response = self.session.get(url, timeout=10)
+            response = cached_get(self.session, url, scheduler=self.scheduler, max_age=max_age, timeout=10)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
+            return response.content
         except Exception as e:
             print(f"Error fetching {url}: {e}")
             return None
 
-    def get_all_issues(self):
+    async def get_html_async(self, url, fetcher, max_age=None):
+        """
+        Async variant of get_html; fetcher is a shared http_fetch.AsyncFetcher.
+        """
+        result = await fetcher.fetch(url, max_age=max_age)
+        if not result.ok:
+            print(f"Error fetching {url}: {result.error or result.status}")
+            return None
+        return result.content
+
+    def get_soup(self, url, max_age=None, parse_only=None):
+        html = self.get_html(url, max_age)
+        return make_soup(html, parse_only) if html else None
+
+    async def get_soup_async(self, url, fetcher, max_age=None, parse_only=None):
+        html = await self.get_html_async(url, fetcher, max_age)
+        return make_soup(html, parse_only) if html else None
+
+    def get_all_issues(self, known_urls=None):
+        """
+        Issue URLs from the archive, newest first. With known_urls (incremental
+        discovery) pagination stops at the first page holding only known issues,
+        since the archive is sorted newest first.
+        """
         archive_url = f"{self.base_url}/issue/archive"
         print(f"Fetching archive: {archive_url}")
-        soup = self.get_soup(archive_url)
-        if not soup:
+        html = self.get_html(archive_url)
+        if not html:
             return []
 
         issue_links = []
-        urls_on_page = self._scrape_issues_from_page(soup)
+        links = extract_links(html)
+        urls_on_page = self._scrape_issues_from_page(links)
         issue_links.extend(urls_on_page)
         
         # Simple loop for next pages
-        current_soup = soup
         page = 1
         while True: # Crawl all archive pages
-            next_link_node = current_soup.find('a', class_='next')
-            if next_link_node and next_link_node.get('href'):
-                next_url = next_link_node.get('href')
+            if known_urls is not None and urls_on_page and all(url in known_urls for url in urls_on_page):
+                print(f"  Page {page} has only known issues, stopping.")
+                break
+            next_url = next((link.href for link in links if 'next' in link.classes), None)
+            if next_url:
                 print(f"  Fetching next archive page: {next_url}")
-                current_soup = self.get_soup(next_url)
-                if current_soup:
-                    new_links = self._scrape_issues_from_page(current_soup)
-                    issue_links.extend(new_links)
+                html = self.get_html(next_url)
+                if html:
+                    links = extract_links(html)
+                    urls_on_page = self._scrape_issues_from_page(links)
+                    issue_links.extend(urls_on_page)
                     page += 1
                 else:
                     break
             else:
                 break
 
-        return list(set(issue_links))
+        return list(dict.fromkeys(issue_links))
 
-    def _scrape_issues_from_page(self, soup):
-        links = []
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+    def _scrape_issues_from_page(self, links):
+        issue_links = []
+        for link in links:
+            href = link.href
             # OJS issue link pattern
             if '/issue/view/' in href:
-                 if href not in links:
-                     links.append(href)
-        return links
+                 if href not in issue_links:
+                     issue_links.append(href)
+        return issue_links
 
     def process_issue(self, issue_url):
         print(f"Processing issue: {issue_url}")
@@ -84,13 +114,21 @@ class OJSCrawler:
             self.process_article(art_url)
 
     def get_article_urls(self, issue_url):
-        soup = self.get_soup(issue_url)
-        if not soup:
+        html = self.get_html(issue_url)
+        if not html:
             return []
+        return self._parse_article_urls(extract_links(html))
 
+    async def get_article_urls_async(self, issue_url, fetcher):
+        html = await self.get_html_async(issue_url, fetcher)
+        if not html:
+            return []
+        return self._parse_article_urls(extract_links(html))
+
+    def _parse_article_urls(self, links):
         article_links = []
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+        for link in links:
+            href = link.href
             if '/article/view/' in href:
                 # Filter for landing pages vs galleys
                 # Landing page: /article/view/ID
@@ -113,26 +151,34 @@ class OJSCrawler:
         if not meta: return
 
         pdf_url = meta.get('pdf_url')
-        filename = meta.get('pdf_filename')
         
         if pdf_url:
             try:
-                local_path = self.download_pdf_direct(pdf_url, filename)
+                stored = self.download_pdf_direct(pdf_url)
                 
                 # Only save metadata (and file record) if we actually have the file (downloaded or existed)
-                if local_path and self.metadata_manager:
+                if stored and self.metadata_manager:
+                    meta['pdf_filename'] = os.path.basename(stored.path)
                     self.metadata_manager.save_metadata(meta)
 
-                if local_path and self.db_manager:
+                if stored and self.db_manager:
                     self.db_manager.mark_article_completed_by_url(article_url)
             except Exception as e:
                 print(f"Error downloading {pdf_url}: {e}")
 
     def fetch_article_metadata(self, article_url):
-        soup = self.get_soup(article_url)
+        soup = self.get_soup(article_url, max_age=ARTICLE_MAX_AGE, parse_only=ARTICLE_META)
+        if not soup:
+            return None
+        return self._parse_article_metadata(soup, article_url)
+
+    async def fetch_article_metadata_async(self, article_url, fetcher):
+        soup = await self.get_soup_async(article_url, fetcher, max_age=ARTICLE_MAX_AGE, parse_only=ARTICLE_META)
         if not soup:
             return None
+        return self._parse_article_metadata(soup, article_url)
 
+    def _parse_article_metadata(self, soup, article_url):
         # Metadata
         title = "Unknown Title"
         # Meta tag preferred
@@ -214,24 +260,11 @@ class OJSCrawler:
                     pass
         return filename
 
-    def download_pdf_direct(self, pdf_url, filename):
-        local_path = os.path.join(self.download_dir, filename)
-        if not self.force and os.path.exists(local_path) and os.path.getsize(local_path) > 1000:
-            # print(f"Skipping existing (valid): {filename}")
-            return local_path
-            
-        print(f"Downloading: {pdf_url}")
-        try:
-            with self.session.get(pdf_url, stream=True) as r:
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            time.sleep(1)
-            return local_path
-        except Exception as e:
-            print(f"Failed to download {pdf_url}: {e}")
-            return None
+    def download_pdf_direct(self, pdf_url):
+        """
+        Download into the PDF store. Returns pdf_storage.StoredPDF or None.
+        """
+        return download_pdf(self.session, pdf_url, self.scheduler, storage=self.storage, force=self.force)
     
-    def download_pdf(self, pdf_url, filename):
-        return self.download_pdf_direct(pdf_url, filename)
+    def download_pdf(self, pdf_url, filename=None):
+        return self.download_pdf_direct(pdf_url)
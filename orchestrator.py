@@ -6,6 +6,7 @@ from scielo_crawler import SciELOCrawler
 from ojs_crawler import OJSCrawler
 from metadata_manager import MetadataManager
 from processor import Processor
+from pdf_storage import LEGACY_DIRS, STORE_DIR
 from db_manager import DBManager
 from database import Journal
 import argparse
@@ -54,7 +55,7 @@ def main():
             crawler = None
             if j_db.source_type == 'scielo':
                 crawler = SciELOCrawler(j_db.url, j_db.name, download_dir='downloads_scielo', metadata_manager=metadata_manager, db_manager=db_manager, force=force_mode)
-            elif j_db.source_type == 'ojs':
+            elif j_db.source_type in ('ojs', 'ojs_oai'):
                 crawler = OJSCrawler(j_db.url, j_db.name, download_dir='downloads_ojs', metadata_manager=metadata_manager, db_manager=db_manager, force=force_mode)
 
             else:
@@ -104,17 +105,14 @@ def main():
     print("\n--- Crawling Finished. Starting Processing (Creating Super CSV) ---")
     
     try:
-        # Process SciELO
-        if os.path.exists('downloads_scielo'):
-            print("Processing SciELO downloads...")
-            p_scielo = Processor(download_dir='downloads_scielo', output_file='emails.csv', db_manager=db_manager)
-            p_scielo.process_all(metadata_manager)
-
-        # Process OJS (Append)
-        if os.path.exists('downloads_ojs'):
-            print("Processing OJS downloads...")
-            p_ojs = Processor(download_dir='downloads_ojs', output_file='emails.csv', append=True, db_manager=db_manager)
-            p_ojs.process_all(metadata_manager)
+        # PDF store first, then directories of older runs not migrated yet
+        append = False
+        for directory in [STORE_DIR] + LEGACY_DIRS:
+            if os.path.exists(directory):
+                print(f"Processing {directory}...")
+                processor = Processor(download_dir=directory, output_file='emails.csv', append=append, db_manager=db_manager)
+                processor.process_all(metadata_manager)
+                append = os.path.exists('emails.csv')
             
         print("\nSUCCESS: Super CSV 'emails.csv' created.")
         
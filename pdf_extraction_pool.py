@@ -0,0 +1,191 @@
+"""
+pdf_extraction_pool.py - Supervised PDF text extraction in a child process.
+
+Text extraction (pypdf/pdfplumber) runs in a separate process so one
+pathological PDF can't hang or bloat the worker:
+  - wall-clock timeout per file: the child is killed and replaced
+  - RSS cap: the child's resident memory is watched (Linux /proc) and the
+    child is killed when it goes over; a MemoryError inside counts the same
+  - the child is recycled after MAX_FILES_PER_CHILD files, so memory leaked
+    by the PDF libraries is returned to the OS
+
+Failures come back as statuses ('timeout', 'oom', 'crashed', or 'failed' when
+the extraction code raised) that the caller records in FileAnalysisLog; files
+with such a log entry are quarantined.
+Extracted pages go to the text store, so a PDF is not parsed twice.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+
+EXTRACTION_TIMEOUT = int(os.environ.get('CRAWLER_EXTRACTION_TIMEOUT', 120))  # seconds per PDF
+MAX_RSS_MB = int(os.environ.get('CRAWLER_EXTRACTION_MAX_RSS_MB', 1536))
+MAX_FILES_PER_CHILD = 50
+POLL_INTERVAL = 0.2
+
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_OOM = 'oom'
+STATUS_CRASHED = 'crashed'
+STATUS_FAILED = 'failed'  # unexpected exception in the extraction code
+
+# FileAnalysisLog statuses that quarantine a file
+QUARANTINE_STATUSES = (STATUS_TIMEOUT, STATUS_OOM, STATUS_CRASHED, STATUS_FAILED)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+class ExtractionResult:
+    def __init__(self, status, text='', errors=None, duration=0.0, steps=None):
+        self.status = status
+        self.text = text
+        self.errors = errors or {}  # {method: error} for methods that raised
+        self.duration = duration
+        self.steps = steps or []    # [(method, verdict)] of the extraction cascade
+
+    @property
+    def methods(self):
+        return [method for method, _ in self.steps]
+
+    @property
+    def path(self):
+        """
+        Cascade path as logged in FileAnalysisLog.detail, e.g. 'pypdf:no_emails > pdfplumber:emails'.
+        """
+        return " > ".join(f"{method}:{verdict}" for method, verdict in self.steps)
+
+    @property
+    def ok(self):
+        return self.status == STATUS_OK
+
+    def __repr__(self):
+        return f"<ExtractionResult(status={self.status}, chars={len(self.text)}, errors={list(self.errors)})>"
+
+def rss_bytes(pid):
+    """
+    Resident memory of a process, or None where /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _child_main(conn, max_files):
+    # Ctrl+C goes to the whole process group; let the parent decide
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from processor import Processor
+    from text_store import get_text_store
+    processor = Processor(text_store=get_text_store())
+    for _ in range(max_files):
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        pdf_path, methods, checksum = task
+        errors = {}
+        try:
+            if methods is None:
+                text, steps = processor.extract_with_cascade(pdf_path, errors, checksum)
+            else:
+                text = processor.extract_text_from_pdf(pdf_path, methods, errors, checksum)
+                steps = [(method, 'forced') for method in methods]
+            conn.send((STATUS_OK, text, errors, steps))
+        except MemoryError:
+            conn.send((STATUS_OOM, '', {'extraction': 'MemoryError'}, []))
+            return
+        except Exception as e:
+            conn.send((STATUS_FAILED, '', {'extraction': repr(e)}, []))
+
+class ExtractionPool:
+    def __init__(self, timeout=EXTRACTION_TIMEOUT, max_rss_mb=MAX_RSS_MB, max_files_per_child=MAX_FILES_PER_CHILD):
+        self.timeout = timeout
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.max_files_per_child = max_files_per_child
+        # spawn: the worker has DB connections and a heartbeat thread, don't fork them
+        self.ctx = multiprocessing.get_context('spawn')
+        self.process = None
+        self.conn = None
+        self.files_in_child = 0
+
+    def _start(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=_child_main, args=(child_conn, self.max_files_per_child), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.files_in_child = 0
+
+    def _kill(self):
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(5)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def extract(self, pdf_path, methods=None, checksum=None):
+        """
+        Extract text from one PDF in the child. Never raises for PDF problems.
+        methods=None runs the extraction cascade, a list runs exactly those.
+        checksum (File.checksum) keys the text store; computed when missing.
+        """
+        if self.process is None or not self.process.is_alive() or self.files_in_child >= self.max_files_per_child:
+            self._kill()
+            self._start()
+
+        start = time.time()
+        try:
+            self.conn.send((pdf_path, methods, checksum))
+        except (BrokenPipeError, OSError):
+            self._kill()
+            self._start()
+            self.conn.send((pdf_path, methods, checksum))
+        self.files_in_child += 1
+
+        while True:
+            elapsed = time.time() - start
+            if self.conn.poll(POLL_INTERVAL):
+                try:
+                    status, text, errors, steps = self.conn.recv()
+                except (EOFError, OSError):
+                    break
+                if status not in (STATUS_OK, STATUS_FAILED):
+                    self._kill()
+                return ExtractionResult(status, text, errors, time.time() - start, steps)
+
+            if not self.process.is_alive():
+                break
+            if elapsed > self.timeout:
+                self._kill()
+                return ExtractionResult(STATUS_TIMEOUT, errors={'extraction': f"timeout after {self.timeout}s"}, duration=elapsed)
+            rss = rss_bytes(self.process.pid)
+            if rss is not None and rss > self.max_rss:
+                self._kill()
+                return ExtractionResult(STATUS_OOM, errors={'extraction': f"RSS {rss // (1024 * 1024)} MB over limit"}, duration=elapsed)
+
+        # Child died without answering (segfault in a C extension, kernel OOM killer)
+        exitcode = self.process.exitcode if self.process else None
+        self._kill()
+        status = STATUS_OOM if exitcode == -signal.SIGKILL else STATUS_CRASHED
+        return ExtractionResult(status, errors={'extraction': f"child exited with code {exitcode}"}, duration=time.time() - start)
+
+    def close(self):
+        if self.conn is not None and self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(5)
+            except (BrokenPipeError, OSError):
+                pass
+        self._kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
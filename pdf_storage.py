@@ -0,0 +1,445 @@
+"""
+pdf_storage.py - Content-addressed PDF store shared by every crawler.
+
+Each PDF is stored once, named by its sha256, under two levels of
+256 directories so no directory grows past a few hundred entries even at
+millions of files:
+
+    pdf_store/ab/cd/abcd...ef.pdf
+
+Downloads stream into pdf_store/tmp/, are hashed on the way and renamed into
+place; a PDF that is already there (another language variant of the same
+SciELO article, a re-download) is just dropped. pdf_store/index.db maps each
+URL to its checksum, so a URL downloaded once is not fetched again.
+
+Older runs saved PDFs flat in downloads_ojs/ and downloads_scielo/ under
+generated names; --migrate moves them in and updates files.local_path,
+checksum and size, and the pdf_filename of metadata.jsonl.
+
+    python3 pdf_storage.py                                 # stats
+    python3 pdf_storage.py --migrate [--dry-run] [dirs]    # default: downloads downloads_ojs downloads_scielo
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from host_scheduler import get_header, polite_get
+from text_store import file_checksum
+
+STORE_DIR = os.environ.get('CRAWLER_PDF_STORE', 'pdf_store')
+CHUNK_SIZE = 64 * 1024
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 1024 * 1024
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = int(os.environ.get('CRAWLER_PDF_READ_TIMEOUT', 60))  # seconds without any byte
+PDF_MAGIC = b'%PDF-'
+MAGIC_WINDOW = 1024
+LEGACY_DIRS = ['downloads', 'downloads_ojs', 'downloads_scielo']
+
+StoredPDF = namedtuple('StoredPDF', ['path', 'checksum', 'size'])
+
+class PDFStorage:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, "index.db"), timeout=30,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                checksum CHAR(64) NOT NULL,
+                stored_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                checksum CHAR(64) PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            );
+        """)
+
+    def path_for(self, checksum):
+        return os.path.join(self.root, checksum[:2], checksum[2:4], checksum + ".pdf")
+
+    def get(self, checksum):
+        """
+        StoredPDF for a checksum, or None if the blob is not on disk.
+        """
+        path = self.path_for(checksum)
+        try:
+            return StoredPDF(path, checksum, os.path.getsize(path))
+        except OSError:
+            return None
+
+    def lookup(self, url):
+        """
+        StoredPDF already downloaded from url, or None.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT checksum FROM urls WHERE url = ?", (url,)).fetchone()
+        return self.get(row[0]) if row else None
+
+    def remember(self, url, stored):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO urls (url, checksum, stored_at) VALUES (?, ?, ?)",
+                              (url, stored.checksum, time.time()))
+
+    def partial_path(self, url):
+        """
+        Temp file of a download from url; stays between attempts so they can resume.
+        """
+        return os.path.join(self.tmp_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".part")
+
+    def discard_partial(self, url):
+        path = self.partial_path(url)
+        for name in (path, path + ".validator"):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def temp_path(self):
+        return os.path.join(self.tmp_dir, f"{os.getpid()}.{uuid.uuid4().hex}.part")
+
+    def _commit(self, tmp_path, checksum, size):
+        # Move a fully written temp file to its content address (or drop it if already stored)
+        path = self.path_for(checksum)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO blobs (checksum, size, stored_at) VALUES (?, ?, ?)",
+                              (checksum, size, time.time()))
+        return StoredPDF(path, checksum, size)
+
+    def add_stream(self, chunks):
+        """
+        Store an iterable of byte chunks, hashing while writing.
+        """
+        tmp_path = self.temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self._commit(tmp_path, digest.hexdigest(), size)
+
+    def add_file(self, path, move=False, checksum=None):
+        """
+        Store an existing file; with move=True the original is removed.
+        checksum: its sha256 if the caller already has it.
+        """
+        if not move:
+            with open(path, 'rb') as f:
+                return self.add_stream(iter(lambda: f.read(CHUNK_SIZE), b''))
+        checksum = checksum or file_checksum(path)
+        tmp_path = self.temp_path()
+        try:
+            os.replace(path, tmp_path)
+        except OSError:
+            # Store on another filesystem
+            shutil.move(path, tmp_path)
+        return self._commit(tmp_path, checksum, os.path.getsize(tmp_path))
+
+    def stats(self):
+        with self.lock:
+            blobs, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            urls = self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {'blobs': blobs, 'bytes': size, 'urls': urls}
+
+    def close(self):
+        self.conn.close()
+
+_storage = None
+
+def get_storage():
+    """
+    Process-wide store (one SQLite connection per process).
+    """
+    global _storage
+    if _storage is None:
+        _storage = PDFStorage()
+    return _storage
+
+class DownloadError(Exception):
+    pass
+
+class NotPDFError(DownloadError):
+    pass
+
+def chunk_size_for(total):
+    """
+    Read size for a body of `total` bytes: ~16 reads per file, 64 KB - 1 MB.
+    """
+    if not total:
+        return MIN_CHUNK
+    return max(MIN_CHUNK, min(MAX_CHUNK, total // 16))
+
+def has_pdf_magic(head):
+    # Readers accept the header anywhere in the first KB (BOMs, stray whitespace)
+    return PDF_MAGIC in head[:MAGIC_WINDOW]
+
+def is_pdf(path):
+    try:
+        with open(path, 'rb') as f:
+            return has_pdf_magic(f.read(MAGIC_WINDOW))
+    except OSError:
+        return False
+
+def _content_range(response):
+    """
+    (start, total) of a 206 Content-Range 'bytes start-end/total'; total may be None.
+    """
+    value = get_header(response.headers, 'Content-Range') or ''
+    try:
+        span, total = value.split(' ', 1)[1].split('/')
+        return int(span.split('-')[0]), (None if total == '*' else int(total))
+    except (IndexError, ValueError):
+        return None, None
+
+def _validator(response):
+    # If-Range needs a strong ETag or a Last-Modified date
+    etag = get_header(response.headers, 'ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return get_header(response.headers, 'Last-Modified')
+
+def _fetch(session, url, scheduler, storage, timeout, **kwargs):
+    part_path = storage.partial_path(url)
+    validator_path = part_path + ".validator"
+    with open(part_path, 'ab+') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise DownloadError("already being downloaded by another worker")
+
+        offset = f.seek(0, os.SEEK_END)
+        validator = None
+        if offset and os.path.exists(validator_path):
+            with open(validator_path) as v:
+                validator = v.read().strip() or None
+        if offset and not validator:
+            # Can't check that the partial body is still the same file
+            f.truncate(0)
+            offset = 0
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        # Range offsets count encoded bytes: keep the body unencoded
+        headers['Accept-Encoding'] = 'identity'
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = validator
+
+        with polite_get(session, url, scheduler, stream=True, timeout=timeout, headers=headers, **kwargs) as r:
+            if r.status_code == 416:
+                f.truncate(0)
+                raise DownloadError("stale partial download discarded (416)")
+            r.raise_for_status()
+
+            content_type = (get_header(r.headers, 'Content-Type') or '').lower()
+            if 'html' in content_type:
+                raise NotPDFError(f"not a PDF (Content-Type {content_type})")
+
+            length = get_header(r.headers, 'Content-Length')
+            length = int(length) if length and length.isdigit() else None
+            if r.status_code == 206:
+                start, total = _content_range(r)
+                if start != offset:
+                    f.truncate(0)
+                    raise DownloadError(f"server resumed at byte {start}, expected {offset}")
+                total = total or (offset + length if length is not None else None)
+            else:
+                # Full body (no Range support, or the file changed): start over
+                f.truncate(0)
+                offset = 0
+                total = length
+
+            new_validator = _validator(r)
+            if new_validator:
+                with open(validator_path, 'w') as v:
+                    v.write(new_validator)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+
+            digest = hashlib.sha256()
+            f.seek(0)
+            for chunk in iter(lambda: f.read(MAX_CHUNK), b''):
+                digest.update(chunk)
+            size = offset
+            head = b'' if offset == 0 else None
+            for chunk in r.iter_content(chunk_size=chunk_size_for(total)):
+                if not chunk:
+                    continue
+                if head is not None:
+                    # Stop early on error pages served as application/pdf
+                    head += chunk
+                    if len(head) >= MAGIC_WINDOW:
+                        if not has_pdf_magic(head):
+                            raise NotPDFError("not a PDF (no %PDF header)")
+                        head = None
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+
+        f.flush()
+        if total is not None and size != total:
+            # Keep the partial body: the next attempt resumes it with a Range request
+            raise DownloadError(f"truncated: {size} of {total} bytes")
+        f.seek(0)
+        if not has_pdf_magic(f.read(MAGIC_WINDOW)):
+            raise NotPDFError("not a PDF (no %PDF header)")
+
+        stored = storage._commit(part_path, digest.hexdigest(), size)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    return stored
+
+def download_pdf(session, url, scheduler=None, storage=None, force=False, timeout=None, **kwargs):
+    """
+    Download a PDF into the store via host_scheduler.polite_get.
+    Returns StoredPDF, or None on failure. A URL already in the store is not
+    fetched again unless force.
+
+    The body goes to pdf_store/tmp/<url hash>.part and only reaches the store
+    once it starts with %PDF and matches Content-Length; an interrupted
+    download is resumed with a Range request (If-Range guards against the
+    file having changed), HTML error pages are discarded.
+    """
+    storage = storage or get_storage()
+    if not force:
+        stored = storage.lookup(url)
+        if stored and is_pdf(stored.path):
+            return stored
+
+    print(f"Downloading: {url}")
+    try:
+        stored = _fetch(session, url, scheduler, storage, timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+    except NotPDFError as e:
+        print(f"Failed to download {url}: {e}")
+        storage.discard_partial(url)
+        return None
+    except Exception as e:
+        # Network errors: the partial body stays for the next attempt
+        print(f"Failed to download {url}: {e}")
+        return None
+    storage.remember(url, stored)
+    return stored
+
+def migrate(dirs, storage, db_manager=None, metadata_file='metadata.jsonl', dry_run=False):
+    """
+    Move every PDF under dirs into the store, repointing File rows (with
+    checksum and size) and metadata.jsonl entries to the stored copy.
+    Returns (moved, duplicates, files that are not PDFs).
+    """
+    from database import File
+
+    renamed = {}  # old path -> stored basename
+    by_url = {}   # File.url -> stored basename
+    moved = duplicates = invalid = 0
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if not name.lower().endswith('.pdf'):
+                    continue
+                old_path = os.path.join(root, name)
+                if not is_pdf(old_path):
+                    # HTML error pages saved as .pdf: leave them for the crawler to fetch again
+                    invalid += 1
+                    continue
+                if dry_run:
+                    moved += 1
+                    continue
+                checksum = file_checksum(old_path)
+                duplicates += storage.get(checksum) is not None
+                stored = storage.add_file(old_path, move=True, checksum=checksum)
+                moved += 1
+                renamed[old_path] = os.path.basename(stored.path)
+
+                if db_manager:
+                    for file_record in db_manager.session.query(File).filter_by(local_path=old_path):
+                        file_record.local_path = stored.path
+                        file_record.checksum = stored.checksum
+                        file_record.size = stored.size
+                        if file_record.url:
+                            storage.remember(file_record.url, stored)
+                            by_url[file_record.url] = renamed[old_path]
+                    if moved % 500 == 0:
+                        db_manager.session.commit()
+                        print(f"  {moved} files moved...")
+    if db_manager and not dry_run:
+        db_manager.session.commit()
+
+    if renamed and os.path.exists(metadata_file):
+        # metadata.jsonl rows only have the file name. A name moved from more
+        # than one directory (different files) is matched through the File
+        # row of the entry's pdf_url, and left alone when there is none.
+        by_name = {}
+        for old_path, stored_name in renamed.items():
+            by_name.setdefault(os.path.basename(old_path), set()).add(stored_name)
+        ambiguous = 0
+        tmp_path = f"{metadata_file}.tmp"
+        with open(metadata_file, encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    dst.write(line)
+                    continue
+                stored_names = by_name.get(data.get('pdf_filename'))
+                if stored_names:
+                    if data.get('pdf_url') in by_url:
+                        data['pdf_filename'] = by_url[data['pdf_url']]
+                    elif len(stored_names) == 1:
+                        data['pdf_filename'] = next(iter(stored_names))
+                    else:
+                        ambiguous += 1
+                dst.write(json.dumps(data, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, metadata_file)
+        if ambiguous:
+            print(f"{ambiguous} {metadata_file} entries left as they were: their file name was moved from several directories.")
+
+    return moved, duplicates, invalid
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed PDF store")
+    parser.add_argument('--migrate', nargs='*', metavar='DIR', help="Move PDFs from these directories into the store")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    storage = PDFStorage()
+    if args.migrate is not None:
+        from db_manager import DBManager
+        db_manager = DBManager()
+        moved, duplicates, invalid = migrate(args.migrate or LEGACY_DIRS, storage, db_manager, dry_run=args.dry_run)
+        db_manager.close()
+        print(f"{'Would move' if args.dry_run else 'Moved'} {moved} PDFs ({duplicates} duplicates dropped), "
+              f"{invalid} files without a %PDF header left in place.")
+    stats = storage.stats()
+    print(f"PDFs: {stats['blobs']} | Size: {stats['bytes'] / 1024 / 1024:.1f} MB | URLs: {stats['urls']}")
+    storage.close()
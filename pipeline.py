@@ -0,0 +1,391 @@
+"""
+pipeline.py - Download, extraction and verification in one process, chained by bounded queues.
+
+In `run_fast.py super` every article goes from stage to stage through the
+database: the crawler commits 'downloaded', a processor process finds it on
+its next claim, commits its emails, and a verifier process claims those.
+`run_fast.py pipeline` runs the stages as threads of one process instead:
+
+    download threads -> [extract queue] -> extraction threads -> [checkpoint queue]
+        -> checkpoint writer -> [verify queue] -> verifier thread
+
+  - the queues are bounded (queue_depth), so a slow stage blocks the one
+    feeding it, back to the downloaders, which then stop claiming articles
+  - stages don't write the database themselves: their results go to the
+    checkpoint writer, which commits them in order, up to CHECKPOINT_BATCH
+    per transaction
+  - addresses reach the verifier once their checkpoint is committed, so the
+    verdicts always find the article links to be copied to
+  - whatever is in flight stays claimed under the pipeline's worker id and
+    its leases are renewed by the heartbeat (a downloaded article moves from
+    'crawl' straight to a claimed 'process' row). When stopped, the claims
+    are given back; if the process dies, the leases expire
+
+Stages with nothing in memory take claimable rows from the database
+('process' articles downloaded earlier, 'verify' addresses and retries due),
+so an interrupted run resumes where it stopped, and the normal workers can
+run next to it.
+
+    python3 run_fast.py pipeline --workers 8 --extractors 4 --queue-depth 32
+"""
+
+import datetime
+import logging
+import os
+import queue
+import threading
+from collections import Counter, namedtuple
+
+from db_manager import DBManager, LeaseHeartbeat
+from email_scanner import find_emails
+from metadata_manager import MetadataManager
+from pdf_extraction_pool import ExtractionPool
+from processor import Processor
+from text_store import file_checksum
+from verification_engine import VerificationEngine
+from worker_crawler import get_crawler, harvested_metadata, discover_edition, download_article
+import worker_crawler
+import worker_verifier
+
+os.makedirs('logs', exist_ok=True)
+logger = logging.getLogger('pipeline')
+if not logger.handlers:
+    handler = logging.FileHandler('logs/pipeline.log')
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+DOWNLOADERS = 4
+EXTRACTORS = max(1, (os.cpu_count() or 2) // 2)
+QUEUE_DEPTH = 16
+CHECKPOINT_BATCH = 50
+POLL_INTERVAL = 2
+BATCH_WAIT = 1 # seconds the verifier waits for more addresses before probing
+
+# An article on its way to extraction
+Job = namedtuple('Job', 'article_id path checksum')
+# What the writer needs of an ExtractionResult (the text stays behind)
+Extracted = namedtuple('Extracted', 'ok status errors methods path duration')
+
+# --- Checkpoints: run by the writer, in order; the writer commits ---
+def checkpoint_article(db_manager, article_id, status):
+    db_manager.move_article(article_id, status, commit=False)
+
+def checkpoint_download(db_manager, article_id, stored, pdf_url, worker_id):
+    db_manager.add_file(article_id, stored.path, 'pdf', pdf_url, stored.checksum, stored.size, commit=False)
+    # Still ours: the extraction stage has it
+    db_manager.move_article(article_id, 'processing_extraction', claimed_by=worker_id, commit=False)
+
+def checkpoint_extraction(db_manager, article_id, path, result, emails):
+    """
+    Same records as worker_processor.py; returns the emails for the verifier.
+    """
+    pdf_file = db_manager.get_article_file(article_id, path)
+    if pdf_file:
+        for method in result.errors:
+            if method in Processor.AVAILABLE_METHODS:
+                db_manager.record_analysis_log(pdf_file.id, method, status='failed', commit=False)
+        if not result.ok:
+            db_manager.record_analysis_log(pdf_file.id, 'extraction', status=result.status, commit=False)
+        else:
+            for method in result.methods:
+                if method not in result.errors:
+                    db_manager.record_analysis_log(pdf_file.id, method, commit=False)
+            db_manager.record_analysis_log(pdf_file.id, 'extraction', detail=result.path[:255], commit=False)
+    if not result.ok:
+        db_manager.move_article(article_id, 'quarantined', commit=False)
+        return None
+    db_manager.add_captured_emails(article_id, emails, commit=False)
+    db_manager.move_article(article_id, 'completed', commit=False)
+    return emails
+
+class Pipeline:
+    def __init__(self, worker_id, downloaders=DOWNLOADERS, extractors=EXTRACTORS, queue_depth=QUEUE_DEPTH,
+                 crawl_batch=worker_crawler.DEFAULT_BATCH_SIZE, verify_batch=worker_verifier.DEFAULT_BATCH_SIZE):
+        self.worker_id = worker_id
+        self.downloaders = downloaders
+        self.extractors = extractors
+        self.crawl_batch = crawl_batch
+        self.verify_batch = verify_batch
+        self.extract_queue = queue.Queue(queue_depth)
+        self.checkpoint_queue = queue.Queue(queue_depth)
+        self.verify_queue = queue.Queue(queue_depth)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.extractor_threads = []
+
+    def run(self, stop_event=None):
+        """
+        Until every stage ran out of work, or stop_event (threading or
+        multiprocessing Event) is set. Returns the counters.
+        """
+        heartbeat = LeaseHeartbeat(self.worker_id)
+        heartbeat.start()
+        downloaders = [self._thread(self._download, f"download-{i+1}") for i in range(self.downloaders)]
+        extractors = self.extractor_threads = [self._thread(self._extract, f"extract-{i+1}") for i in range(self.extractors)]
+        writer = self._thread(self._write, "checkpoint")
+        verifier = self._thread(self._verify, "verify")
+        try:
+            # Shut down stage by stage: each one drains its queue first
+            self._join(downloaders, stop_event)
+            # When stopping these may give up: the stages then exit on their own
+            for _ in extractors:
+                self._put(self.extract_queue, None)
+            self._join(extractors, stop_event)
+            self._put(self.checkpoint_queue, None)
+            self._join([writer, verifier], stop_event)
+        finally:
+            self.stop_event.set()
+            for thread in downloaders + extractors + [writer, verifier]:
+                thread.join()
+            heartbeat.stop()
+            # Whatever was dropped on the way goes back to its queue
+            db_manager = DBManager()
+            self.counts['released'] = db_manager.release_worker(self.worker_id)
+            db_manager.close()
+        logger.info(f"Pipeline {self.worker_id} done: {dict(self.counts)}")
+        return self.counts
+
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def _thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def _join(self, threads, stop_event):
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+                if stop_event is not None and stop_event.is_set():
+                    # Leave the rest claimed; the leases run out and the rows go back
+                    self.stop_event.set()
+
+    def _put(self, q, item):
+        """
+        Blocking put (backpressure); gives up only when stopping.
+        """
+        while True:
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                if self.stopped():
+                    return False
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def _checkpoint(self, function, *args):
+        self._put(self.checkpoint_queue, (function, args))
+
+    # --- Stage 1: claim and download ---
+    def _download(self):
+        db_manager = DBManager()
+        metadata_manager = MetadataManager(db_manager=db_manager)
+        crawlers = {}
+        try:
+            while not self.stopped():
+                # Downloaded earlier (or by the normal crawlers): extract first
+                articles = db_manager.claim_batch('process', self.worker_id, self.crawl_batch)
+                if articles:
+                    for article in articles:
+                        self._resume(article, db_manager)
+                    continue
+
+                edition = db_manager.get_next_pending_edition(self.worker_id)
+                if edition:
+                    discover_edition(self.worker_id, edition, crawlers, db_manager)
+                    continue
+
+                articles = db_manager.claim_batch('crawl', self.worker_id, self.crawl_batch)
+                if articles:
+                    for article in articles:
+                        if self.stopped():
+                            break
+                        self._download_article(article, crawlers, db_manager, metadata_manager)
+                    continue
+
+                # Other downloaders may still be discovering editions
+                if not db_manager.queue_remaining('discover') and not db_manager.queue_remaining('crawl'):
+                    break
+                self.stop_event.wait(POLL_INTERVAL)
+        finally:
+            db_manager.close()
+
+    def _download_article(self, article, crawlers, db_manager, metadata_manager):
+        try:
+            journal = article.edition.journal
+            crawler = get_crawler(crawlers, journal, db_manager) if journal else None
+            if not crawler:
+                logger.error(f"Article {article.id} has no journal or an unknown source type")
+                self._checkpoint(checkpoint_article, article.id, 'error_metadata')
+                return
+            meta = harvested_metadata(article, crawler, db_manager)
+            status, stored, pdf_url = download_article(self.worker_id, article, crawler, metadata_manager, meta)
+        except Exception as e:
+            logger.error(f"ERROR downloading article {article.id}: {e}")
+            db_manager.session.rollback()
+            self._checkpoint(checkpoint_article, article.id, 'error_exception')
+            return
+        self._count(status)
+        if not stored:
+            self._checkpoint(checkpoint_article, article.id, status)
+            return
+        # The checkpoint is queued before the job, so it is written first
+        self._checkpoint(checkpoint_download, article.id, stored, pdf_url, self.worker_id)
+        self._put(self.extract_queue, Job(article.id, stored.path, stored.checksum))
+
+    def _resume(self, article, db_manager):
+        pdf_file = next((f for f in article.files if f.file_type == 'pdf' and f.local_path and os.path.exists(f.local_path)), None)
+        if not pdf_file:
+            logger.warning(f"Valid file path not found on disk for Article {article.id}")
+            self._checkpoint(checkpoint_article, article.id, 'error_nofile')
+        elif db_manager.is_file_quarantined(pdf_file.id):
+            self._checkpoint(checkpoint_article, article.id, 'quarantined')
+        else:
+            self._put(self.extract_queue, Job(article.id, pdf_file.local_path, pdf_file.checksum or file_checksum(pdf_file.local_path)))
+
+    # --- Stage 2: extract ---
+    def _extract(self):
+        # PDFs are parsed in a supervised child process (timeout, memory cap)
+        pool = ExtractionPool()
+        try:
+            while True:
+                try:
+                    job = self.extract_queue.get(timeout=1)
+                except queue.Empty:
+                    if self.stopped():
+                        break
+                    continue
+                if job is None:
+                    break
+                if self.stopped():
+                    continue
+                try:
+                    result = pool.extract(job.path, checksum=job.checksum)
+                    emails = find_emails(result.text) if result.ok else []
+                    extracted = Extracted(result.ok, result.status, result.errors, result.methods, result.path, result.duration)
+                    logger.info(f"EXTRACTED: {len(emails)} emails from Article {job.article_id} ({result.duration:.2f}s, {result.status})")
+                    self._count('extracted')
+                    self._checkpoint(checkpoint_extraction, job.article_id, job.path, extracted, emails)
+                except Exception as e:
+                    logger.error(f"ERROR extracting article {job.article_id}: {e}")
+                    self._checkpoint(checkpoint_article, job.article_id, 'error_processing')
+        finally:
+            pool.close()
+
+    # --- Durable checkpoints ---
+    def _write(self):
+        db_manager = DBManager()
+        try:
+            done = False
+            while not done:
+                try:
+                    items = [self.checkpoint_queue.get(timeout=1)]
+                except queue.Empty:
+                    # Stopped and every extractor gone: nothing more will come
+                    done = self.stopped() and not any(t.is_alive() for t in self.extractor_threads)
+                    continue
+                while len(items) < CHECKPOINT_BATCH and items[-1] is not None:
+                    try:
+                        items.append(self.checkpoint_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if items[-1] is None:
+                    done = True
+                    items.pop()
+                for emails in self._apply(db_manager, items):
+                    self._put(self.verify_queue, emails)
+        finally:
+            self.verify_queue.put(None)
+            db_manager.close()
+
+    def _apply(self, db_manager, items):
+        """
+        Write a group of checkpoints in one transaction; the email lists to
+        verify are returned once committed.
+        """
+        if not items:
+            return []
+        try:
+            results = [function(db_manager, *args) for function, args in items]
+            db_manager.session.commit()
+        except Exception as e:
+            db_manager.session.rollback()
+            if len(items) == 1:
+                function, args = items[0]
+                logger.error(f"ERROR writing checkpoint {function.__name__}{args[:1]}: {e}")
+                # Our heartbeat would keep it claimed: hand the article back to its queue
+                for phase in ('crawl', 'process'):
+                    db_manager.release_claims(phase, self.worker_id, [args[0]])
+                return []
+            # One bad checkpoint must not take the others with it
+            return [emails for item in items for emails in self._apply(db_manager, [item])]
+        self._count('checkpoints', len(items))
+        self._count('commits')
+        return [emails for emails in results if emails]
+
+    # --- Stage 3: verify ---
+    def _verify(self):
+        db_manager = DBManager()
+        # Same checks and result store as worker_verifier.py
+        engine = VerificationEngine(db_manager.session)
+        upstream_done = False
+        try:
+            while True:
+                batch = []
+                try:
+                    item = self.verify_queue.get(timeout=BATCH_WAIT)
+                    while item is not None:
+                        batch.extend(item)
+                        if len(batch) >= self.verify_batch:
+                            break
+                        item = self.verify_queue.get_nowait()
+                    upstream_done = upstream_done or item is None
+                except queue.Empty:
+                    pass
+                if self.stopped():
+                    # Unverified addresses stay PENDING in the database
+                    if upstream_done:
+                        break
+                    continue
+
+                claimed = []
+                if not batch:
+                    claimed = db_manager.claim_batch('verify', self.worker_id, self.verify_batch)
+                    batch = [address.email for address in claimed]
+                if not batch:
+                    if upstream_done:
+                        if not db_manager.queue_remaining('verify', ignore_worker=self.worker_id):
+                            break
+                        # Retries not due yet (or claimed by other verifiers)
+                        due = db_manager.next_attempt_due('verify')
+                        wait = POLL_INTERVAL if due is None else max(0, (due - datetime.datetime.utcnow()).total_seconds())
+                        self.stop_event.wait(min(wait, 30))
+                    continue
+
+                try:
+                    verdicts = engine.verify(batch, self.stop_event)
+                    if verdicts is None:
+                        db_manager.release_claims('verify', self.worker_id, [address.id for address in claimed])
+                        continue
+                    engine.fan_out(verdicts.values())
+                    for verdict in verdicts.values():
+                        self._count(verdict.status)
+                except Exception as e:
+                    logger.error(f"ERROR verifying batch: {e}")
+                    db_manager.session.rollback()
+                    # As in worker_verifier.py: back to the queue, retried with backoff
+                    try:
+                        engine.retry_later(batch, self.worker_id, "ERROR")
+                    except Exception as e:
+                        logger.error(f"ERROR scheduling retries: {e}")
+                        db_manager.session.rollback()
+        finally:
+            engine.close()
+            db_manager.close()
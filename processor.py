@@ -1,109 +1,213 @@
-import re
 import os
 import pandas as pd
 from pypdf import PdfReader
 from metadata_manager import MetadataManager
+from email_scanner import EmailScanner, find_emails
+from text_store import file_checksum
 from tqdm import tqdm
 
+# Extractors tried in order (cheapest first) when no explicit methods are given;
+# the cascade stops at the first one whose text yields emails.
+EXTRACTION_CASCADE = [m.strip() for m in os.environ.get('CRAWLER_EXTRACTION_CASCADE', 'pypdf,pdfplumber').split(',') if m.strip()]
+
+# Below this many characters a page-layer is considered empty (scanned PDF, broken fonts)
+MIN_TEXT_CHARS = 200
+# Share of letters/whitespace/punctuation under which text is considered garbled
+MIN_READABLE_RATIO = 0.75
+
+# Author emails sit on the first pages or in the correspondence block at the
+# end: the cascade reads (first HEAD, last TAIL) pages first and the rest only
+# when those have no emails. 0,0 always reads whole documents.
+PAGE_WINDOW = tuple(int(n) for n in os.environ.get('CRAWLER_PAGE_WINDOW', '2,2').split(','))
+
+def page_order(n_pages, window=None):
+    """
+    Page indices, the (head, tail) window first and the middle pages after it.
+    """
+    if not window:
+        return list(range(n_pages))
+    head, tail = window
+    first = list(range(min(head, n_pages)))
+    last = [i for i in range(max(n_pages - tail, 0), n_pages) if i >= len(first)]
+    middle = range(len(first), n_pages - len(last))
+    return first + last + list(middle)
+
+def join_pages(pages):
+    """
+    {page index: text} -> document text in page order.
+    """
+    return "".join(pages[i] + "\n" for i in sorted(pages) if pages[i])
+
+def text_verdict(text, emails):
+    """
+    Why the cascade would stop ('emails') or escalate ('empty', 'garbled', 'no_emails').
+    """
+    if emails:
+        return 'emails'
+    stripped = text.strip()
+    if len(stripped) < MIN_TEXT_CHARS:
+        return 'empty'
+    sample = stripped[:20000]
+    readable = sum(1 for c in sample if c.isalpha() or c.isspace() or c in '.,;:()-@')
+    if readable / len(sample) < MIN_READABLE_RATIO or sample.count('(cid:') > 20 or sample.count('\ufffd') > 20:
+        return 'garbled'
+    return 'no_emails'
+
 class Processor:
     AVAILABLE_METHODS = ['pypdf', 'pdfplumber']
 
-    def __init__(self, download_dir='downloads', output_file='emails.xlsx', append=False, db_manager=None):
+    def __init__(self, download_dir='downloads', output_file='emails.xlsx', append=False, db_manager=None, cascade=None, window=None, text_store=None):
         self.download_dir = download_dir
         self.output_file = output_file
         self.append = append
         self.db_manager = db_manager
+        self.cascade = cascade or EXTRACTION_CASCADE
+        self.window = window if window is not None else PAGE_WINDOW
+        # text_store.TextStore: pages already extracted from a PDF (same checksum) aren't parsed again
+        self.text_store = text_store
 
-    def _extract_with_pypdf(self, pdf_path):
-        text = ""
+    def iter_pages(self, method, pdf_path, errors=None, window=None, cached=None):
+        """
+        Yield (page index, text) one page at a time. With window=(head, tail)
+        the first `head` and last `tail` pages come first, then the rest, so
+        the caller can stop reading as soon as it has what it needs.
+        Pages in `cached` ({page index: text}) are yielded without extracting them.
+        A failing extractor ends the generator; the error goes to `errors`.
+        """
+        cached = cached or {}
         try:
-            reader = PdfReader(pdf_path)
-            for page in reader.pages:
-                extract = page.extract_text()
-                if extract:
-                    text += extract + "\n"
+            if method == 'pypdf':
+                reader = PdfReader(pdf_path)
+                for i in page_order(len(reader.pages), window):
+                    yield i, cached[i] if i in cached else (reader.pages[i].extract_text() or "")
+            elif method == 'pdfplumber':
+                import pdfplumber
+                with pdfplumber.open(pdf_path) as pdf:
+                    for i in page_order(len(pdf.pages), window):
+                        if i in cached:
+                            yield i, cached[i]
+                            continue
+                        page = pdf.pages[i]
+                        yield i, page.extract_text() or ""
+                        # Drop the page's parsed layout objects right away
+                        page.close()
+        except ImportError:
+            if errors is not None:
+                errors[method] = f"{method} not installed"
+        except MemoryError:
+            raise
         except Exception as e:
-            # print(f"pypdf error on {pdf_path}: {e}")
-            pass
-        return text
+            # Pages read so far were already yielded; the error is reported through `errors`
+            if errors is not None:
+                errors[method] = repr(e)
 
-    def _extract_with_pdfplumber(self, pdf_path):
-        text = ""
+    def _extract_with_pypdf(self, pdf_path, errors=None):
+        return join_pages(dict(self.iter_pages('pypdf', pdf_path, errors)))
+
+    def _extract_with_pdfplumber(self, pdf_path, errors=None):
+        return join_pages(dict(self.iter_pages('pdfplumber', pdf_path, errors)))
+
+    def _checksum(self, pdf_path, checksum=None):
+        if self.text_store is None:
+            return None
+        return checksum or file_checksum(pdf_path)
+
+    def _read_pages(self, method, pdf_path, errors=None, checksum=None, window=None, scanner=None):
+        """
+        Text of one extractor. With a scanner, each page is fed to it as it is
+        read and, once the (head, tail) window is read and has emails, the rest
+        of the document is left unread. Pages come from / go to the text store
+        when there is one. Returns (text, read_whole_document).
+        """
+        cached, complete = ({}, False) if checksum is None else self.text_store.get(checksum, method)
+        if complete:
+            page_iter = ((i, cached[i]) for i in page_order(len(cached), window))
+        else:
+            page_iter = self.iter_pages(method, pdf_path, errors if errors is not None else {}, window, cached)
+
+        pages = {}
+        whole = True
+        window_size = sum(window) if window else 0
         try:
-            import pdfplumber
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    extract = page.extract_text()
-                    if extract:
-                        text += "\n" + extract + "\n"
-        except ImportError:
-            pass 
-        except Exception as e:
-             # print(f"pdfplumber error on {pdf_path}: {e}")
-             pass
-        return text
+            for i, page_text in page_iter:
+                pages[i] = page_text
+                if scanner is not None:
+                    scanner.feed(page_text)
+                    if len(pages) == window_size and scanner.emails:
+                        # Found in the front matter / correspondence block: leave the rest unread
+                        whole = False
+                        break
+        finally:
+            page_iter.close()
+
+        if checksum is not None and not complete:
+            failed = errors is not None and method in errors
+            new_pages = {i: page_text for i, page_text in pages.items() if i not in cached}
+            self.text_store.put(checksum, method, new_pages, complete=whole and not failed)
+        return join_pages(pages), whole
 
-    def extract_text_from_pdf(self, pdf_path, methods_to_run=None):
+    def extract_with_cascade(self, pdf_path, errors=None, checksum=None):
         """
-        Extract text using specified methods.
-        If methods_to_run is None, runs all available.
+        Run the extractors of self.cascade in order until the text yields emails.
+        Each extractor reads its page window first (see PAGE_WINDOW) and the
+        whole document only when the window has no emails.
+        Returns (text, steps) with steps = [(method, verdict), ...] for the
+        methods that actually ran (see text_verdict); the verdict of a step
+        that stopped inside the window is suffixed with '@window'.
         """
+        checksum = self._checksum(pdf_path, checksum)
+        window = self.window if any(self.window) else None
+        errors = errors if errors is not None else {}
         text = ""
+        steps = []
+        scanner = EmailScanner()
+        for method in self.cascade:
+            if method not in self.AVAILABLE_METHODS:
+                continue
+            method_text, whole = self._read_pages(method, pdf_path, errors, checksum, window, scanner)
+            text += method_text
+            verdict = text_verdict(text, scanner.emails)
+            steps.append((method, verdict if whole else f"{verdict}@window"))
+            if verdict == 'emails':
+                break
+        return text, steps
+
+    def extract_text_from_pdf(self, pdf_path, methods_to_run=None, errors=None, checksum=None):
+        """
+        Extract text using specified methods.
+        If methods_to_run is None, runs the extraction cascade (cheapest
+        extractor first, escalating only while no emails are found).
+        errors: optional dict, filled with {method: error} for methods that failed.
+        checksum: sha256 of the file if already known (text store key).
+        """
         if methods_to_run is None:
-            methods_to_run = self.AVAILABLE_METHODS
+            return self.extract_with_cascade(pdf_path, errors, checksum)[0]
 
-        if 'pypdf' in methods_to_run:
-            text += self._extract_with_pypdf(pdf_path)
-        
-        if 'pdfplumber' in methods_to_run:
-            text += self._extract_with_pdfplumber(pdf_path)
-             
+        checksum = self._checksum(pdf_path, checksum)
+        errors = errors if errors is not None else {}
+        text = ""
+        for method in self.AVAILABLE_METHODS:
+            if method in methods_to_run:
+                text += self._read_pages(method, pdf_path, errors, checksum)[0]
         return text
 
     def extract_emails(self, text):
-        # 1. Basic normalization
-        # Replace common obfuscations if they are clear
-        # (Be careful not to replace valid text, but " [at] " is usually an email)
-        text_norm = text.replace(' [at] ', '@').replace(' (at) ', '@').replace(' at ', '@')
-        
-        # 2. Extract potential emails
-        # Regex explanation:
-        # User part: [a-zA-Z0-9._%+-]+
-        # @ part: \s*@\s* (allows whitespace)
-        # Domain part: [a-zA-Z0-9.-]+
-        # Dot part: \s*\.\s* (allows whitespace)
-        # TLD: [a-zA-Z]{2,}
-        
-        # We need to capture them and then clean up spaces.
-        # Improved regex: prevents matching merged text like "brName" by enforcing TLD to be either all lower or all upper.
-        email_pattern = r'([a-zA-Z0-9._%+-]+)\s*@\s*([a-zA-Z0-9.-]+)\s*\.\s*([a-z]{2,}|[A-Z]{2,})\b'
-        
-        matches = re.findall(email_pattern, text_norm)
-        
-        emails = []
-        for match in matches:
-            # Reconstruct without spaces
-            email = f"{match[0]}@{match[1]}.{match[2]}"
-            emails.append(email)
-
-        # 3. Also try searching in a "flattened" text to catch emails broken by newlines
-        # but be careful of merging separate words.
-        # simple check: if we didn't find many, maybe try joining lines?
-        # Actually, let's just always try the strict pattern on flattened text too.
-        flat_text = text_norm.replace('\n', '') # Remove all newlines
-        matches_flat = re.findall(email_pattern, flat_text)
-        for match in matches_flat:
-             email = f"{match[0]}@{match[1]}.{match[2]}"
-             emails.append(email)
-
-        return list(set(emails))
+        """
+        Unique email addresses of text (see email_scanner), lowercase.
+        """
+        return find_emails(text)
 
     def process_all(self, metadata_manager=None):
         if not os.path.exists(self.download_dir):
             print(f"Directory {self.download_dir} not found.")
             return
 
-        pdf_files = [f for f in os.listdir(self.download_dir) if f.lower().endswith('.pdf')]
+        # Walks subdirectories too: the PDF store (pdf_storage.py) is sharded by checksum
+        pdf_files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(self.download_dir)
+            for name in names if name.lower().endswith('.pdf')
+        ]
         print(f"Found {len(pdf_files)} PDFs in {self.download_dir}")
         
         if not pdf_files:
@@ -123,9 +227,9 @@ class Processor:
 
         total_updated_authors = 0
 
-        for pdf_file in tqdm(pdf_files, desc="Processing PDFs", unit="pdf"):
+        for pdf_path in tqdm(pdf_files, desc="Processing PDFs", unit="pdf"):
 
-            pdf_path = os.path.join(self.download_dir, pdf_file)
+            pdf_file = os.path.basename(pdf_path)
             
             # Determine methods to run
             methods_to_run = list(self.AVAILABLE_METHODS)
@@ -147,7 +251,21 @@ class Processor:
                 # print(f"Skipping {pdf_file}, all methods already run.")
                 continue
 
-            text = self.extract_text_from_pdf(pdf_path, methods_to_run)
+            checksum = file_record.checksum if file_record else None
+            if file_record and not checksum:
+                checksum = file_record.checksum = file_checksum(pdf_path)
+                self.db_manager.session.commit()
+
+            steps = None
+            skipped = []
+            if methods_to_run == self.AVAILABLE_METHODS:
+                # Nothing ran on this file yet: cheapest extractor first
+                text, steps = self.extract_with_cascade(pdf_path, checksum=checksum)
+                methods_to_run = [method for method, _ in steps]
+                # Not needed this time: logged, so a re-run doesn't run them either
+                skipped = [m for m in self.AVAILABLE_METHODS if m not in methods_to_run]
+            else:
+                text = self.extract_text_from_pdf(pdf_path, methods_to_run, checksum=checksum)
             emails = self.extract_emails(text)
             
             # Look up metadata
@@ -177,6 +295,12 @@ class Processor:
                         
                         # Let's log 'completed' for the method itself.
                         self.db_manager.record_analysis_log(file_record.id, method)
+                    for method in skipped:
+                        self.db_manager.record_analysis_log(file_record.id, method, status='skipped')
+
+                    if steps:
+                        path = " > ".join(f"{method}:{verdict}" for method, verdict in steps)
+                        self.db_manager.record_analysis_log(file_record.id, 'extraction', detail=path[:255])
 
             # NEW: Log explicit "no_email_found" if result is empty
             if not emails and file_record:
@@ -226,22 +350,20 @@ class Processor:
 if __name__ == "__main__":
     from db_manager import DBManager
     from metadata_manager import MetadataManager
+    from text_store import get_text_store
+    from pdf_storage import LEGACY_DIRS, STORE_DIR
     
     db_manager = DBManager()
     metadata_manager = MetadataManager(db_manager=db_manager)
     
     print("Starting manual processing...")
     
-    # Process SciELO
-    if os.path.exists('downloads_scielo'):
-        print("Processing SciELO downloads...")
-        p_scielo = Processor(download_dir='downloads_scielo', output_file='emails.csv', db_manager=db_manager)
-        p_scielo.process_all(metadata_manager)
-
-    # Process OJS (Append)
-    if os.path.exists('downloads_ojs'):
-        print("Processing OJS downloads...")
-        # Check if first one created the file
-        append = os.path.exists('emails.csv')
-        p_ojs = Processor(download_dir='downloads_ojs', output_file='emails.csv', append=append, db_manager=db_manager)
-        p_ojs.process_all(metadata_manager)
+    # PDF store first, then directories of older runs not migrated yet
+    append = False
+    for directory in [STORE_DIR] + LEGACY_DIRS:
+        if os.path.exists(directory):
+            print(f"Processing {directory}...")
+            processor = Processor(download_dir=directory, output_file='emails.csv', append=append, db_manager=db_manager, text_store=get_text_store())
+            processor.process_all(metadata_manager)
+            # Following directories append to the CSV the first one created
+            append = os.path.exists('emails.csv')
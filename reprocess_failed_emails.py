@@ -8,6 +8,7 @@ sys.path.append(os.getcwd())
 
 from processor import Processor
 from db_manager import DBManager
+from text_store import get_text_store
 
 def reprocess_failed_emails(csv_report_path):
     if not os.path.exists(csv_report_path):
@@ -23,7 +24,8 @@ def reprocess_failed_emails(csv_report_path):
         return
 
     db_manager = DBManager()
-    processor = Processor(db_manager=db_manager)
+    # Text already extracted from a PDF comes from the text store: only the email scan re-runs
+    processor = Processor(db_manager=db_manager, text_store=get_text_store())
     
     total_files = len(df)
     print(f"Found {total_files} files to reprocess.")
@@ -1,17 +1,38 @@
 import argparse
 import multiprocessing
+import os
 import time
 import sys
 import threading
 from db_manager import DBManager
-from worker_crawler import run_crawler_worker
-from worker_processor import run_processor_worker
-from worker_verifier import run_verifier_worker
-from database import Journal, Article, Edition, CapturedEmail
+from worker_crawler import run_crawler_worker, DEFAULT_BATCH_SIZE as CRAWL_BATCH_SIZE, PHASES as CRAWL_PHASES
+from worker_processor import run_processor_worker, DEFAULT_BATCH_SIZE as PROCESS_BATCH_SIZE, PHASES as PROCESS_PHASES
+from worker_verifier import run_verifier_worker, DEFAULT_BATCH_SIZE as VERIFY_BATCH_SIZE, PHASES as VERIFY_PHASES
+from work_broker import WorkBroker
+from pipeline import Pipeline, EXTRACTORS, QUEUE_DEPTH
+from database import Journal, Article, Edition, EmailVerification
 from tqdm import tqdm
 
-def run_discovery_phase():
-    print("--- STARTING DISCOVERY PHASE ---")
+# Queues each kind of worker serves (the broker wakes them and tells
+# downstream workers when they are all gone)
+WORKER_PHASES = {
+    run_crawler_worker: CRAWL_PHASES,
+    run_processor_worker: PROCESS_PHASES,
+    run_verifier_worker: VERIFY_PHASES,
+}
+
+def start_worker(broker, target, args):
+    p = multiprocessing.Process(target=target, args=args)
+    p.start()
+    broker.track(p, WORKER_PHASES[target])
+    return p
+
+def run_discovery_phase(incremental=False):
+    """
+    incremental: stop reading a journal's archive at the first page that
+    only lists editions already in the DB.
+    """
+    print(f"--- STARTING DISCOVERY PHASE{' (incremental)' if incremental else ''} ---")
     db_manager = DBManager()
     
     journals = db_manager.session.query(Journal).filter_by(active=True).order_by(Journal.id.desc()).all()
@@ -19,6 +40,7 @@ def run_discovery_phase():
     
     from ojs_crawler import OJSCrawler
     from scielo_crawler import SciELOCrawler
+    from ojs_oai_harvester import OJSOAIHarvester
     from metadata_manager import MetadataManager
     
     # metadata_manager = MetadataManager(db_manager=db_manager)
@@ -36,32 +58,44 @@ def run_discovery_phase():
                 crawler = SciELOCrawler(journal.url, journal.name, db_manager=db_manager)
             elif journal.source_type == 'ojs':
                 crawler = OJSCrawler(journal.url, journal.name, db_manager=db_manager)
+            elif journal.source_type == 'ojs_oai':
+                crawler = OJSOAIHarvester(journal.url, journal.name, db_manager=db_manager)
             else:
                 pbar.update(1)
                 continue
 
             db_manager.update_journal_last_crawled(journal.id)
 
+            if journal.source_type == 'ojs_oai':
+                # Editions and articles straight from OAI-PMH; the watermark holds the
+                # last responseDate, used as from= (day granularity) on incremental runs
+                from_date = crawler.from_date(journal.discovery_watermark) if incremental else None
+                try:
+                    count, response_date = crawler.harvest(journal.id, from_date)
+                    db_manager.update_discovery_watermark(journal.id, response_date)
+                    tqdm.write(f"OAI {journal.name[:30]}: {count} records")
+                    pbar.update(1)
+                    continue
+                except Exception as e:
+                    tqdm.write(f"OAI harvest failed for {journal.name[:30]} ({e}), falling back to HTML archive")
+
             try:
-                issues = crawler.get_all_issues()
-                
-                for issue_url in issues:
-                    edition = db_manager.get_or_create_edition(journal.id, issue_url)
-                    
-                    if db_manager.is_edition_completed(issue_url):
-                        continue
-                    
-                    # COMMENTED OUT: Sequential scraping is too slow and blocks everything.
-                    # We let the workers handle this via get_next_pending_edition().
-                    # try:
-                    #     article_urls = crawler.get_article_urls(issue_url)
-                    #     for art_url in article_urls:
-                    #          db_manager.add_article(edition.id, "Unknown Title", art_url)
-                    #     
-                    #     db_manager.mark_edition_completed(edition.id)
-                    #     
-                    # except Exception as e:
-                    #     pass
+                known_urls = db_manager.get_known_edition_urls(journal.id)
+                issues = crawler.get_all_issues(known_urls if incremental else None)
+                db_manager.add_editions(journal.id, issues, known_urls)
+                db_manager.update_discovery_watermark(journal.id, issues[0] if issues else None)
+
+                # COMMENTED OUT: Sequential scraping is too slow and blocks everything.
+                # We let the workers handle this via get_next_pending_edition().
+                # try:
+                #     article_urls = crawler.get_article_urls(issue_url)
+                #     for art_url in article_urls:
+                #          db_manager.add_article(edition.id, "Unknown Title", art_url)
+                #     
+                #     db_manager.mark_edition_completed(edition.id)
+                #     
+                # except Exception as e:
+                #     pass
             except Exception as e:
                 pass
 
@@ -73,9 +107,11 @@ def run_discovery_phase():
     pbar.close()
     print("--- DISCOVERY FINISHED ---")
 
-def monitor_progress(stop_event):
+def monitor_progress(stop_event, processes=None):
     """
-    Monitor DB and update progress bars.
+    Monitor DB and update progress bars, until every process (if given) has
+    exited: workers stop on their own once upstream is done and their queue
+    is empty.
     """
     db_manager = DBManager()
     
@@ -90,10 +126,12 @@ def monitor_progress(stop_event):
     
     pbar_crawl = tqdm(desc="Crawling (Articles Pending)", unit="article")
     pbar_process = tqdm(desc="Processing (PDFs Pending)", unit="pdf")
-    pbar_verify = tqdm(desc="Verifying (Emails Pending)", unit="email")
+    pbar_verify = tqdm(desc="Verifying (Addresses Pending)", unit="address")
     
     try:
         while not stop_event.is_set():
+            if processes is not None and not any(p.is_alive() for p in processes):
+                break
             session = db_manager.session
             
             # Crawling
@@ -103,9 +141,9 @@ def monitor_progress(stop_event):
             # Processing
             p_pending = session.query(Article).filter(Article.status.in_(['downloaded', 'processing_extraction'])).count()
             
-            # Verifying
-            v_pending = session.query(CapturedEmail).filter(CapturedEmail.verification_status.in_(['PENDING', 'PROCESSING'])).count()
-            v_completed = session.query(CapturedEmail).filter(CapturedEmail.verification_status.in_(['VALID', 'INVALID'])).count()
+            # Verifying (one queue row per distinct address)
+            v_pending = session.query(EmailVerification).filter(EmailVerification.final_status.in_(['PENDING', 'PROCESSING'])).count()
+            v_completed = session.query(EmailVerification).filter(EmailVerification.final_status.in_(['VALID', 'INVALID', 'UNKNOWN'])).count()
             
             pbar_crawl.n = c_completed
             pbar_crawl.total = c_completed + c_pending
@@ -121,7 +159,7 @@ def monitor_progress(stop_event):
             
             time.sleep(2)
             
-    except:
+    except Exception:
         pass
     finally:
         pbar_crawl.close()
@@ -167,42 +205,40 @@ def reprocess_zero_email_journals(workers):
     # Run the workers again – same as the normal super flow
     stop_event = multiprocessing.Event()
     processes = []
+    broker = WorkBroker()
+    broker.export()
     
     for i in range(workers):
-        p = multiprocessing.Process(target=run_crawler_worker, args=(f"Craw-Rep-{i+1}", stop_event))
-        p.start()
-        processes.append(p)
+        processes.append(start_worker(broker, run_crawler_worker, (f"Craw-Rep-{i+1}-{os.getpid()}", stop_event)))
         
     for i in range(workers):
-        p = multiprocessing.Process(target=run_processor_worker, args=(f"Proc-Rep-{i+1}", stop_event))
-        p.start()
-        processes.append(p)
+        processes.append(start_worker(broker, run_processor_worker, (f"Proc-Rep-{i+1}-{os.getpid()}", stop_event)))
         
     for i in range(workers):
-        p = multiprocessing.Process(target=run_verifier_worker, args=(f"Veri-Rep-{i+1}", stop_event))
-        p.start()
-        processes.append(p)
+        processes.append(start_worker(broker, run_verifier_worker, (f"Veri-Rep-{i+1}-{os.getpid()}", stop_event)))
 
     try:
-        monitor_progress(stop_event)
+        monitor_progress(stop_event, processes)
     except KeyboardInterrupt:
         print("\nStopping RE-PROCESS...")
         stop_event.set()
-        for p in processes:
-            p.join()
-        print("Re-process done.")
+    for p in processes:
+        p.join()
+    broker.close()
+    print("Re-process done.")
 
-def run_parallel_workers(target_func, num_workers=4, label="Worker"):
+def run_parallel_workers(target_func, num_workers=4, label="Worker", batch_size=None):
     processes = []
     stop_event = multiprocessing.Event()
+    broker = WorkBroker()
+    broker.export()
     
     print(f"Starting {num_workers} {label}s... Press Ctrl+C to stop.")
     
     for i in range(num_workers):
-        worker_id = f"{label}-{i+1}"
-        p = multiprocessing.Process(target=target_func, args=(worker_id, stop_event))
-        p.start()
-        processes.append(p)
+        worker_id = f"{label}-{i+1}-{os.getpid()}"
+        args = (worker_id, stop_event) if batch_size is None else (worker_id, stop_event, batch_size)
+        processes.append(start_worker(broker, target_func, args))
     
     # Monitor thread
     monitor_stop = threading.Event()
@@ -225,14 +261,22 @@ def run_parallel_workers(target_func, num_workers=4, label="Worker"):
         for p in processes:
             p.join()
         print("Stopped.")
+    finally:
+        broker.close()
 
 def main():
     parser = argparse.ArgumentParser(
         description="Fast Parallel Crawler", 
         epilog="To STOP the process, use Ctrl+C in the terminal. If stuck, run 'pkill -f run_fast.py'"
     )
-    parser.add_argument('mode', choices=['discover', 'crawl', 'process', 'verify', 'reset', 'all', 'super'], help="Mode of operation")
-    parser.add_argument('--workers', type=int, default=4, help="Number of parallel workers per phase")
+    parser.add_argument('mode', choices=['discover', 'crawl', 'process', 'verify', 'reset', 'all', 'super', 'pipeline'], help="Mode of operation")
+    parser.add_argument('--workers', type=int, default=4, help="Number of parallel workers per phase (pipeline: download threads)")
+    parser.add_argument('--extractors', type=int, default=EXTRACTORS, help="pipeline: extraction threads")
+    parser.add_argument('--queue-depth', type=int, default=QUEUE_DEPTH, help="pipeline: items each stage queue holds before blocking the stage feeding it")
+    parser.add_argument('--crawl-batch', type=int, default=CRAWL_BATCH_SIZE, help="Articles each crawler claims at once")
+    parser.add_argument('--process-batch', type=int, default=PROCESS_BATCH_SIZE, help="Articles each processor claims at once")
+    parser.add_argument('--verify-batch', type=int, default=VERIFY_BATCH_SIZE, help="Emails each verifier claims at once")
+    parser.add_argument('--incremental', action='store_true', help="Discovery stops at the first archive page with only known editions")
     
     args = parser.parse_args()
     
@@ -243,16 +287,16 @@ def main():
         db_manager.reset_stuck_tasks()
         
     elif args.mode == 'discover':
-        run_discovery_phase()
+        run_discovery_phase(args.incremental)
         
     elif args.mode == 'crawl':
-        run_parallel_workers(run_crawler_worker, args.workers, "Crawler")
+        run_parallel_workers(run_crawler_worker, args.workers, "Crawler", args.crawl_batch)
         
     elif args.mode == 'process':
-        run_parallel_workers(run_processor_worker, args.workers, "Processor")
+        run_parallel_workers(run_processor_worker, args.workers, "Processor", args.process_batch)
         
     elif args.mode == 'verify':
-        run_parallel_workers(run_verifier_worker, args.workers, "Verifier")
+        run_parallel_workers(run_verifier_worker, args.workers, "Verifier", args.verify_batch)
         
     elif args.mode == 'super':
         # The FULL SUPER PROCESS
@@ -265,41 +309,40 @@ def main():
         
         stop_event = multiprocessing.Event()
         processes = []
+        # Wakes workers when rows enter their queue; workers exit once
+        # upstream is done and their queue is empty
+        broker = WorkBroker()
+        broker.export()
         
         # 1. Discovery (can generate work while others run?)
         # Discovery is usually fast enough to run first.
-        run_discovery_phase()
+        run_discovery_phase(args.incremental)
         
         # 2. Start Workers
         # Crawlers
         for i in range(args.workers):
-            p = multiprocessing.Process(target=run_crawler_worker, args=(f"Craw-{i+1}", stop_event))
-            p.start()
-            processes.append(p)
+            processes.append(start_worker(broker, run_crawler_worker, (f"Craw-{i+1}-{os.getpid()}", stop_event, args.crawl_batch)))
             
         # Processors
         for i in range(args.workers):
-            p = multiprocessing.Process(target=run_processor_worker, args=(f"Proc-{i+1}", stop_event))
-            p.start()
-            processes.append(p)
+            processes.append(start_worker(broker, run_processor_worker, (f"Proc-{i+1}-{os.getpid()}", stop_event, args.process_batch)))
             
         # Verifiers
         for i in range(args.workers):
-            p = multiprocessing.Process(target=run_verifier_worker, args=(f"Veri-{i+1}", stop_event))
-            p.start()
-            processes.append(p)
+            processes.append(start_worker(broker, run_verifier_worker, (f"Veri-{i+1}-{os.getpid()}", stop_event, args.verify_batch)))
             
         # Monitor
         try:
             # We can run a fancy dashboard here using curses or just tqdm monitoring loop in main thread
-            monitor_progress(stop_event)
+            monitor_progress(stop_event, processes)
             
         except KeyboardInterrupt:
             print("\nStopping SUPER PROCESS...")
             stop_event.set()
-            for p in processes:
-                p.join()
-            print("Done.")
+        for p in processes:
+            p.join()
+        broker.close()
+        print("Done.")
 
         # ----- NEW STEP: Re-process journals with zero emails -----
         # Only run if we actually completed the main super process and weren't interrupted early
@@ -307,6 +350,26 @@ def main():
             print("\n--- Phase 2: RE-VERIFY ZERO-EMAIL JOURNALS ---")
             reprocess_zero_email_journals(args.workers)
 
+    elif args.mode == 'pipeline':
+        # Download, extraction and verification as threads of this process,
+        # handing work over through bounded in-memory queues
+        print("Starting PIPELINE (one process, stages chained in memory)...")
+        print("To STOP: Press Ctrl+C (in-flight work is picked up again on the next run)")
+        run_discovery_phase(args.incremental)
+
+        pipeline = Pipeline(f"Pipe-{os.getpid()}", args.workers, args.extractors, args.queue_depth,
+                            args.crawl_batch, args.verify_batch)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=pipeline.run, args=(stop_event,))
+        thread.start()
+        try:
+            monitor_progress(stop_event, [thread])
+        except KeyboardInterrupt:
+            print("\nStopping PIPELINE...")
+            stop_event.set()
+        thread.join()
+        print(f"Done: {dict(pipeline.counts)}")
+
 if __name__ == "__main__":
     multiprocessing.set_start_method('spawn', force=True)
     main()
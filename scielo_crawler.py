@@ -1,55 +1,78 @@
 import os
 import requests
-from bs4 import BeautifulSoup
 import time
 from urllib.parse import urljoin
 from metadata_manager import MetadataManager
+from host_scheduler import get_scheduler
+from http_cache import ARTICLE_MAX_AGE, cached_get
+from pdf_storage import download_pdf, get_storage
+from html_parsing import META_ONLY, extract_links, make_soup
 
 class SciELOCrawler:
-    def __init__(self, base_url, journal_name, download_dir='downloads_scielo', metadata_manager=None, db_manager=None, force=False):
+    def __init__(self, base_url, journal_name, download_dir='downloads_scielo', metadata_manager=None, db_manager=None, force=False, scheduler=None, storage=None):
         self.base_url = base_url
         self.journal_name = journal_name
         self.download_dir = download_dir
         self.metadata_manager = metadata_manager
         self.db_manager = db_manager
         self.force = force
-        
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
+        # Per-host politeness shared with the other worker processes
+        self.scheduler = scheduler or get_scheduler()
+        # PDFs go to the content-addressed store; download_dir only holds files of older runs
+        self.storage = storage or get_storage()
             
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
         })
 
-    def get_soup(self, url):
+    def get_html(self, url, max_age=None):
         try:
-            response = self.session.get(url, timeout=10)
+            response = cached_get(self.session, url, scheduler=self.scheduler, max_age=max_age, timeout=10)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
+            return response.content
         except Exception as e:
             print(f"Error fetching {url}: {e}")
             return None
 
-    def get_all_issues(self):
+    async def get_html_async(self, url, fetcher, max_age=None):
+        """
+        Async variant of get_html; fetcher is a shared http_fetch.AsyncFetcher.
+        """
+        result = await fetcher.fetch(url, max_age=max_age)
+        if not result.ok:
+            print(f"Error fetching {url}: {result.error or result.status}")
+            return None
+        return result.content
+
+    def get_soup(self, url, max_age=None, parse_only=None):
+        html = self.get_html(url, max_age)
+        return make_soup(html, parse_only) if html else None
+
+    async def get_soup_async(self, url, fetcher, max_age=None, parse_only=None):
+        html = await self.get_html_async(url, fetcher, max_age)
+        return make_soup(html, parse_only) if html else None
+
+    def get_all_issues(self, known_urls=None):
+        # The grid lists every issue on one page, so known_urls saves nothing here
         # Grid page: https://www.scielo.br/j/[acronym]/grid
         grid_url = f"{self.base_url}/grid"
         print(f"Fetching grid: {grid_url}")
-        soup = self.get_soup(grid_url)
-        if not soup:
+        html = self.get_html(grid_url)
+        if not html:
             return []
 
         issue_links = []
         base_path = self.base_url.replace("https://www.scielo.br", "")
         
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+        for link in extract_links(html):
+            href = link.href
             if '/i/' in href and base_path in href:
                 if href.startswith('/'):
                     href = f"https://www.scielo.br{href}"
                 issue_links.append(href)
         
-        return list(set(issue_links))
+        return list(dict.fromkeys(issue_links))
 
     def process_issue(self, issue_url):
         print(f"Processing issue: {issue_url}")
@@ -67,16 +90,24 @@ class SciELOCrawler:
             self.process_article(art_url)
 
     def get_article_urls(self, issue_url):
-        soup = self.get_soup(issue_url)
-        if not soup:
+        html = self.get_html(issue_url)
+        if not html:
+            return []
+        return self._parse_article_urls(extract_links(html))
+
+    async def get_article_urls_async(self, issue_url, fetcher):
+        html = await self.get_html_async(issue_url, fetcher)
+        if not html:
             return []
+        return self._parse_article_urls(extract_links(html))
 
+    def _parse_article_urls(self, links):
         # Find links to ARTICLES (abstracts/texts), not just PDFs
         # Pattern: /j/rap/a/[ID]/...
         article_links = []
         
-        for a in soup.find_all('a', href=True):
-            href = a['href']
+        for link in links:
+            href = link.href
             # We want the text/abstract page. Usually doesn't have 'format=pdf'
             if '/a/' in href and 'format=pdf' not in href:
                 full_url = href
@@ -93,24 +124,32 @@ class SciELOCrawler:
         if not meta: return
         
         pdf_url = meta.get('pdf_url')
-        filename = meta.get('pdf_filename')
 
         if pdf_url:
-            local_path = self.download_pdf_direct(pdf_url, filename)
+            stored = self.download_pdf_direct(pdf_url)
             
             # Only save metadata (and file record) if we actually have the file (downloaded or existed)
-            if local_path and self.metadata_manager:
+            if stored and self.metadata_manager:
+                meta['pdf_filename'] = os.path.basename(stored.path)
                 self.metadata_manager.save_metadata(meta)
             
             # Mark as completed in DB if download successful (or skipped as existing)
-            if local_path and self.db_manager:
+            if stored and self.db_manager:
                 self.db_manager.mark_article_completed_by_url(article_url)
 
     def fetch_article_metadata(self, article_url):
-        soup = self.get_soup(article_url)
+        soup = self.get_soup(article_url, max_age=ARTICLE_MAX_AGE, parse_only=META_ONLY)
+        if not soup:
+            return None
+        return self._parse_article_metadata(soup, article_url)
+
+    async def fetch_article_metadata_async(self, article_url, fetcher):
+        soup = await self.get_soup_async(article_url, fetcher, max_age=ARTICLE_MAX_AGE, parse_only=META_ONLY)
         if not soup:
             return None
+        return self._parse_article_metadata(soup, article_url)
 
+    def _parse_article_metadata(self, soup, article_url):
         # Use Standard Meta Tags (Dublin Core / Google Scholar)
         title = "Unknown Title"
         authors = "Unknown Authors"
@@ -166,24 +205,11 @@ class SciELOCrawler:
             filename = f"scielo_{int(time.time())}.pdf"
         return filename
 
-    def download_pdf_direct(self, pdf_url, filename):
-        local_path = os.path.join(self.download_dir, filename)
-        if not self.force and os.path.exists(local_path) and os.path.getsize(local_path) > 1000:
-            # print(f"Skipping existing (valid): {filename}")
-            return local_path
-            
-        print(f"Downloading: {pdf_url}")
-        try:
-            with self.session.get(pdf_url, stream=True) as r:
-                r.raise_for_status()
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            time.sleep(1)
-            return local_path
-        except Exception as e:
-            print(f"Failed to download {pdf_url}: {e}")
-            return None
+    def download_pdf_direct(self, pdf_url):
+        """
+        Download into the PDF store. Returns pdf_storage.StoredPDF or None.
+        """
+        return download_pdf(self.session, pdf_url, self.scheduler, storage=self.storage, force=self.force)
     
-    def download_pdf(self, pdf_url, filename):
-        return self.download_pdf_direct(pdf_url, filename)
+    def download_pdf(self, pdf_url, filename=None):
+        return self.download_pdf_direct(pdf_url)
@@ -0,0 +1,199 @@
+"""
+smtp_pool.py - RCPT probes over pooled SMTP sessions, grouped by MX host.
+
+Opening a connection, greeting and quitting for every address is what makes
+large institutional MX hosts rate-limit or tarpit the verifier, and the
+handshake dominates each probe. Here the addresses of a batch are grouped by
+MX and each MX gets at most SESSIONS_PER_MX sessions, which are kept open
+between batches:
+  - one session runs many probes: MAIL FROM, RCPT TO, RSET, and again;
+    after PROBES_PER_SESSION probes it reconnects (servers cap RCPTs per session)
+  - new connections go through the host scheduler (host_scheduler.py, key
+    smtp://<mx>), so the connection rate per MX is shared by every verifier
+    process; refused connections and 421 replies halve it
+  - sessions idle for longer than SESSION_IDLE are closed
+
+    pool = SMTPPool()
+    results = pool.probe({'mx1.usp.br': ['a@usp.br', 'b@usp.br']})
+    results['a@usp.br'].code  # 250, 550, ... or None when the MX was unreachable
+    pool.close()
+"""
+
+import os
+import smtplib
+import socket
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from host_scheduler import get_scheduler
+
+SMTP_PORT = int(os.environ.get('CRAWLER_SMTP_PORT', 25))
+SMTP_TIMEOUT = 10
+SESSIONS_PER_MX = int(os.environ.get('CRAWLER_SMTP_SESSIONS_PER_MX', 2))
+SMTP_CONCURRENCY = int(os.environ.get('CRAWLER_SMTP_CONCURRENCY', 16)) # sessions in use at once, all MX
+PROBES_PER_SESSION = 50
+SESSION_IDLE = 30 # seconds
+MAIL_FROM = 'test@example.com'
+HELO_NAME = socket.gethostname()
+
+# code None: no answer (connection refused, timeout, dropped);
+# stage: the command answered with code, 'MAIL' or 'RCPT'
+ProbeResult = namedtuple('ProbeResult', 'code message stage', defaults=(None,))
+
+def mx_key(mx):
+    return f"smtp://{mx}"
+
+class SMTPSession:
+    """
+    One connection to an MX, greeted and ready for probes.
+    """
+    def __init__(self, mx, port=SMTP_PORT, timeout=SMTP_TIMEOUT):
+        self.mx = mx
+        self.probes = 0
+        self.closed = False
+        self.smtp = smtplib.SMTP(timeout=timeout)
+        try:
+            code, message = self.smtp.connect(mx, port)
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, message)
+            code, message = self.smtp.ehlo(HELO_NAME)
+            if code != 250:
+                code, message = self.smtp.helo(HELO_NAME)
+                if code != 250:
+                    raise smtplib.SMTPHeloError(code, message)
+        except Exception:
+            self.close()
+            raise
+        self.last_used = time.time()
+
+    def probe(self, email):
+        """
+        MAIL FROM + RCPT TO email, then RSET for the next probe.
+        """
+        self.probes += 1
+        self.last_used = time.time()
+        stage = 'MAIL'
+        code, message = self.smtp.mail(MAIL_FROM)
+        if code == 250:
+            stage = 'RCPT'
+            code, message = self.smtp.rcpt(email)
+        if code == 421:
+            # Server is closing the session (often: too many probes)
+            self.close()
+        else:
+            self.smtp.rset()
+        return ProbeResult(code, message.decode('utf-8', 'replace') if isinstance(message, bytes) else message, stage)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+
+class SMTPPool:
+    def __init__(self, sessions_per_mx=SESSIONS_PER_MX, concurrency=SMTP_CONCURRENCY, scheduler=None, port=SMTP_PORT):
+        self.sessions_per_mx = sessions_per_mx
+        self.port = port
+        self.scheduler = scheduler or get_scheduler()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+        self.connects = self.probes = 0
+
+    def probe(self, by_mx):
+        """
+        Probe {mx: [addresses]}; returns {address: ProbeResult}. Each MX is
+        probed by at most sessions_per_mx sessions in parallel.
+        """
+        futures = []
+        for mx, emails in by_mx.items():
+            lanes = max(1, min(self.sessions_per_mx, self.scheduler.concurrency(mx_key(mx)), len(emails)))
+            for lane in range(lanes):
+                futures.append(self.executor.submit(self._run_lane, mx, emails[lane::lanes]))
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def _run_lane(self, mx, emails):
+        results = {}
+        session = self._checkout(mx)
+        try:
+            for n, email in enumerate(emails):
+                try:
+                    if session is None or session.closed or session.probes >= PROBES_PER_SESSION:
+                        if session:
+                            session.close()
+                        session = None
+                        session = self._connect(mx)
+                        results[email] = session.probe(email)
+                    else:
+                        try:
+                            results[email] = session.probe(email)
+                        except (smtplib.SMTPServerDisconnected, OSError):
+                            # Pooled session dropped by the server in the meantime
+                            session.close()
+                            session = None
+                            session = self._connect(mx)
+                            results[email] = session.probe(email)
+                    if results[email].code == 421:
+                        self.scheduler.record(mx_key(mx), None)
+                except OSError as e:
+                    # Unreachable or refusing us: leave the rest of the lane for later
+                    if session:
+                        session.close()
+                        session = None
+                    for rest in emails[n:]:
+                        results[rest] = ProbeResult(None, str(e) or e.__class__.__name__)
+                    break
+            with self.lock:
+                self.probes += len(emails)
+        finally:
+            if session is not None and not session.closed:
+                self._checkin(session)
+        return results
+
+    def _connect(self, mx):
+        key = mx_key(mx)
+        self.scheduler.acquire(key)
+        try:
+            session = SMTPSession(mx, self.port)
+        except OSError:
+            self.scheduler.record(key, None)
+            raise
+        self.scheduler.record(key, 220)
+        with self.lock:
+            self.connects += 1
+        return session
+
+    def _checkout(self, mx):
+        now = time.time()
+        found, stale = None, []
+        with self.lock:
+            sessions = self.idle[mx]
+            while sessions and found is None:
+                session = sessions.pop()
+                if now - session.last_used <= SESSION_IDLE:
+                    found = session
+                else:
+                    stale.append(session)
+        for session in stale:
+            session.close()
+        return found
+
+    def _checkin(self, session):
+        with self.lock:
+            self.idle[session.mx].append(session)
+
+    def close(self):
+        with self.lock:
+            sessions = [s for pooled in self.idle.values() for s in pooled]
+            self.idle.clear()
+        for session in sessions:
+            session.close()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,160 @@
+"""
+text_store.py - Extracted PDF text, kept per file checksum.
+
+Every page an extractor reads is stored zlib-compressed in
+crawl_state/text_store.db, keyed by (sha256 of the PDF, method, page), so a
+PDF is parsed once per extractor: re-running email or author parsing over the
+corpus reads the stored text instead of the PDFs. Pages left unread by the
+page window are extracted (and added) only when a later run needs them.
+
+The checksum is also what File.checksum holds; identical PDFs downloaded
+under different names share their text.
+
+    python3 text_store.py            # stats
+    python3 text_store.py --scan     # time an email scan over all stored text
+    python3 text_store.py --clear    # drop everything
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from host_scheduler import STATE_DIR
+
+STORE_PATH = os.path.join(STATE_DIR, "text_store.db")
+COMPRESS_LEVEL = 6
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """
+    sha256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TextStore:
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                checksum CHAR(64) NOT NULL,
+                method TEXT NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 0,
+                extracted_at REAL NOT NULL,
+                PRIMARY KEY (checksum, method)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                checksum CHAR(64) NOT NULL,
+                method TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                PRIMARY KEY (checksum, method, page)
+            );
+        """)
+
+    def get(self, checksum, method):
+        """
+        ({page index: text}, complete) for one extractor of one PDF;
+        complete means every page of the document is there.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT complete FROM documents WHERE checksum = ? AND method = ?", (checksum, method)
+            ).fetchone()
+            if not row:
+                return {}, False
+            rows = self.conn.execute(
+                "SELECT page, text FROM pages WHERE checksum = ? AND method = ?", (checksum, method)
+            ).fetchall()
+        return {page: zlib.decompress(text).decode('utf-8') for page, text in rows}, bool(row[0])
+
+    def put(self, checksum, method, pages, complete=False):
+        """
+        Add pages ({page index: text}) of one extractor; complete marks the
+        document as fully read. A document never goes back to incomplete.
+        """
+        rows = [(checksum, method, page, zlib.compress(text.encode('utf-8'), COMPRESS_LEVEL)) for page, text in pages.items()]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("INSERT OR REPLACE INTO pages (checksum, method, page, text) VALUES (?, ?, ?, ?)", rows)
+                self.conn.execute("""
+                    INSERT INTO documents (checksum, method, complete, extracted_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (checksum, method) DO UPDATE SET
+                        complete = MAX(complete, excluded.complete), extracted_at = excluded.extracted_at
+                """, (checksum, method, int(complete), time.time()))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def iter_documents(self, complete_only=True):
+        """
+        Yield (checksum, method, [page texts in page order]) for every stored extraction.
+        """
+        with self.lock:
+            keys = self.conn.execute(
+                "SELECT checksum, method FROM documents" + (" WHERE complete = 1" if complete_only else "")
+            ).fetchall()
+        for checksum, method in keys:
+            pages, _ = self.get(checksum, method)
+            yield checksum, method, [pages[i] for i in sorted(pages)]
+
+    def stats(self):
+        with self.lock:
+            documents, complete = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(complete), 0) FROM documents").fetchone()
+            pages, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM pages").fetchone()
+            files = self.conn.execute("SELECT COUNT(DISTINCT checksum) FROM documents").fetchone()[0]
+        return {'files': files, 'documents': documents, 'complete': complete, 'pages': pages, 'bytes': size}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM pages")
+            self.conn.execute("DELETE FROM documents")
+            self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
+
+_store = None
+
+def get_text_store():
+    """
+    Process-wide store (one SQLite connection per process).
+    """
+    global _store
+    if _store is None:
+        _store = TextStore()
+    return _store
+
+if __name__ == "__main__":
+    store = TextStore()
+    if '--clear' in sys.argv:
+        store.clear()
+        print("Text store cleared.")
+    if '--scan' in sys.argv:
+        from email_scanner import EmailScanner
+        start = time.perf_counter()
+        documents = chars = emails = 0
+        for _, _, pages in store.iter_documents():
+            scanner = EmailScanner()
+            for page in pages:
+                scanner.feed(page)
+                chars += len(page)
+            documents += 1
+            emails += len(scanner.emails)
+        elapsed = time.perf_counter() - start
+        print(f"Scanned {documents} extractions ({chars / 1024 / 1024:.1f} MB of text) in {elapsed:.1f}s: {emails} emails")
+    stats = store.stats()
+    print(f"PDFs: {stats['files']} | Extractions: {stats['documents']} ({stats['complete']} complete) | "
+          f"Pages: {stats['pages']} | Size: {stats['bytes'] / 1024 / 1024:.1f} MB")
+    store.close()
@@ -0,0 +1,355 @@
+"""
+verification_engine.py - Email verification shared by both verifier front ends.
+
+verify_emails.py (bulk: a CSV of addresses) and worker_verifier.py (queue of
+addresses found in articles) run the same checks and keep one result per address in
+email_verifications, so an address is verified once whoever sees it first:
+  1. syntax
+  2. MX, through the shared domain cache (domain_cache.py)
+  3. catch-all / reject-all domains, one random-mailbox probe per domain
+  4. RCPT probes over pooled SMTP sessions, grouped by MX (smtp_pool.py)
+
+email_verifications has one row per distinct address and is also the
+'verify' work queue: CapturedEmail rows (one per article citing an address)
+reference it through address_id, and a verdict is copied to all of them in
+one statement (fan_out). VALID and INVALID results are reused as they are;
+UNKNOWN ones (catch-all domains, no MX, ...) are checked again when the
+address comes back.
+
+Temporary failures are not verdicts. A 4xx answer (greylisting, rate limits),
+an unreachable MX or a DNS error puts the address back in the queue with
+next_attempt_at set (claim_batch skips it until then), up to MAX_ATTEMPTS
+attempts, after which it is UNKNOWN, never INVALID. The wait is per MX host
+(host_scheduler deferrals, shared by every verifier): it doubles while the MX
+keeps failing, and the addresses of a deferred MX are not probed at all
+until the deferral ends. A batch whose check raised goes back the same way
+(retry_later), its wait doubling with every attempt of the address.
+
+    engine = VerificationEngine(session)
+    verdicts = engine.verify(['a@usp.br', 'b@usp.br'])
+    engine.fan_out(verdicts.values())
+    engine.close()
+"""
+
+import datetime
+import os
+import re
+import time
+from collections import namedtuple
+
+from sqlalchemy import bindparam, case, func, or_, select, update
+
+from database import CapturedEmail, EmailDomain, EmailVerification, upsert
+from domain_cache import DomainCache, NO_MX, ERROR, ACCEPT_ALL, REJECT_ALL, random_mailbox, policy_from_probe
+from host_scheduler import RETRY_BASE, RETRY_MAX
+from smtp_pool import SMTPPool, mx_key
+
+# Regex for basic syntax
+EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+
+# Results that are reused instead of verifying again
+FINAL_STATUSES = ('VALID', 'INVALID')
+VERDICTS = FINAL_STATUSES + ('UNKNOWN',)
+# Not a verdict: try again at retry_at
+RETRY = 'RETRY'
+MAX_ATTEMPTS = int(os.environ.get('CRAWLER_VERIFY_MAX_ATTEMPTS', 5))
+
+Verdict = namedtuple('Verdict', 'email status detail valid_syntax valid_domain valid_mx valid_smtp retry_at', defaults=(None,))
+
+def verify_syntax(email):
+    return bool(EMAIL_REGEX.match(email))
+
+def domain_of(email):
+    return email.split('@')[-1].lower()
+
+def is_temporary(result):
+    # No answer, or 4xx: greylisting, rate limits, mailbox busy
+    return result.code is None or 400 <= result.code < 500
+
+def _utc(timestamp):
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=timestamp - time.time())
+
+def classify(email, valid_syntax, info, policy, result, retry_at=None):
+    """
+    Verdict of one address from its checks. result None means the address
+    was not probed (its MX is deferred); retry_at is when to try again if
+    the outcome was temporary.
+    """
+    if not valid_syntax:
+        return Verdict(email, 'INVALID', "SYNTAX_ERROR", False, False, False, False)
+    if info is None or info.status == ERROR:
+        # Name server trouble says nothing about the address
+        return Verdict(email, RETRY, "DNS_ERROR", True, None, None, None, retry_at)
+    if not info.mx:
+        if info.status == NO_MX:
+            return Verdict(email, 'UNKNOWN', "NO_MX_RECORD", True, True, False, None)
+        return Verdict(email, 'INVALID', "DOMAIN_INVALID", True, False, False, None)
+    if policy == ACCEPT_ALL:
+        # The server says yes to anything: the mailbox can't be confirmed
+        return Verdict(email, 'UNKNOWN', "CATCH_ALL", True, True, True, None)
+    if policy == REJECT_ALL:
+        return Verdict(email, 'UNKNOWN', "REJECT_ALL", True, True, True, None)
+    if result is None:
+        return Verdict(email, RETRY, "MX_DEFERRED", True, True, True, None, retry_at)
+    if result.code is None:
+        return Verdict(email, RETRY, "SMTP_UNREACHABLE", True, True, True, None, retry_at)
+    if 400 <= result.code < 500:
+        detail = "GREYLISTED" if result.code in (450, 451) else "SMTP_TEMPFAIL"
+        return Verdict(email, RETRY, detail, True, True, True, None, retry_at)
+    if 200 <= result.code < 300:
+        return Verdict(email, 'VALID', "VALID_SMTP", True, True, True, True)
+    return Verdict(email, 'INVALID', "SMTP_REJECTED", True, True, True, False)
+
+class VerificationEngine:
+    def __init__(self, session, smtp_pool=None):
+        self.session = session
+        self.domain_cache = DomainCache(session)
+        self.smtp_pool = smtp_pool or SMTPPool()
+
+    def verify(self, emails, stop_event=None):
+        """
+        {email: Verdict} for the addresses; known final results are reused and
+        new ones stored. Returns None when stop_event was set before the SMTP
+        probes (nothing is stored then).
+        """
+        emails = list(dict.fromkeys(emails))
+        verdicts = self.known(emails)
+        pending = [email for email in emails if email not in verdicts]
+        if pending:
+            checked = self.check(pending, stop_event)
+            if checked is None:
+                return None
+            self.record(checked.values())
+            verdicts.update(checked)
+        return verdicts
+
+    def check(self, emails, stop_event=None):
+        """
+        Run the checks (no result store): {email: Verdict}, or None if stopped.
+        """
+        # 1. Syntax
+        valid_syntax = {email: verify_syntax(email) for email in emails}
+
+        # 2. Domain & MX: all domains at once, concurrently
+        domains = {domain_of(email) for email in emails if valid_syntax[email]}
+        try:
+            domain_info = self.domain_cache.lookup(domains)
+        except Exception:
+            # Verdicts become DNS_ERROR, retried later
+            self.session.rollback()
+            domain_info = {}
+        mx_by_domain = {domain: info.mx for domain, info in domain_info.items() if info.mx}
+
+        # MX hosts backing off after temporary failures are left alone
+        scheduler = self.smtp_pool.scheduler
+        retry_at = {}
+        for mx in set(mx_by_domain.values()):
+            until = scheduler.deferred_until(mx_key(mx))
+            if until:
+                retry_at[mx] = until
+        reachable = {domain: mx for domain, mx in mx_by_domain.items() if mx not in retry_at}
+
+        # 3. Catch-all / reject-all domains: no point probing their addresses
+        policies = self.analyse_domains(reachable)
+
+        if stop_event and stop_event.is_set():
+            return None
+
+        # 4. SMTP: grouped by MX, many probes per pooled session
+        by_mx = {}
+        for email in emails:
+            domain = domain_of(email)
+            if valid_syntax[email] and domain in reachable and policies.get(domain) not in (ACCEPT_ALL, REJECT_ALL):
+                by_mx.setdefault(reachable[domain], []).append(email)
+        results = self.smtp_pool.probe(by_mx) if by_mx else {}
+
+        # Exponential backoff per MX: longer while it only fails temporarily,
+        # back to the base delay when it also gave real answers
+        for mx, mx_emails in by_mx.items():
+            temporary = sum(is_temporary(results[email]) for email in mx_emails)
+            if temporary:
+                retry_at[mx] = scheduler.defer(mx_key(mx), restart=temporary < len(mx_emails))
+            else:
+                scheduler.clear_deferral(mx_key(mx))
+
+        dns_retry = time.time() + RETRY_BASE
+        verdicts = {}
+        for email in emails:
+            domain = domain_of(email)
+            mx = mx_by_domain.get(domain)
+            verdicts[email] = classify(email, valid_syntax[email], domain_info.get(domain), policies.get(domain),
+                                       results.get(email), _utc(retry_at.get(mx, dns_retry)))
+        return verdicts
+
+    def analyse_domains(self, mx_by_domain):
+        """
+        SMTP policy of each domain ({domain: mx}): cached verdicts first, the
+        rest learned by probing one random mailbox per domain.
+        """
+        policies = self.domain_cache.get_policies(mx_by_domain)
+        unknown = {domain: mx for domain, mx in mx_by_domain.items() if domain not in policies}
+        if not unknown:
+            return policies
+        canaries = {domain: random_mailbox(domain) for domain in unknown}
+        by_mx = {}
+        for domain, mx in unknown.items():
+            by_mx.setdefault(mx, []).append(canaries[domain])
+        answers = self.smtp_pool.probe(by_mx)
+        learned = {}
+        for domain, canary in canaries.items():
+            policy = policy_from_probe(answers.get(canary))
+            if policy:
+                learned[domain] = policy
+        self.domain_cache.set_policies(learned)
+        policies.update(learned)
+        return policies
+
+    # --- Result store ---
+    def known(self, emails):
+        """
+        Stored final verdicts of the addresses.
+        """
+        table = EmailVerification.__table__
+        rows = self.session.execute(
+            select(table).where(table.c.email.in_(emails), table.c.final_status.in_(FINAL_STATUSES))
+        ).fetchall()
+        return {
+            row.email: Verdict(row.email, row.final_status, row.detail, row.format_valid,
+                               row.domain_valid, row.mx_valid, row.smtp_valid)
+            for row in rows
+        }
+
+    def record(self, verdicts):
+        verdicts = list(verdicts)
+        if not verdicts:
+            return
+        domains = EmailDomain.__table__
+        domain_ids = dict(self.session.execute(
+            select(domains.c.domain, domains.c.id).where(domains.c.domain.in_({domain_of(v.email) for v in verdicts}))
+        ).fetchall())
+        now = datetime.datetime.utcnow()
+        retries = [v for v in verdicts if v.status == RETRY]
+        verdicts = [v for v in verdicts if v.status != RETRY]
+        upsert(self.session, EmailVerification.__table__, [{
+            'email': v.email,
+            'domain_id': domain_ids.get(domain_of(v.email)),
+            'format_valid': v.valid_syntax,
+            'domain_valid': v.valid_domain,
+            'mx_valid': v.valid_mx,
+            'smtp_valid': v.valid_smtp,
+            'final_status': v.status,
+            'detail': v.detail,
+            'checked_at': now,
+            # Done: off the queue, whoever had claimed it
+            'worker_id': None,
+            'lock_time': None,
+            'lease_expires_at': None,
+            'next_attempt_at': None,
+        } for v in verdicts], 'email')
+        if retries:
+            self._schedule_retries(retries, domain_ids, now)
+        self.session.commit()
+
+    def _schedule_retries(self, retries, domain_ids, now):
+        """
+        Back to the queue, due at retry_at; the attempt counts unless the
+        address wasn't probed (MX deferred). UNKNOWN after MAX_ATTEMPTS.
+        """
+        table = EmailVerification.__table__
+        # Bulk runs may meet the address first
+        upsert(self.session, table, [
+            {'email': v.email, 'domain_id': domain_ids.get(domain_of(v.email)), 'final_status': 'PENDING', 'attempts': 0}
+            for v in retries
+        ], 'email', update=False)
+        attempts = func.coalesce(table.c.attempts, 0) + bindparam('b_counted')
+        self.session.execute(update(table).where(table.c.email == bindparam('b_email')).values(
+            attempts=attempts,
+            final_status=case((attempts >= MAX_ATTEMPTS, 'UNKNOWN'), else_='PENDING'),
+            next_attempt_at=bindparam('b_retry_at'),
+            detail=bindparam('b_detail'),
+            format_valid=bindparam('b_syntax'),
+            domain_valid=bindparam('b_domain'),
+            mx_valid=bindparam('b_mx'),
+            checked_at=now,
+            worker_id=None,
+            lock_time=None,
+            lease_expires_at=None
+        ), [{
+            'b_email': v.email,
+            'b_counted': 0 if v.detail == "MX_DEFERRED" else 1,
+            'b_retry_at': v.retry_at,
+            'b_detail': v.detail,
+            'b_syntax': v.valid_syntax,
+            'b_domain': v.valid_domain,
+            'b_mx': v.valid_mx,
+        } for v in retries])
+
+    def retry_later(self, emails, worker_id, detail):
+        """
+        Back to the queue after checking these addresses raised: the attempt
+        counts (UNKNOWN after MAX_ATTEMPTS) and the wait starts at RETRY_BASE,
+        doubling with every attempt already made, so one bad address or a
+        failing dependency doesn't keep the verifiers busy with the same
+        batch. Addresses with a verdict, or claimed by another worker, are
+        left alone.
+        """
+        emails = list(dict.fromkeys(emails))
+        if not emails:
+            return
+        table = EmailVerification.__table__
+        now = datetime.datetime.utcnow()
+        made = dict(self.session.execute(
+            select(table.c.email, table.c.attempts).where(table.c.email.in_(emails))
+        ).fetchall())
+        attempts = func.coalesce(table.c.attempts, 0) + 1
+        self.session.execute(update(table).where(
+            table.c.email == bindparam('b_email'),
+            or_(table.c.final_status == 'PENDING', table.c.final_status == 'PROCESSING'),
+            or_(table.c.worker_id == None, table.c.worker_id == worker_id)
+        ).values(
+            attempts=attempts,
+            final_status=case((attempts >= MAX_ATTEMPTS, 'UNKNOWN'), else_='PENDING'),
+            next_attempt_at=bindparam('b_retry_at'),
+            detail=detail,
+            checked_at=now,
+            worker_id=None,
+            lock_time=None,
+            lease_expires_at=None
+        ), [{
+            'b_email': email,
+            'b_retry_at': now + datetime.timedelta(seconds=min(RETRY_MAX, RETRY_BASE * 2 ** (made.get(email) or 0))),
+        } for email in emails])
+        self.session.commit()
+        # Those that ran out of attempts are UNKNOWN now
+        self._fan_out(emails)
+
+    def fan_out(self, verdicts):
+        """
+        Copy the stored verdicts of these addresses to every CapturedEmail row
+        that references them, in one statement. Returns the rows updated.
+        """
+        return self._fan_out([v.email for v in verdicts])
+
+    def _fan_out(self, emails):
+        if not emails:
+            return 0
+        captured = CapturedEmail.__table__
+        addresses = EmailVerification.__table__
+        # UPDATE ... FROM (SQLite >= 3.33, PostgreSQL)
+        result = self.session.execute(update(captured).where(
+            captured.c.address_id == addresses.c.id,
+            addresses.c.email.in_(emails),
+            addresses.c.final_status.in_(VERDICTS)
+        ).values(
+            verification_status=addresses.c.final_status,
+            valid_syntax=addresses.c.format_valid,
+            valid_domain=addresses.c.domain_valid,
+            valid_mx=addresses.c.mx_valid,
+            valid_smtp=addresses.c.smtp_valid,
+            updated_at=datetime.datetime.utcnow()
+        ))
+        self.session.commit()
+        return result.rowcount
+
+    def close(self):
+        self.smtp_pool.close()
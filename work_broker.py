@@ -0,0 +1,258 @@
+"""
+work_broker.py - Wakes idle workers when rows enter their queue.
+
+Idle workers used to poll their queue every 2 seconds and exit after a fixed
+number of empty polls: up to 2 s lost at every stage handoff, constant idle
+load on the database, and processors giving up while crawlers were still
+downloading. Now:
+  - run_fast.py starts a WorkBroker (a multiprocessing.connection Listener on
+    localhost), publishes its address to the workers it spawns
+    (CRAWLER_BROKER_ADDRESS / CRAWLER_BROKER_KEY) and tells it which worker
+    processes serve which phases
+  - producers call channel.notify('process') after committing rows that
+    entered 'process'; the broker wakes the processors waiting in
+    channel.wait(), which otherwise only polls every BROKER_POLL_INTERVAL
+  - a worker with nothing to claim exits when channel.finished(): its queues
+    are empty (nothing pending, not even retries waiting for their time,
+    nothing claimed) and no worker of an upstream phase is alive
+
+Without a broker (a worker started on its own, or the broker unreachable) the
+channel polls every POLL_INTERVAL seconds, and upstream phases count as alive
+while they hold unexpired leases.
+
+    channel = WorkChannel(('process',))
+    while True:
+        articles = db_manager.claim_batch('process', worker_id, 10)
+        if not articles:
+            if channel.finished(db_manager, worker_id):
+                break
+            channel.wait(stop_event)
+            continue
+        ...
+        channel.notify('verify')
+"""
+
+import datetime
+import os
+import threading
+from collections import Counter
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+ADDRESS_ENV = 'CRAWLER_BROKER_ADDRESS'
+KEY_ENV = 'CRAWLER_BROKER_KEY'
+POLL_INTERVAL = 2            # seconds, no broker
+BROKER_POLL_INTERVAL = 30    # seconds, safety net behind notifications
+READY_TIMEOUT = 5            # seconds to wait for the broker's first state
+QUIET_CHECKS = 3             # no broker: idle checks in a row before exiting
+WATCH_INTERVAL = 0.5
+
+# Phases whose workers can still put rows into a phase (transitively).
+# Crawlers serve both 'discover' and 'crawl' and feed themselves.
+UPSTREAM = {
+    'discover': (),
+    'crawl': ('discover',),
+    'process': ('discover', 'crawl'),
+    'verify': ('discover', 'crawl', 'process'),
+}
+
+class WorkBroker:
+    """
+    Runs in the parent process (threads): tracks the worker processes per
+    phase and relays notifications to the workers of the notified phase.
+    """
+    def __init__(self, host='127.0.0.1'):
+        self.key = os.urandom(16)
+        self.listener = Listener((host, 0), authkey=self.key)
+        self.lock = threading.Lock()
+        self.subscribers = {}  # connection -> phases
+        self.workers = []      # (process, phases)
+        self.live = Counter()
+        self.closed = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def export(self):
+        """
+        Publish the broker to processes started from now on (spawned
+        children inherit the environment).
+        """
+        host, port = self.listener.address
+        os.environ[ADDRESS_ENV] = f"{host}:{port}"
+        os.environ[KEY_ENV] = self.key.hex()
+
+    def track(self, process, phases):
+        """
+        Count a started worker process as serving phases until it exits.
+        """
+        with self.lock:
+            self.workers.append((process, tuple(phases)))
+        self._update_live()
+
+    def close(self):
+        self.closed.set()
+        if os.environ.get(KEY_ENV) == self.key.hex():
+            os.environ.pop(ADDRESS_ENV, None)
+            os.environ.pop(KEY_ENV, None)
+        self.listener.close()
+        with self.lock:
+            connections = list(self.subscribers)
+            self.subscribers.clear()
+        for conn in connections:
+            conn.close()
+
+    def _accept(self):
+        while not self.closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self.closed.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'hello':
+                    with self.lock:
+                        self.subscribers[conn] = tuple(message[1])
+                        self._send(conn, ('live', dict(self.live)))
+                elif message[0] == 'notify':
+                    with self.lock:
+                        for other, phases in list(self.subscribers.items()):
+                            if other is not conn and message[1] in phases:
+                                self._send(other, ('work', message[1]))
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self.lock:
+                self.subscribers.pop(conn, None)
+            conn.close()
+
+    def _watch(self):
+        while not self.closed.wait(WATCH_INTERVAL):
+            self._update_live()
+
+    def _update_live(self):
+        with self.lock:
+            live = Counter()
+            for process, phases in self.workers:
+                if process.is_alive():
+                    live.update(phases)
+            if live == self.live:
+                return
+            self.live = live
+            for conn in list(self.subscribers):
+                self._send(conn, ('live', dict(live)))
+
+    def _send(self, conn, message):
+        # Caller holds self.lock
+        try:
+            conn.send(message)
+        except (OSError, EOFError):
+            self.subscribers.pop(conn, None)
+
+class WorkChannel:
+    """
+    A worker's side: notifications for its phases, and whether more work
+    can still come. Falls back to polling when there is no broker.
+    """
+    def __init__(self, phases):
+        self.phases = tuple(phases)
+        self.upstream = {p for phase in self.phases for p in UPSTREAM[phase]} - set(self.phases)
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.live = {}
+        self.ready = threading.Event()
+        self.woken = threading.Event()
+        self.quiet = 0
+        address = os.environ.get(ADDRESS_ENV)
+        if address:
+            try:
+                host, port = address.rsplit(':', 1)
+                self.conn = Client((host, int(port)), authkey=bytes.fromhex(os.environ[KEY_ENV]))
+                self.conn.send(('hello', self.phases))
+            except (OSError, EOFError, KeyError, ValueError, AuthenticationError):
+                self.conn = None
+        if self.conn is not None:
+            threading.Thread(target=self._listen, args=(self.conn,), daemon=True).start()
+
+    @property
+    def connected(self):
+        return self.conn is not None
+
+    def notify(self, phase):
+        """
+        Rows entered phase (call after the commit): wake its idle workers.
+        """
+        conn = self.conn
+        if conn is None:
+            return
+        try:
+            with self.send_lock:
+                conn.send(('notify', phase))
+        except (OSError, EOFError):
+            self._lost()
+
+    def wait(self, stop_event=None, due=None):
+        """
+        Sleep until work is announced for our phases, stop_event is set or
+        the poll interval passes; due (UTC datetime, e.g. the next retry)
+        shortens it. Returns True when woken by a notification.
+        """
+        timeout = BROKER_POLL_INTERVAL if self.connected else POLL_INTERVAL
+        if due is not None:
+            timeout = min(timeout, max(0, (due - datetime.datetime.utcnow()).total_seconds()))
+        woken = False
+        while timeout > 0 and not woken:
+            # Short slices, so a stop request is seen within a second
+            woken = self.woken.wait(min(1, timeout))
+            timeout -= 1
+            if stop_event and stop_event.is_set():
+                break
+        self.woken.clear()
+        return woken
+
+    def finished(self, db_manager, worker_id=None):
+        """
+        True when no more work can come: nothing left in our queues and
+        no upstream worker alive. Call it idle (holding no claims): rows
+        still claimed under worker_id were abandoned and are ignored; the
+        worker gives them back when it exits (DBManager.release_worker).
+        """
+        if any(db_manager.queue_remaining(phase, ignore_worker=worker_id) for phase in self.phases):
+            self.quiet = 0
+            return False
+        if self.connected and self.ready.wait(READY_TIMEOUT):
+            return not any(self.live.get(phase) for phase in self.upstream)
+        # No broker: upstream is at work while it holds live leases. A worker
+        # between two claims holds none, so be sure over a few checks.
+        if any(db_manager.live_claims(phase) for phase in self.upstream):
+            self.quiet = 0
+            return False
+        self.quiet += 1
+        return self.quiet >= QUIET_CHECKS
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            conn.close()
+
+    def _listen(self, conn):
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'live':
+                    self.live = message[1]
+                    self.ready.set()
+                # Live workers changed or work arrived: look at the queue again
+                self.woken.set()
+        except (OSError, EOFError):
+            if self.conn is conn:
+                self._lost()
+
+    def _lost(self):
+        # Broker gone (run_fast stopped?): poll from now on
+        self.conn = None
+        self.woken.set()
@@ -3,10 +3,14 @@ import sys
 import os
 import uuid
 import datetime
-from db_manager import DBManager
+import asyncio
+from db_manager import DBManager, LeaseHeartbeat
 from metadata_manager import MetadataManager
 from scielo_crawler import SciELOCrawler
 from ojs_crawler import OJSCrawler
+from ojs_oai_harvester import OJSOAIHarvester
+from work_broker import WorkChannel
+import http_fetch
 
 import logging
 
@@ -23,16 +27,166 @@ logging.basicConfig(
 def log(worker_id, message, level=logging.INFO):
     logging.log(level, f"[Worker {worker_id}] {message}")
 
-def run_crawler_worker(worker_id, stop_event=None):
+# Articles leased per claim. The landing pages of a batch are fetched
+# concurrently, the PDFs are then downloaded one by one.
+DEFAULT_BATCH_SIZE = 20
+
+# Queues this worker serves: editions, then their articles
+PHASES = ('discover', 'crawl')
+
+def get_crawler(crawlers, journal, db_manager):
+    """
+    Get/Create the crawler for a journal (cached in crawlers). None if the source type is unknown.
+    """
+    crawler_key = f"{journal.source_type}_{journal.id}"
+    crawler = crawlers.get(crawler_key)
+    if not crawler:
+        if journal.source_type == 'scielo':
+            crawler = SciELOCrawler(journal.url, journal.name, download_dir='downloads_scielo', 
+                                  db_manager=db_manager)
+        elif journal.source_type == 'ojs':
+            crawler = OJSCrawler(journal.url, journal.name, download_dir='downloads_ojs', 
+                               db_manager=db_manager)
+        elif journal.source_type == 'ojs_oai':
+            crawler = OJSOAIHarvester(journal.url, journal.name, download_dir='downloads_ojs',
+                                      db_manager=db_manager)
+        else:
+            return None
+        crawlers[crawler_key] = crawler
+    return crawler
+
+def harvested_metadata(article, crawler, db_manager):
+    """
+    Metadata for an article whose PDF URL is already known (OAI harvest),
+    so no landing page has to be fetched. None otherwise.
+    """
+    pending_file = db_manager.get_pending_file(article)
+    if not pending_file:
+        return None
+    return {
+        'journal': crawler.journal_name,
+        'issue_url': article.edition.url,
+        'article_title': article.title,
+        'article_url': article.url,
+        'authors': "; ".join(author.name for author in article.authors) or "Unknown Authors",
+        # Names from OAI are "Last, First", so don't let them be split on commas
+        'authors_list': [{'name': author.name} for author in article.authors],
+        'pdf_url': pending_file.url,
+        'pdf_filename': crawler.generate_filename(pending_file.url)
+    }
+
+async def prefetch_metadata(jobs, fetcher):
+    """
+    Fetch the landing pages of a claimed batch concurrently.
+    jobs: list of (article_id, crawler, article_url)
+    Returns {article_id: metadata dict or None}.
+    """
+    metas = await asyncio.gather(*(
+        crawler.fetch_article_metadata_async(url, fetcher) for _, crawler, url in jobs
+    ))
+    return {article_id: meta for (article_id, _, _), meta in zip(jobs, metas)}
+
+def discover_edition(worker_id, edition, crawlers, db_manager):
+    """
+    Add the articles of a claimed edition (status 'found') and mark it
+    completed, whatever happens. Returns how many were found.
+    """
+    try:
+        journal = edition.journal
+        if not journal:
+             log(worker_id, f"ERROR: Edition {edition.id} has no journal. Skipping.")
+             db_manager.mark_edition_completed(edition.id)
+             return 0
+
+        log(worker_id, f"Discovering Edition {edition.id} for {journal.name} ({journal.source_type})...")
+        start_time = time.time()
+        
+        crawler = get_crawler(crawlers, journal, db_manager)
+        if not crawler:
+            log(worker_id, f"ERROR: Unknown source type {journal.source_type}")
+            db_manager.mark_edition_completed(edition.id) 
+            return 0
+
+        # Discover Articles in this Edition
+        article_urls = []
+        try:
+            article_urls = crawler.get_article_urls(edition.url)
+            
+            duration = time.time() - start_time
+            if article_urls:
+                log(worker_id, f"SUCCESS: Found {len(article_urls)} articles in Edition {edition.id} (Took {duration:.2f}s).")
+                for art_url in article_urls:
+                     # Add to DB (status='found')
+                     db_manager.add_article(edition.id, "Unknown Title", art_url)
+            else:
+                log(worker_id, f"WARNING: No articles found in Edition {edition.id} (Took {duration:.2f}s). URL: {edition.url}")
+
+            # Mark completed
+            db_manager.mark_edition_completed(edition.id)
+        except Exception as e:
+            log(worker_id, f"ERROR in get_article_urls for {edition.url}: {e}")
+            # Mark completed anyway to avoid infinite loop on bad URL
+            db_manager.mark_edition_completed(edition.id)
+        return len(article_urls or [])
+
+    except Exception as e:
+        log(worker_id, f"CRITICAL ERROR processing edition {edition.id}: {e}")
+        try:
+            db_manager.mark_edition_completed(edition.id)
+        except:
+            db_manager.session.rollback()
+        return 0
+
+def download_article(worker_id, article, crawler, metadata_manager, meta=None):
+    """
+    Fetch the landing page (unless meta is given) and download the PDF of
+    a claimed article. Returns (status, StoredPDF or None, pdf_url); the
+    caller records them.
+    """
+    start_time = time.time()
+    if meta is None:
+        meta = crawler.fetch_article_metadata(article.url)
+    if not meta:
+        log(worker_id, f"NO METADATA: {article.url}")
+        return 'error_metadata', None, None
+
+    pdf_url = meta.get('pdf_url')
+    if not pdf_url:
+        log(worker_id, f"NO PDF: {article.url}")
+        return 'no_pdf', None, None
+
+    log(worker_id, f"STARTING DOWNLOAD: Article {article.id} -> {pdf_url}")
+    stored = crawler.download_pdf_direct(pdf_url)
+    duration = time.time() - start_time
+    if not stored:
+        log(worker_id, f"FAILED DOWNLOAD: {article.url} ({duration:.2f}s)")
+        return 'error_download', None, pdf_url
+
+    filename = os.path.basename(stored.path)
+    meta['pdf_filename'] = filename
+    if metadata_manager: metadata_manager.save_metadata(meta)
+    log(worker_id, f"DOWNLOADED: Article {article.id} ({duration:.2f}s) - {filename}")
+    return 'downloaded', stored, pdf_url
+
+def run_crawler_worker(worker_id, stop_event=None, batch_size=DEFAULT_BATCH_SIZE):
     log(worker_id, "Started.")
     
     db_manager = DBManager()
+    # Keep our claims alive; if this process dies they expire and get reclaimed
+    heartbeat = LeaseHeartbeat(worker_id)
+    heartbeat.start()
     metadata_manager = MetadataManager(db_manager=db_manager)
+    # Woken when work arrives; tells when upstream is done
+    channel = WorkChannel(PHASES)
     
     crawlers = {} 
-    
-    empty_cycles = 0
-    max_empty_cycles = 300 # 10 minutes idle
+
+    # Shared async fetch layer (optional: falls back to blocking fetches)
+    loop = None
+    fetcher = None
+    if http_fetch.is_available():
+        loop = asyncio.new_event_loop()
+        fetcher = http_fetch.AsyncFetcher()
     
     try:
         while True:
@@ -43,155 +197,107 @@ def run_crawler_worker(worker_id, stop_event=None):
             edition = db_manager.get_next_pending_edition(worker_id)
             
             if edition:
-                empty_cycles = 0
-                try:
-                    journal = edition.journal
-                    if not journal:
-                         log(worker_id, f"ERROR: Edition {edition.id} has no journal. Skipping.")
-                         db_manager.mark_edition_completed(edition.id)
-                         continue
-
-                    log(worker_id, f"Discovering Edition {edition.id} for {journal.name} ({journal.source_type})...")
-                    start_time = time.time()
-                    
-                    crawler_key = f"{journal.source_type}_{journal.id}"
-                    crawler = crawlers.get(crawler_key)
-                    if not crawler:
-                        if journal.source_type == 'scielo':
-                            crawler = SciELOCrawler(journal.url, journal.name, download_dir='downloads_scielo', 
-                                                  db_manager=db_manager)
-                        elif journal.source_type == 'ojs':
-                            crawler = OJSCrawler(journal.url, journal.name, download_dir='downloads_ojs', 
-                                               db_manager=db_manager)
-                        else:
-                            log(worker_id, f"ERROR: Unknown source type {journal.source_type}")
-                            db_manager.mark_edition_completed(edition.id) 
-                            continue
-                        crawlers[crawler_key] = crawler
-
-                    # Discover Articles in this Edition
-                    try:
-                        article_urls = crawler.get_article_urls(edition.url)
-                        
-                        duration = time.time() - start_time
-                        if article_urls:
-                            log(worker_id, f"SUCCESS: Found {len(article_urls)} articles in Edition {edition.id} (Took {duration:.2f}s).")
-                            for art_url in article_urls:
-                                 # Add to DB (status='found')
-                                 db_manager.add_article(edition.id, "Unknown Title", art_url)
-                        else:
-                            log(worker_id, f"WARNING: No articles found in Edition {edition.id} (Took {duration:.2f}s). URL: {edition.url}")
-
-                        # Mark completed
-                        db_manager.mark_edition_completed(edition.id)
-                    except Exception as e:
-                        log(worker_id, f"ERROR in get_article_urls for {edition.url}: {e}")
-                        # Mark completed anyway to avoid infinite loop on bad URL
-                        db_manager.mark_edition_completed(edition.id)
-
-                except Exception as e:
-                    log(worker_id, f"CRITICAL ERROR processing edition {edition.id}: {e}")
-                    try:
-                        db_manager.mark_edition_completed(edition.id)
-                    except:
-                        db_manager.session.rollback()
-
+                if discover_edition(worker_id, edition, crawlers, db_manager):
+                    channel.notify('crawl')
                 continue # Loop again to prefer Editions until exhausted
 
             # PRIORITY 2: Process Pending Articles (Download PDF)
-            article = db_manager.get_next_pending_article_for_crawling(worker_id)
+            articles = db_manager.claim_batch('crawl', worker_id, batch_size)
             
-            if article:
-                empty_cycles = 0
-                try:
-                    # Get Journal info
+            if articles:
+                prefetched = {}
+                jobs = []
+                for article in articles:
                     journal = article.edition.journal
-                    if not journal:
-                        log(worker_id, f"ERROR: Article {article.id} has no journal. Mark as error.")
-                        article.status = 'error_metadata'
-                        article.worker_id = None
-                        db_manager.session.commit()
+                    crawler = get_crawler(crawlers, journal, db_manager) if journal else None
+                    if not crawler:
                         continue
+                    meta = harvested_metadata(article, crawler, db_manager)
+                    if meta:
+                        prefetched[article.id] = meta
+                    elif article.url:
+                        jobs.append((article.id, crawler, article.url))
+                if fetcher and jobs:
+                    try:
+                        prefetched.update(loop.run_until_complete(prefetch_metadata(jobs, fetcher)))
+                    except Exception as e:
+                        log(worker_id, f"ERROR prefetching batch metadata: {e}")
 
-                    # Get/Create Crawler
-                    crawler_key = f"{journal.source_type}_{journal.id}"
-                    crawler = crawlers.get(crawler_key)
-                    if not crawler:
-                        if journal.source_type == 'scielo':
-                            crawler = SciELOCrawler(journal.url, journal.name, download_dir='downloads_scielo', 
-                                                  db_manager=db_manager)
-                        elif journal.source_type == 'ojs':
-                            crawler = OJSCrawler(journal.url, journal.name, download_dir='downloads_ojs', 
-                                               db_manager=db_manager)
-                        else:
+                pending_ids = [a.id for a in articles]
+                for article in articles:
+                    if stop_event and stop_event.is_set():
+                        # Hand unprocessed claims back to the queue
+                        db_manager.release_claims('crawl', worker_id, pending_ids)
+                        break
+                    pending_ids.remove(article.id)
+                    try:
+                        # Get Journal info
+                        journal = article.edition.journal
+                        if not journal:
+                            log(worker_id, f"ERROR: Article {article.id} has no journal. Mark as error.")
+                            article.status = 'error_metadata'
+                            article.worker_id = None
+                            db_manager.session.commit()
                             continue
-                        crawlers[crawler_key] = crawler
-
-                    # Fetch Metadata & Download
-                    # log(worker_id, f"Downloading Article {article.id}...")
-                    start_time = time.time()
-                    
-                    meta = crawler.fetch_article_metadata(article.url)
-                    
-                    if meta:
-                        pdf_url = meta.get('pdf_url')
-                        filename = meta.get('pdf_filename')
-                        
-                        if pdf_url:
-                            log(worker_id, f"STARTING DOWNLOAD: Article {article.id} -> {pdf_url}")
-                            local_path = crawler.download_pdf_direct(pdf_url, filename)
-                            duration = time.time() - start_time
-                            
-                            if local_path:
-                                if metadata_manager: metadata_manager.save_metadata(meta)
-                                db_manager.add_file(
-                                    article_id=article.id,
-                                    local_path=local_path,
-                                    file_type='pdf',
-                                    url=pdf_url
-                                )
-                                article.status = 'downloaded'
-                                article.worker_id = None
-                                article.lock_time = None
-                                db_manager.session.commit()
-                                log(worker_id, f"DOWNLOADED: Article {article.id} ({duration:.2f}s) - {filename}")
-                            else:
-                                log(worker_id, f"FAILED DOWNLOAD: {article.url} ({duration:.2f}s)")
-                                article.status = 'error_download'
-                                article.worker_id = None
-                                db_manager.session.commit()
-                        else:
-                            log(worker_id, f"NO PDF: {article.url}")
-                            article.status = 'no_pdf'
+
+                        # Get/Create Crawler
+                        crawler = get_crawler(crawlers, journal, db_manager)
+                        if not crawler:
+                            # Don't leave it claimed: it would never be done
+                            log(worker_id, f"ERROR: Unknown source type {journal.source_type} for Article {article.id}. Mark as error.")
+                            article.status = 'error_metadata'
                             article.worker_id = None
+                            article.lock_time = None
+                            article.lease_expires_at = None
                             db_manager.session.commit()
-                    else:
-                        log(worker_id, f"NO METADATA: {article.url}")
-                        article.status = 'error_metadata'
-                        article.worker_id = None
-                        db_manager.session.commit()
+                            continue
 
-                except Exception as e:
-                    log(worker_id, f"ERROR processing article {article.id}: {e}")
-                    try:
+                        # Fetch Metadata & Download
+                        status, stored, pdf_url = download_article(worker_id, article, crawler, metadata_manager,
+                                                                   prefetched.get(article.id))
+                        if stored:
+                            db_manager.add_file(
+                                article_id=article.id,
+                                local_path=stored.path,
+                                file_type='pdf',
+                                url=pdf_url,
+                                checksum=stored.checksum,
+                                size=stored.size
+                            )
+                        article.status = status
                         article.worker_id = None
-                        article.status = 'error_exception'
+                        article.lock_time = None
                         db_manager.session.commit()
-                    except:
-                        db_manager.session.rollback()
+                        if stored:
+                            channel.notify('process')
+
+                    except Exception as e:
+                        log(worker_id, f"ERROR processing article {article.id}: {e}")
+                        try:
+                            article.worker_id = None
+                            article.status = 'error_exception'
+                            db_manager.session.commit()
+                        except:
+                            db_manager.session.rollback()
                 
                 continue
 
             # No work found
-            empty_cycles += 1
-            if empty_cycles > max_empty_cycles: 
-                 log(worker_id, "Idle for too long. Exiting.")
-                 break
-            time.sleep(2)
+            if channel.finished(db_manager, worker_id):
+                log(worker_id, "No editions or articles left. Exiting.")
+                break
+            channel.wait(stop_event)
             
     except KeyboardInterrupt:
         log(worker_id, "Stopping...")
     finally:
+        if loop:
+            loop.run_until_complete(fetcher.close())
+            loop.close()
+        channel.close()
+        heartbeat.stop()
+        # Claims dropped on an error path go back to their queues now
+        db_manager.release_worker(worker_id)
         db_manager.close()
 
 if __name__ == "__main__":
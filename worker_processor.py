@@ -4,9 +4,12 @@ import os
 import uuid
 import datetime
 import pandas as pd
-from db_manager import DBManager
+from db_manager import DBManager, LeaseHeartbeat
 from metadata_manager import MetadataManager
 from processor import Processor
+from pdf_extraction_pool import ExtractionPool
+from text_store import file_checksum
+from work_broker import WorkChannel
 
 import logging
 
@@ -23,89 +26,142 @@ logging.basicConfig(
 def log(worker_id, message, level=logging.INFO):
     logging.log(level, f"[Processor {worker_id}] {message}")
 
-def run_processor_worker(worker_id, stop_event=None):
+# Articles leased per claim
+DEFAULT_BATCH_SIZE = 10
+
+PHASES = ('process',)
+
+def run_processor_worker(worker_id, stop_event=None, batch_size=DEFAULT_BATCH_SIZE):
     log(worker_id, "Started.")
     
     db_manager = DBManager()
+    # Keep our claims alive; if this process dies they expire and get reclaimed
+    heartbeat = LeaseHeartbeat(worker_id)
+    heartbeat.start()
     metadata_manager = MetadataManager(db_manager=db_manager)
     
     processor = Processor(db_manager=db_manager)
-    
-    empty_cycles = 0
+    # PDFs are parsed in a supervised child process (timeout, memory cap)
+    pool = ExtractionPool()
+    # Woken when PDFs are downloaded; tells when the crawlers are done
+    channel = WorkChannel(PHASES)
     
     try:
         while True:
             if stop_event and stop_event.is_set():
                 break
 
-            article = db_manager.get_next_article_for_processing(worker_id)
+            articles = db_manager.claim_batch('process', worker_id, batch_size)
             
-            if not article:
-                empty_cycles += 1
-                if empty_cycles > 900: # 30 minutes (2s sleep * 900 = 1800s)
-                     log(worker_id, "Idle for 30 minutes. Exiting.")
-                     break
-                time.sleep(2)
+            if not articles:
+                if channel.finished(db_manager, worker_id):
+                    log(worker_id, "Crawlers done and no PDFs left. Exiting.")
+                    break
+                channel.wait(stop_event)
                 continue
             
-            empty_cycles = 0
-            
-            try:
-                # log(worker_id, f"Processing {article.title[:30]}...")
-                start_time = time.time()
+            pending_ids = [a.id for a in articles]
+            for article in articles:
+                if stop_event and stop_event.is_set():
+                    # Hand unprocessed claims back to the queue
+                    db_manager.release_claims('process', worker_id, pending_ids)
+                    break
+                pending_ids.remove(article.id)
+                try:
+                    # log(worker_id, f"Processing {article.title[:30]}...")
+                    start_time = time.time()
                 
-                pdf_file_path = None
-                for f in article.files:
-                    if f.file_type == 'pdf' and f.local_path:
-                        # Some versions of path might not be absolute or might be missing the directory
-                        if os.path.exists(f.local_path):
-                            pdf_file_path = f.local_path
-                            break
-                        # Also check if it works when prefixed with downloads_ojs/ downloads_scielo/ ? 
-                        # Actually just checking exists() is enough since crawler saves with directory path.
+                    pdf_file_path = None
+                    pdf_file = None
+                    for f in article.files:
+                        if f.file_type == 'pdf' and f.local_path:
+                            # Some versions of path might not be absolute or might be missing the directory
+                            if os.path.exists(f.local_path):
+                                pdf_file_path = f.local_path
+                                pdf_file = f
+                                break
+                            # Also check if it works when prefixed with downloads_ojs/ downloads_scielo/ ? 
+                            # Actually just checking exists() is enough since crawler saves with directory path.
                 
-                local_path = pdf_file_path
+                    local_path = pdf_file_path
                 
-                if not local_path or not os.path.exists(local_path):
-                     log(worker_id, f"WARNING: Valid file path not found on disk for Article {article.id}. Skipping.")
-                     article.status = 'error_nofile'
-                     article.worker_id = None
-                     db_manager.session.commit()
-                     continue
+                    if not local_path or not os.path.exists(local_path):
+                         log(worker_id, f"WARNING: Valid file path not found on disk for Article {article.id}. Skipping.")
+                         article.status = 'error_nofile'
+                         article.worker_id = None
+                         db_manager.session.commit()
+                         continue
                 
-                # Extract
-                log(worker_id, f"STARTING EXTRACTION: Article {article.id} from {local_path}")
-                text = processor.extract_text_from_pdf(local_path)
-                emails = processor.extract_emails(text)
+                    if db_manager.is_file_quarantined(pdf_file.id):
+                        log(worker_id, f"QUARANTINED: Article {article.id} ({local_path}) failed extraction before. Skipping.")
+                        article.status = 'quarantined'
+                        article.worker_id = None
+                        db_manager.session.commit()
+                        continue
+
+                    if not pdf_file.checksum:
+                        pdf_file.checksum = file_checksum(local_path)
+                        db_manager.session.commit()
+
+                    # Extract
+                    log(worker_id, f"STARTING EXTRACTION: Article {article.id} from {local_path}")
+                    result = pool.extract(local_path, checksum=pdf_file.checksum)
+                    for method, error in result.errors.items():
+                        log(worker_id, f"EXTRACTION ERROR ({method}): Article {article.id}: {error}", logging.WARNING)
+                        if method in Processor.AVAILABLE_METHODS:
+                            db_manager.record_analysis_log(pdf_file.id, method, status='failed')
+
+                    if not result.ok:
+                        log(worker_id, f"QUARANTINED: Article {article.id} extraction {result.status} after {result.duration:.1f}s ({local_path})", logging.ERROR)
+                        db_manager.record_analysis_log(pdf_file.id, 'extraction', status=result.status)
+                        article.status = 'quarantined'
+                        article.worker_id = None
+                        article.lock_time = None
+                        db_manager.session.commit()
+                        continue
+
+                    for method in result.methods:
+                        if method not in result.errors:
+                            db_manager.record_analysis_log(pdf_file.id, method)
+                    db_manager.record_analysis_log(pdf_file.id, 'extraction', detail=result.path[:255])
+
+                    text = result.text
+                    emails = processor.extract_emails(text)
                 
-                duration = time.time() - start_time
+                    duration = time.time() - start_time
                 
-                # Save emails
-                if emails:
-                    log(worker_id, f"EXTRACTED: {len(emails)} emails from Article {article.id} ({duration:.2f}s)")
-                    for email in emails:
-                        db_manager.add_captured_email(article.id, email)
-                else:
-                    log(worker_id, f"NO EMAILS: Article {article.id} ({duration:.2f}s)")
+                    # Save emails
+                    if emails:
+                        log(worker_id, f"EXTRACTED: {len(emails)} emails from Article {article.id} ({duration:.2f}s, {result.path})")
+                        for email in emails:
+                            db_manager.add_captured_email(article.id, email)
+                        channel.notify('verify')
+                    else:
+                        log(worker_id, f"NO EMAILS: Article {article.id} ({duration:.2f}s, {result.path})")
                     
-                # Mark completed
-                article.status = 'completed'
-                article.worker_id = None
-                article.lock_time = None
-                db_manager.session.commit()
-                
-            except Exception as e:
-                log(worker_id, f"ERROR processing {article.id}: {e}")
-                try:
+                    # Mark completed
+                    article.status = 'completed'
                     article.worker_id = None
-                    article.status = 'error_processing'
+                    article.lock_time = None
                     db_manager.session.commit()
-                except:
-                    db_manager.session.rollback()
+                
+                except Exception as e:
+                    log(worker_id, f"ERROR processing {article.id}: {e}")
+                    try:
+                        article.worker_id = None
+                        article.status = 'error_processing'
+                        db_manager.session.commit()
+                    except:
+                        db_manager.session.rollback()
 
     except KeyboardInterrupt:
         log(worker_id, "Stopping...")
     finally:
+        pool.close()
+        channel.close()
+        heartbeat.stop()
+        # Claims dropped on an error path go back to their queues now
+        db_manager.release_worker(worker_id)
         db_manager.close()
 
 if __name__ == "__main__":
@@ -2,16 +2,10 @@ import time
 import sys
 import os
 import uuid
-import re
-import socket
-import smtplib
-import dns.resolver
 import datetime
-from db_manager import DBManager
-from database import CapturedEmail
-
-# Regex for basic syntax
-EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+from db_manager import DBManager, LeaseHeartbeat
+from verification_engine import VerificationEngine
+from work_broker import WorkChannel
 
 import logging
 
@@ -28,142 +22,72 @@ logging.basicConfig(
 def log(worker_id, message, level=logging.INFO):
     logging.log(level, f"[Verifier {worker_id}] {message}")
 
-def verify_syntax(email):
-    return bool(EMAIL_REGEX.match(email))
-
-def verify_domain_dns(domain):
-    try:
-        dns.resolver.resolve(domain, 'MX')
-        return True
-    except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
-        try:
-            dns.resolver.resolve(domain, 'A')
-            return True
-        except:
-            return False
-    except:
-        return False
-
-def get_mx_record(domain):
-    try:
-        records = dns.resolver.resolve(domain, 'MX')
-        mx_record = str(records[0].exchange)
-        return mx_record
-    except:
-        return None
+# Addresses leased per claim
+DEFAULT_BATCH_SIZE = 50 # larger batches put more addresses on each pooled MX session
 
-def verify_smtp(email, mx_record):
-    if not mx_record:
-        return False
-    
-    try:
-        server = smtplib.SMTP(timeout=5)
-        server.set_debuglevel(0)
-        
-        # Connect
-        code, message = server.connect(mx_record)
-        if code != 220:
-            server.quit()
-            return False
-        
-        server.helo(socket.gethostname())
-        server.mail('test@example.com')
-        code, message = server.rcpt(email)
-        server.quit()
-        
-        if code == 250:
-            return True
-        return False
-        
-    except Exception as e:
-        return False
+PHASES = ('verify',)
 
-def run_verifier_worker(worker_id, stop_event=None):
+def run_verifier_worker(worker_id, stop_event=None, batch_size=DEFAULT_BATCH_SIZE):
     log(worker_id, "Started.")
     
     db_manager = DBManager()
-    
-    empty_cycles = 0
+    # Keep our claims alive; if this process dies they expire and get reclaimed
+    heartbeat = LeaseHeartbeat(worker_id)
+    heartbeat.start()
+    # Same checks and result store as verify_emails.py
+    engine = VerificationEngine(db_manager.session)
+    # Woken when processors find addresses; tells when they are done
+    channel = WorkChannel(PHASES)
     
     try:
         while True:
             if stop_event and stop_event.is_set():
                 break
 
-            email_record = db_manager.get_next_email_for_verification(worker_id)
+            # Distinct addresses, however many articles cite each
+            addresses = db_manager.claim_batch('verify', worker_id, batch_size)
             
-            if not email_record:
-                empty_cycles += 1
-                if empty_cycles > 300: 
-                     log(worker_id, "Idle. Exiting.")
-                     break
-                time.sleep(2)
+            if not addresses:
+                # Addresses waiting for a retry keep us here until they're due
+                if channel.finished(db_manager, worker_id):
+                    log(worker_id, "Processors done and no addresses left. Exiting.")
+                    break
+                channel.wait(stop_event, db_manager.next_attempt_due('verify'))
                 continue
             
-            empty_cycles = 0
-            
-            email_addr = email_record.email
-            domain = email_addr.split('@')[-1]
-            status_detail = "UNKNOWN"
-            
+            start_time = time.time()
+
             try:
-                start_time = time.time()
-                # 1. Syntax
-                log(worker_id, f"STARTING VERIFICATION: {email_addr}")
-                valid_syntax = verify_syntax(email_addr)
-                email_record.valid_syntax = valid_syntax
-                
-                if not valid_syntax:
-                    email_record.verification_status = 'INVALID'
-                    status_detail = "SYNTAX_ERROR"
-                    email_record.valid_domain = False
-                    email_record.valid_mx = False
-                    email_record.valid_smtp = False
-                else:
-                    # 2. Domain & MX
-                    mx_record = get_mx_record(domain)
-                    
-                    email_record.valid_domain = True 
-                    if not mx_record:
-                        if verify_domain_dns(domain):
-                            email_record.valid_domain = True
-                            email_record.valid_mx = False
-                            status_detail = "NO_MX_RECORD"
-                        else:
-                            email_record.valid_domain = False
-                            email_record.valid_mx = False
-                            email_record.verification_status = 'INVALID'
-                            status_detail = "DOMAIN_INVALID"
-                    else:
-                        email_record.valid_domain = True
-                        email_record.valid_mx = True
-                    
-                        # 3. SMTP
-                        is_valid_smtp = verify_smtp(email_addr, mx_record)
-                        email_record.valid_smtp = is_valid_smtp
-                        
-                        if is_valid_smtp:
-                            email_record.verification_status = 'VALID'
-                            status_detail = "VALID_SMTP"
-                        else:
-                            email_record.verification_status = 'INVALID'
-                            status_detail = "SMTP_REJECTED"
+                verdicts = engine.verify([a.email for a in addresses], stop_event)
+                if verdicts is None:
+                    # Stopped before the slow part: hand the batch back
+                    db_manager.release_claims('verify', worker_id, [a.id for a in addresses])
+                    break
+                rows = engine.fan_out(verdicts.values())
 
                 duration = time.time() - start_time
-                log(worker_id, f"VERIFIED: {email_addr} -> {email_record.verification_status} ({status_detail}) ({duration:.2f}s)")
+                for verdict in verdicts.values():
+                    log(worker_id, f"VERIFIED: {verdict.email} -> {verdict.status} ({verdict.detail})")
+                log(worker_id, f"Batch of {len(addresses)} addresses ({rows} article links updated) in {duration:.2f}s")
 
-                # Clean up
-                email_record.worker_id = None
-                email_record.lock_time = None
-                db_manager.session.commit()
-            
             except Exception as e:
-                log(worker_id, f"ERROR verifying {email_addr}: {e}")
+                log(worker_id, f"ERROR verifying batch: {e}")
                 db_manager.session.rollback()
+                # Back to the queue, but not right away: retried with backoff
+                try:
+                    engine.retry_later([a.email for a in addresses], worker_id, "ERROR")
+                except Exception as e:
+                    log(worker_id, f"ERROR scheduling retries: {e}")
+                    db_manager.session.rollback()
 
     except KeyboardInterrupt:
         log(worker_id, "Stopping...")
     finally:
+        channel.close()
+        heartbeat.stop()
+        # Claims dropped on an error path go back to their queues now
+        db_manager.release_worker(worker_id)
+        engine.close()
         db_manager.close()
 
 if __name__ == "__main__":